@@ -42,7 +42,9 @@ const upload = multer({
 
 /**
  * POST /api/rag/upload
- * Upload files for processing through the ingestion pipeline
+ * Upload files for processing through the ingestion pipeline.
+ * Returns 202 with a job_id to poll at /api/rag/jobs/:jobId, or the
+ * processed files when called with ?wait=true
  */
 router.post('/upload', upload.array('files', 10), async (req: Request, res: Response) => {
   try {
@@ -63,6 +65,7 @@ router.post('/upload', upload.array('files', 10), async (req: Request, res: Resp
       formData,
       {
         headers: formData.getHeaders(),
+        params: req.query.wait ? { wait: req.query.wait } : undefined,
         timeout: 120000 // 2 minute timeout for large files
       }
     );
@@ -72,7 +75,7 @@ router.post('/upload', upload.array('files', 10), async (req: Request, res: Resp
       fs.unlinkSync(file.path);
     }
 
-    res.json(response.data);
+    res.status(response.status).json(response.data);
 
   } catch (err: any) {
     console.error('RAG upload error:', err.message);
@@ -94,6 +97,29 @@ router.post('/upload', upload.array('files', 10), async (req: Request, res: Resp
   }
 });
 
+/**
+ * GET /api/rag/jobs/:jobId
+ * Progress of an upload job
+ */
+router.get('/jobs/:jobId', async (req: Request, res: Response) => {
+  try {
+    const response = await axios.get(
+      `${RAG_API_URL}/rag/jobs/${encodeURIComponent(req.params.jobId)}`,
+      { timeout: 5000 }
+    );
+    res.json(response.data);
+  } catch (err: any) {
+    if (err.response?.status === 404) {
+      return res.status(404).json({ error: 'Unknown or expired job' });
+    }
+    console.error('RAG job status error:', err.message);
+    res.status(502).json({ 
+      error: 'Failed to get job status',
+      details: err.response?.data?.error || err.message
+    });
+  }
+});
+
 /**
  * POST /api/rag/query
  * Run a RAG query against the vector store
@@ -172,7 +198,7 @@ router.post('/full', upload.array('files', 10), async (req: Request, res: Respon
       }
     }
 
-    res.json(response.data);
+    res.status(response.status).json(response.data);
 
   } catch (err: any) {
     console.error('RAG full pipeline error:', err.message);
@@ -111,7 +111,7 @@ export function UploadModal({
       });
 
       const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || "http://localhost:3001";
-      const response = await fetch(`${API_BASE_URL}/api/rag/upload`, {
+      const response = await fetch(`${API_BASE_URL}/api/rag/upload?wait=true`, {
         method: "POST",
         body: formData,
       });
@@ -79,7 +79,7 @@ export async function uploadFiles(files: File[]): Promise<UploadResponse> {
     formData.append('files', file);
   });
 
-  const response = await fetch(`${API_BASE_URL}/api/rag/upload`, {
+  const response = await fetch(`${API_BASE_URL}/api/rag/upload?wait=true`, {
     method: 'POST',
     body: formData,
   });
@@ -31,3 +31,40 @@ def sample_chunks_dir(tmp_storage: Path) -> Path:
     (chunks_dir / "chunk_0.json").write_text(json.dumps(sample_chunk), encoding="utf-8")
     return tmp_storage / "chunks"
 
+
+def _write_text_pdf(file_path: Path, page_texts) -> Path:
+    """Write a minimal PDF with one line of Helvetica text per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % len(objects)
+        )
+        page_ids.append(len(objects))
+    kids = " ".join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    file_path.write_bytes(bytes(out))
+    return file_path
+
+
+@pytest.fixture
+def make_pdf(tmp_path: Path):
+    """Factory fixture: make_pdf(["page one text", ...]) -> path to a text PDF."""
+
+    def _make(page_texts, name: str = "sample.pdf") -> Path:
+        return _write_text_pdf(tmp_path / name, page_texts)
+
+    return _make
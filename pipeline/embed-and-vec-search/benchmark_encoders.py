@@ -0,0 +1,135 @@
+"""
+Compare encoder backends on the chunk corpus.
+Usage:
+    python benchmark_encoders.py [--chunks-dir ../storage/chunks] [--limit 2000]
+                                 [--backends torch onnx onnx-int8] [--onnx-dir DIR] [--min-cosine 0.99]
+
+Every backend embeds the same chunk texts. The first backend is the
+reference; the others are checked against it for per-text cosine similarity,
+search-score drift and top-10 overlap. Reported for each backend: load time,
+bulk throughput (embeddings/s at batch size 32) and single-query latency
+(p50/p95 in ms). Exits with status 1 if a backend's minimum cosine is below
+--min-cosine. Export the ONNX models first with ``python encoders.py export --quantize``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from chunk_segments import SEGMENT_FILE, read_segment
+from encoders import OnnxEncoder, compare_embeddings, default_onnx_dir
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def load_texts(chunks_dir: Path, limit: int) -> List[str]:
+    """Chunk texts from segments or chunk_<i>.json files, at most ``limit``."""
+    texts: List[str] = []
+    for doc_dir in sorted(p for p in chunks_dir.iterdir() if p.is_dir()):
+        segment = doc_dir / SEGMENT_FILE
+        if segment.is_file():
+            chunks = read_segment(segment)
+        else:
+            chunks = [json.loads(path.read_text(encoding="utf-8")) for path in sorted(doc_dir.glob("chunk_*.json"))]
+        texts.extend(chunk["text"] for chunk in chunks)
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+
+def loader(backend: str, model_name: str, onnx_dir: Path) -> Callable[[], Any]:
+    if backend == "torch":
+        from embed_and_index import SentenceTransformer
+
+        return lambda: SentenceTransformer(model_name, device="cpu")
+    return lambda: OnnxEncoder(onnx_dir, quantized=backend == "onnx-int8")
+
+
+def benchmark(load: Callable[[], Any], texts: List[str], queries: List[str]) -> Dict[str, Any]:
+    started = time.perf_counter()
+    model = load()
+    load_seconds = time.perf_counter() - started
+
+    model.encode(texts[:32], batch_size=32, show_progress_bar=False)  # warm-up
+    started = time.perf_counter()
+    embeddings = np.asarray(
+        model.encode(texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True), dtype="float32"
+    )
+    elapsed = time.perf_counter() - started
+
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        model.encode([query], show_progress_bar=False, convert_to_numpy=True)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    stats = {
+        "load_seconds": round(load_seconds, 3),
+        "embeddings_per_second": round(len(texts) / elapsed, 1) if elapsed else 0.0,
+        "query_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "query_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+    }
+    return {"stats": stats, "embeddings": embeddings}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark and cross-check embedding backends.")
+    parser.add_argument("--chunks-dir", default="../storage/chunks")
+    parser.add_argument("--limit", type=int, default=2000, help="Chunk texts to embed.")
+    parser.add_argument("--queries", type=int, default=100, help="Single-text encodes timed for latency.")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--onnx-dir", default=None, help="Exported model directory (default: onnx_models/<model>).")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    args = parser.parse_args()
+
+    chunks_dir = Path(args.chunks_dir)
+    if not chunks_dir.is_dir():
+        print(f"[error] Chunks directory not found: {chunks_dir}")
+        sys.exit(1)
+    texts = load_texts(chunks_dir, args.limit)
+    if not texts:
+        print("[error] No chunks to embed")
+        sys.exit(1)
+    # short queries, like real search requests
+    queries = [" ".join(text.split()[:12]) for text in texts[: args.queries]]
+    onnx_dir = Path(args.onnx_dir) if args.onnx_dir else default_onnx_dir(args.model)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    reference = None
+    failed = False
+    for name in args.backends:
+        try:
+            run = benchmark(loader(name, args.model, onnx_dir), texts, queries)
+        except Exception as exc:  # pylint: disable=broad-except
+            results[name] = {"error": str(exc)}
+            print(f"{name:10s} unavailable: {exc}")
+            continue
+        results[name] = run["stats"]
+        if reference is None:
+            reference = (name, run["embeddings"])
+        else:
+            check = compare_embeddings(reference[1], run["embeddings"])
+            results[name]["vs_" + reference[0]] = check
+            failed |= check["min_cosine"] < args.min_cosine
+        r = results[name]
+        print(
+            f"{name:10s} {r['embeddings_per_second']:8.1f} embeddings/s  "
+            f"query p50 {r['query_ms_p50']:.2f} ms  p95 {r['query_ms_p95']:.2f} ms  load {r['load_seconds']}s"
+        )
+
+    print(json.dumps({"texts": len(texts), "backends": results}, indent=2))
+    if failed:
+        print(f"[error] A backend's embeddings fall below cosine {args.min_cosine} of {reference[0]}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Multi-process bulk encoding for full-corpus builds.
+
+Texts are ordered by token length and cut into batches, so every batch pads
+to nearly the same length. Groups of batches are handed, longest first, to a
+pool of worker processes. Each worker loads the model once and runs with a
+fixed number of threads (torch or ONNX Runtime), pinned to its own CPUs where the OS allows.
+Results are scattered back to the input order.
+
+Workers are spawned rather than forked: forking a process whose torch thread
+pool is already running can deadlock.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BATCHES_PER_TASK = 8  # batches sent to a worker per task; fewer round trips, still balanced
+TOKENIZE_BATCH_SIZE = 1024
+
+_model = None  # per worker process
+
+
+def token_lengths(texts: Sequence[str], tokenizer=None) -> List[int]:
+    """Token count per text with ``tokenizer``, or character count without one."""
+    if tokenizer is None:
+        return [len(text) for text in texts]
+    lengths: List[int] = []
+    for start in range(0, len(texts), TOKENIZE_BATCH_SIZE):
+        encoded = tokenizer(list(texts[start : start + TOKENIZE_BATCH_SIZE]), verbose=False)
+        lengths.extend(len(ids) for ids in encoded["input_ids"])
+    return lengths
+
+
+def length_batches(lengths: Sequence[int], batch_size: int) -> List[List[int]]:
+    """Cut text indices, longest first, into batches of similar length."""
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    return [order[start : start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def cpu_sets(processes: int, threads: int) -> List[Optional[List[int]]]:
+    """Split the CPUs available to this process into one set per worker.
+
+    Returns None per worker when there are too few CPUs to give each its own.
+    """
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS/Windows
+        return [None] * processes
+    if len(cpus) < processes * threads:
+        return [None] * processes
+    return [cpus[i * threads : (i + 1) * threads] for i in range(processes)]
+
+
+def _init_worker(model_name: str, threads: int, cpu_queue, load_model) -> None:
+    global _model
+    # must be set before torch starts its thread pools
+    os.environ["OMP_NUM_THREADS"] = os.environ["MKL_NUM_THREADS"] = str(threads)
+    cpus = cpu_queue.get()
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError:
+            pass
+    _model = load_model(model_name, threads=threads)
+
+
+def _load_sentence_transformer(model_name: str, threads: int = 0):
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    if threads:
+        torch.set_num_threads(threads)
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def _encode_batches(batches: List[List[str]]) -> List[np.ndarray]:
+    return [
+        np.asarray(
+            _model.encode(
+                batch,
+                batch_size=len(batch),
+                show_progress_bar=False,
+                convert_to_numpy=True,
+                normalize_embeddings=False,
+            ),
+            dtype="float32",
+        )
+        for batch in batches
+    ]
+
+
+def encode_bulk(
+    texts: Sequence[str],
+    model_name: str,
+    processes: int,
+    threads_per_process: Optional[int] = None,
+    batch_size: int = 32,
+    tokenizer=None,
+    start_method: str = "spawn",
+    load_model=_load_sentence_transformer,
+) -> np.ndarray:
+    """
+    Encode ``texts`` over ``processes`` worker processes and return the
+    float32 embeddings in input order. ``threads_per_process`` defaults to
+    the CPU count divided by ``processes``. ``tokenizer`` (the model's
+    fast tokenizer) is used to order texts by token length; without it they
+    are ordered by characters. ``load_model(model_name, threads=...)`` runs
+    once in each worker, must be importable from it and should limit the
+    model to ``threads`` threads.
+    """
+    threads = threads_per_process or max(1, (os.cpu_count() or 1) // processes)
+    batches = length_batches(token_lengths(texts, tokenizer), batch_size)
+    tasks = [batches[start : start + BATCHES_PER_TASK] for start in range(0, len(batches), BATCHES_PER_TASK)]
+
+    logger.info(
+        "Bulk encoding %d texts in %d batches over %d processes x %d threads", len(texts), len(batches), processes, threads
+    )
+    context = multiprocessing.get_context(start_method)
+    cpu_queue = context.Queue()
+    for cpus in cpu_sets(processes, threads):
+        cpu_queue.put(cpus)
+
+    embeddings = None
+    with ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(model_name, threads, cpu_queue, load_model),
+    ) as pool:
+        futures = [pool.submit(_encode_batches, [[texts[i] for i in batch] for batch in task]) for task in tasks]
+        for task, future in zip(tasks, futures):
+            for batch, vectors in zip(task, future.result()):
+                if embeddings is None:
+                    embeddings = np.empty((len(texts), vectors.shape[1]), dtype="float32")
+                embeddings[batch] = vectors
+    return embeddings
+
+
+def throughput(count: int, seconds: float, processes: int, threads: int) -> Dict[str, Any]:
+    """Embedding throughput record, as stored in ``EmbeddingIndexer.embedding_stats``."""
+    return {
+        "texts": count,
+        "seconds": round(seconds, 3),
+        "embeddings_per_second": round(count / seconds, 1) if seconds > 0 else 0.0,
+        "processes": processes,
+        "threads_per_process": threads,
+    }
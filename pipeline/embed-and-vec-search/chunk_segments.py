@@ -0,0 +1,47 @@
+"""
+Bulk reader for packed chunk segments (``<doc_id>/chunks.seg``).
+
+The format is written by the ingestion pipeline (see ``ingestion/utils.py``):
+blocks of newline-delimited compact JSON chunks, raw or zstd-compressed,
+followed by a table of ``(offset, length)`` uint64 pairs per block and a
+fixed footer ``<8sB7xQQQ`` (magic, codec, record count, block count, table
+offset), all little-endian. A whole document is read with one ``read()`` and
+one ``json.loads`` per block.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+from pathlib import Path
+from typing import Any, Dict, List
+
+try:  # optional: zstd-compressed segments
+    import zstandard
+except ImportError:  # pragma: no cover - depends on environment
+    zstandard = None
+
+SEGMENT_FILE = "chunks.seg"
+MAGIC = b"CHUNKSG1"
+FOOTER = struct.Struct("<8sB7xQQQ")
+BLOCK_ENTRY = struct.Struct("<QQ")
+CODEC_ZSTD = 1
+
+
+def read_segment(path: str | Path) -> List[Dict[str, Any]]:
+    """Return all chunks of a segment, in chunk order."""
+    data = Path(path).read_bytes()
+    magic, codec, _, blocks, table_offset = FOOTER.unpack_from(data, len(data) - FOOTER.size)
+    if magic != MAGIC:
+        raise ValueError(f"Not a chunk segment: {path}")
+    if codec == CODEC_ZSTD and zstandard is None:
+        raise RuntimeError(f"{path} is zstd-compressed; install the zstandard package")
+
+    decompressor = zstandard.ZstdDecompressor() if codec == CODEC_ZSTD else None
+    chunks: List[Dict[str, Any]] = []
+    for offset, length in BLOCK_ENTRY.iter_unpack(data[table_offset : table_offset + blocks * BLOCK_ENTRY.size]):
+        block = data[offset : offset + length]
+        if decompressor is not None:
+            block = decompressor.decompress(block)
+        chunks.extend(json.loads(b"[" + block.replace(b"\n", b",") + b"]"))
+    return chunks
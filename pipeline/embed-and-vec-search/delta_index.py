@@ -0,0 +1,99 @@
+"""
+Vectors added since the FAISS base index was last rebuilt.
+
+Searches run on the base index without holding any lock, so writers never
+mutate it. New vectors go into a ``DeltaIndex`` instead: an immutable set of
+normalized float32 rows that is scored exactly with numpy. A writer builds a
+new delta with ``appended`` and swaps it in, which a search already running
+on the old one never notices. Folding the delta into a new base index is the
+writer's job (see ``EmbeddingIndexer._folded_index``).
+
+Saved snapshots keep the delta too, as segments of rows on top of the base
+index file they share with earlier snapshots, so a save writes only what
+was added since the previous one. ``write_delta_segment`` and ``read_delta_segment``
+handle one such directory.
+
+Chunk IDs only grow, so the base holds IDs below ``start`` and the delta the
+IDs from ``start`` on.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from metadata_store import ColumnarMetadata
+
+DELTA_DIR = "delta"  # under a snapshot: one subdirectory per saved segment
+
+
+class DeltaIndex:
+    """Immutable chunk ID -> vector rows searched by exact inner product."""
+
+    def __init__(self, dimension: int, start: int, ids: Optional[np.ndarray] = None, vectors=None):
+        self.dimension = dimension
+        self.start = start  # first chunk ID that is not in the base index
+        self.ids = np.empty(0, dtype="int64") if ids is None else ids
+        self.vectors = np.empty((0, dimension), dtype="float32") if vectors is None else vectors
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def appended(self, ids: np.ndarray, vectors: np.ndarray) -> "DeltaIndex":
+        """Return a new delta with ``vectors`` added under ``ids``; this one is unchanged."""
+        ids = np.asarray(ids, dtype="int64")
+        vectors = np.asarray(vectors, dtype="float32").reshape(len(ids), self.dimension)
+        return DeltaIndex(
+            self.dimension,
+            self.start,
+            np.concatenate([self.ids, ids]),
+            np.concatenate([self.vectors, vectors]),
+        )
+
+    def search(
+        self, queries: np.ndarray, k: int, allowed: Optional[np.ndarray] = None, excluded: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the top ``k`` ``(scores, ids)`` per query, padded with -inf / -1.
+
+        Only rows whose ID is in ``allowed`` (None: any) and not in
+        ``excluded`` are scored.
+        """
+        scores = np.full((len(queries), k), -np.inf, dtype="float32")
+        ids = np.full((len(queries), k), -1, dtype="int64")
+        if not len(self) or k <= 0:
+            return scores, ids
+
+        selected = np.ones(len(self), dtype=bool)
+        if allowed is not None:
+            selected &= np.isin(self.ids, allowed)
+        if excluded is not None and len(excluded):
+            selected &= ~np.isin(self.ids, excluded)
+        rows = np.flatnonzero(selected)
+        if not len(rows):
+            return scores, ids
+
+        exact = queries @ self.vectors[rows].T
+        top = np.argsort(-exact, axis=1)[:, :k]
+        scores[:, : top.shape[1]] = np.take_along_axis(exact, top, axis=1)
+        ids[:, : top.shape[1]] = self.ids[rows][top]
+        return scores, ids
+
+
+def write_delta_segment(path: str | Path, ids: np.ndarray, vectors: np.ndarray, metadata: ColumnarMetadata) -> None:
+    """Save delta rows and their chunk metadata as a segment directory."""
+    path = Path(path)
+    path.mkdir(parents=True)
+    np.save(path / "ids.npy", np.asarray(ids, dtype="int64"))
+    np.save(path / "vectors.npy", np.asarray(vectors, dtype="float32"))
+    chunks = [metadata[i] for i in np.asarray(ids).tolist()]
+    ColumnarMetadata().with_chunks(np.asarray(ids).tolist(), chunks).save(path / "metadata", metadata.next_id)
+
+
+def read_delta_segment(path: str | Path) -> Tuple[np.ndarray, np.ndarray, ColumnarMetadata]:
+    """Return ``(ids, vectors, metadata)`` of a segment written by ``write_delta_segment``."""
+    path = Path(path)
+    ids = np.load(path / "ids.npy")
+    vectors = np.load(path / "vectors.npy", mmap_mode="r")
+    return ids, vectors, ColumnarMetadata(path / "metadata")
@@ -1,38 +1,193 @@
 import os
 import json
 import pickle
+import shutil
+import threading
+import time
+from contextlib import contextmanager
 import numpy as np
 from pathlib import Path
 import logging
+from functools import partial
 
-from sentence_transformers import SentenceTransformer
 import faiss
 
+import index_snapshots
+from bulk_embed import encode_bulk, throughput
+from chunk_segments import SEGMENT_FILE, read_segment
+from delta_index import DELTA_DIR, DeltaIndex, read_delta_segment, write_delta_segment
+from embedding_cache import EmbeddingCache
+from encoders import OnnxEncoder, default_onnx_dir, load_onnx_encoder
+from metadata_store import ColumnarMetadata
+from prefilter import MetadataFilter, id_selector
+from query_cache import QueryEmbeddingCache, normalize_query
+from vector_store import VECTORS_FILE, VectorFile, remove_stale_staging
+
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Build parameters per index type; overridable through ``index_params``
+INDEX_TYPES = {
+    "flat": {},
+    "ivf_flat": {"nlist": 1024},
+    "ivf_pq": {"nlist": 1024, "pq_m": 48, "pq_nbits": 8},
+    "hnsw": {"hnsw_m": 32, "ef_construction": 200},
+    # two-stage: compressed codes in memory, exact re-ranking from vectors.f32;
+    # oversample scales the shortlist for coarser codes
+    "sq8": {"oversample": 1},
+    "binary": {"oversample": 4},
+}
+RERANK_TYPES = ("sq8", "binary")
+
+# Recall/latency trade-off per request; nprobe=None scans every IVF list.
+# rerank_factor: shortlist size per hit for two-stage index types
+SEARCH_PROFILES = {
+    "fast": {"nprobe": 4, "ef_search": 32, "rerank_factor": 4},
+    "balanced": {"nprobe": 32, "ef_search": 128, "rerank_factor": 10},
+    "exact": {"nprobe": None, "ef_search": 1024, "rerank_factor": 40},
+}
+RERANK_MIN_SHORTLIST = 100
+
+MIN_POINTS_PER_CENTROID = 39  # below this FAISS k-means quality degrades
+MAX_TRAINING_POINTS = 100_000
+# IO_FLAG_MMAP_IFC maps the codes of every index type in place; IO_FLAG_MMAP
+# only maps IVF lists and reads flat, SQ, LSH and HNSW codes onto the heap
+MMAP_READ_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+SNAPSHOTS_KEEP = int(os.getenv("INDEX_SNAPSHOTS_KEEP", "3"))  # published snapshots kept on disk
+# A save folds the delta into a new base index (rewriting faiss.index and the
+# metadata store) once it holds more than this many rows and this share of the base
+DELTA_MAX_ROWS = int(os.getenv("INDEX_DELTA_MAX_ROWS", "20000"))
+DELTA_MAX_FRACTION = float(os.getenv("INDEX_DELTA_MAX_FRACTION", "0.1"))
+ENCODER_BACKENDS = ("torch", "onnx")
+TOKENIZE_BATCH_SIZE = 1024  # texts per tokenizer call when counting truncation
+EMBED_BATCH_SIZE = 32
+BULK_MIN_TEXTS = int(os.getenv("EMBED_BULK_MIN_TEXTS", "2048"))  # smaller sets aren't worth spawning workers
+
+
+def SentenceTransformer(model_name, **kwargs):  # pylint: disable=invalid-name
+    """Load the PyTorch model; torch is only imported when this backend is used."""
+    from sentence_transformers import SentenceTransformer as _SentenceTransformer
+
+    return _SentenceTransformer(model_name, **kwargs)
+
 
 class EmbeddingIndexer:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2", index_path: str = "./vector_index"):
-        """Initialize embedding model and FAISS index location."""
-        logger.info("Initializing EmbeddingIndexer with model: %s", model_name)
-        self.model = SentenceTransformer(model_name)
+    def __init__(
+        self,
+        model_name: str = "all-MiniLM-L6-v2",
+        index_path: str = "./vector_index",
+        cache_dir=None,
+        use_cache: bool = True,
+        index_type=None,
+        index_params=None,
+        search_profile: str = "balanced",
+        query_cache_bytes=None,
+        query_cache_ttl=None,
+        embed_processes=None,
+        embed_threads=None,
+        backend=None,
+        onnx_dir=None,
+        quantized=None,
+    ):
+        """Initialize embedding model and FAISS index location.
+
+        Chunk embeddings are cached on disk under ``cache_dir`` (default
+        ``<index_path>/embedding_cache``) unless ``use_cache`` is False.
+        ``index_type`` (default ``$VECTOR_INDEX_TYPE`` or ``flat``) picks one of
+        ``INDEX_TYPES`` for new builds; a loaded index keeps its saved type.
+        Query embeddings are kept in an in-memory LRU of ``query_cache_bytes``
+        (default ``$QUERY_CACHE_BYTES`` or 64 MiB, 0 disables) whose entries
+        expire after ``query_cache_ttl`` seconds (default ``$QUERY_CACHE_TTL``
+        or 3600, 0 never).
+        With ``embed_processes`` (default ``$EMBED_PROCESSES`` or 1) above 1,
+        batches of at least ``BULK_MIN_TEXTS`` chunks are encoded in that many
+        worker processes of ``embed_threads`` torch threads each (default
+        ``$EMBED_THREADS`` or CPUs / processes); see ``bulk_embed``.
+        ``backend`` (default ``$EMBED_BACKEND`` or ``torch``) selects the
+        encoder: ``torch`` runs sentence-transformers, ``onnx`` runs the model
+        exported to ``onnx_dir`` (default ``$ONNX_MODEL_DIR`` or
+        ``onnx_models/<model>``) on ONNX Runtime, int8-quantized when
+        ``quantized`` (default ``$EMBED_INT8``); see ``encoders``.
+        """
+        index_type = index_type or os.getenv("VECTOR_INDEX_TYPE", "flat")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        if search_profile not in SEARCH_PROFILES:
+            raise ValueError(f"Unknown search profile: {search_profile}")
+        backend = backend or os.getenv("EMBED_BACKEND", "torch")
+        if backend not in ENCODER_BACKENDS:
+            raise ValueError(f"Unknown encoder backend: {backend}")
+
+        logger.info("Initializing EmbeddingIndexer with model: %s (%s backend)", model_name, backend)
+        self.model_name = model_name
+        self.backend = backend
+        self.onnx_dir = Path(onnx_dir or os.getenv("ONNX_MODEL_DIR") or default_onnx_dir(model_name))
+        if quantized is None:
+            quantized = os.getenv("EMBED_INT8", "0").lower() in ("1", "true", "yes")
+        self.quantized = backend == "onnx" and quantized
+        if backend == "onnx":
+            self.model = OnnxEncoder(self.onnx_dir, quantized=self.quantized)
+        else:
+            self.model = SentenceTransformer(model_name)
+        # int8 vectors differ slightly from float32 ones, so they are cached apart
+        self.encoder_id = f"{model_name}@int8" if self.quantized else model_name
         self.index_path = Path(index_path)
         self.index_path.mkdir(exist_ok=True)
 
-        # FAISS index and metadata storage
-        self.index = None
-        self.chunk_metadata = []  # keep metadata order aligned with FAISS index
-        self.dimension = 384  # embedding dimension for all-MiniLM-L6-v2
+        # embedding dimension: 384 for all-MiniLM-L6-v2; exported ONNX models record theirs
+        self.dimension = getattr(self.model, "dimension", 384)
 
-    def load_chunks(self, chunks_dir: str = "./storage/chunks"):
-        """Load chunk JSON files produced by Person 2.
+        # FAISS index and metadata storage. Searches read these without a lock,
+        # so writers replace them (under _state_lock) instead of mutating them.
+        self.index = None  # base index; never mutated once a search can see it
+        self.delta = DeltaIndex(self.dimension, 0)  # vectors added since the base was built
+        self.chunk_metadata = ColumnarMetadata()  # chunk ID -> chunk dict, keyed like the FAISS ID map
+        self.deleted_ids = set()  # tombstoned chunk IDs, dropped on compaction
+        self.next_id = 0  # next chunk ID to assign
+        self.metadata_filter = MetadataFilter()  # posting lists over chunk_metadata
+        self.vectors = None  # VectorFile of full-precision rows, for two-stage index types
+        self.index_version = None  # snapshot version last loaded or saved
+        self._base_saved = False  # base index and metadata store are the files of index_version
+        self._delta_segments = []  # names of the delta segments saved in index_version
+        self.truncation_stats = None  # tokens cut off by the model in the last embed_chunks call
+        self.embedding_stats = None  # throughput of the last model run
+        self._lock = threading.RLock()  # serializes index mutations
+        self._state_lock = threading.Lock()  # makes state swaps atomic for searches
+        self._writing = False  # this thread holds the cross-process writer lock
+        self._index_source = None  # open file behind a memory-mapped index
 
-        Expected structure:
+        self.index_type = index_type
+        self.index_params = {**INDEX_TYPES[index_type], **(index_params or {})}
+        self.search_profile = search_profile  # default when a request names none
+
+        self.embed_processes = max(1, int(embed_processes or os.getenv("EMBED_PROCESSES", "1")))
+        self.embed_threads = embed_threads or int(os.getenv("EMBED_THREADS", "0")) or None
+
+        self.embedding_cache = None
+        if use_cache:
+            self.embedding_cache = EmbeddingCache(
+                cache_dir or self.index_path / "embedding_cache", self.encoder_id, self.dimension
+            )
+
+        if query_cache_bytes is None:
+            query_cache_bytes = int(os.getenv("QUERY_CACHE_BYTES", str(64 * 1024 * 1024)))
+        if query_cache_ttl is None:
+            query_cache_ttl = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+        self.query_cache = QueryEmbeddingCache(query_cache_bytes, query_cache_ttl) if query_cache_bytes > 0 else None
+
+    def load_chunks(self, chunks_dir: str = "./storage/chunks", doc_ids=None):
+        """Load chunks produced by Person 2.
+
+        Expected structure, either a packed segment per document:
+            storage/chunks/<doc_id>/chunks.seg
+        or one JSON file per chunk:
             storage/chunks/<doc_id>/chunk_0.json
             storage/chunks/<doc_id>/chunk_1.json
             ...
+
+        A segment is read in bulk and takes precedence over JSON files in the
+        same folder. If ``doc_ids`` is given, only those document folders are read.
         """
         chunks = []
         chunks_path = Path(chunks_dir)
@@ -41,12 +196,29 @@ class EmbeddingIndexer:
             logger.warning("%s does not exist. Make sure Person 2 ran ingestion.", chunks_dir)
             return chunks
 
+        if doc_ids is None:
+            doc_folders = chunks_path.iterdir()
+        else:
+            doc_folders = [chunks_path / doc_id for doc_id in doc_ids]
+
         # walk through all doc_id folders
-        for doc_folder in chunks_path.iterdir():
+        for doc_folder in doc_folders:
             if doc_folder.is_dir():
                 doc_id = doc_folder.name
                 logger.info("Loading chunks from doc_id: %s", doc_id)
 
+                segment = doc_folder / SEGMENT_FILE
+                if segment.is_file():
+                    try:
+                        doc_chunks = read_segment(segment)
+                    except Exception as e:  # pragma: no cover - defensive logging
+                        logger.error("Error loading %s: %s", segment, e)
+                        continue
+                    for chunk_data in doc_chunks:
+                        chunk_data["chunk_id"] = f"{doc_id}_chunk_{chunk_data['chunk_index']}"
+                    chunks.extend(doc_chunks)
+                    continue
+
                 # load all chunk_*.json files ordered by index
                 chunk_files = sorted(
                     doc_folder.glob("chunk_*.json"),
@@ -68,105 +240,890 @@ class EmbeddingIndexer:
         return chunks
 
     def embed_chunks(self, chunks):
-        """Generate embeddings for all chunks."""
+        """Generate embeddings for all chunks.
+
+        Also records in ``truncation_stats`` how many tokens the model cuts
+        off at its max sequence length, and warns if any are dropped.
+        """
         if not chunks:
             logger.warning("No chunks to embed.")
             return np.array([])
 
         texts = [chunk["text"] for chunk in chunks]
+        self.truncation_stats = self.count_truncation(texts)
+        if self.truncation_stats and self.truncation_stats["dropped_tokens"]:
+            logger.warning(
+                "%d/%d chunks exceed the model's %d-token limit; %d of %d tokens are not embedded "
+                "(chunk with CHUNK_MODE=tokens to avoid this)",
+                self.truncation_stats["truncated_chunks"],
+                self.truncation_stats["chunks"],
+                self.truncation_stats["max_seq_length"],
+                self.truncation_stats["dropped_tokens"],
+                self.truncation_stats["total_tokens"],
+            )
+
+        if self.embedding_cache is None:
+            return self._encode(texts)
+
+        embeddings, missing = self.embedding_cache.get_many(texts)
+        if missing:
+            # identical boilerplate paragraphs are encoded once
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = self._encode(unique_texts)
+            self.embedding_cache.put_many(unique_texts, encoded)
+            rows = {text: row for row, text in enumerate(unique_texts)}
+            for i in missing:
+                embeddings[i] = encoded[rows[texts[i]]]
 
+        stats = self.embedding_cache.stats()
+        logger.info(
+            "Embedding cache: %d/%d chunks cached (lifetime hits=%d misses=%d)",
+            len(texts) - len(missing),
+            len(texts),
+            stats["hits"],
+            stats["misses"],
+        )
+        return embeddings
+
+    def count_truncation(self, texts):
+        """Count the tokens the model would drop from ``texts``.
+
+        Uses the model's own tokenizer (special tokens included) against its
+        ``max_seq_length``. Returns None if the model exposes neither.
+        """
+        tokenizer = getattr(self.model, "tokenizer", None)
+        max_seq_length = getattr(self.model, "max_seq_length", None)
+        if tokenizer is None or not max_seq_length:
+            return None
+
+        total = truncated = dropped = 0
+        for start in range(0, len(texts), TOKENIZE_BATCH_SIZE):
+            encoded = tokenizer(texts[start : start + TOKENIZE_BATCH_SIZE], verbose=False)
+            for ids in encoded["input_ids"]:
+                total += len(ids)
+                if len(ids) > max_seq_length:
+                    truncated += 1
+                    dropped += len(ids) - max_seq_length
+        return {
+            "chunks": len(texts),
+            "max_seq_length": max_seq_length,
+            "total_tokens": total,
+            "truncated_chunks": truncated,
+            "dropped_tokens": dropped,
+        }
+
+    def _encode(self, texts):
+        """Run the embedding model over ``texts`` and record ``embedding_stats``."""
         logger.info("Generating embeddings for %d chunks...", len(texts))
-        embeddings = self.model.encode(
-            texts,
-            show_progress_bar=True,
-            batch_size=32,
-            convert_to_numpy=True,
-            normalize_embeddings=False,  # normalized later for FAISS search
+        started = time.perf_counter()
+        if self.embed_processes > 1 and len(texts) >= BULK_MIN_TEXTS:
+            threads = self.embed_threads or max(1, (os.cpu_count() or 1) // self.embed_processes)
+            embeddings = encode_bulk(
+                texts,
+                self.model_name,
+                self.embed_processes,
+                threads_per_process=threads,
+                batch_size=EMBED_BATCH_SIZE,
+                tokenizer=getattr(self.model, "tokenizer", None),
+                **self._bulk_loader(),
+            )
+            processes = self.embed_processes
+        else:
+            embeddings = self.model.encode(
+                texts,
+                show_progress_bar=True,
+                batch_size=EMBED_BATCH_SIZE,
+                convert_to_numpy=True,
+                normalize_embeddings=False,  # normalized later for FAISS search
+            )
+            processes, threads = 1, None
+
+        self.embedding_stats = throughput(len(texts), time.perf_counter() - started, processes, threads)
+        logger.info(
+            "Generated embeddings with shape: %s (%.1f embeddings/s)",
+            embeddings.shape,
+            self.embedding_stats["embeddings_per_second"],
         )
+        return np.asarray(embeddings, dtype="float32")
 
-        logger.info("Generated embeddings with shape: %s", embeddings.shape)
-        return embeddings
+    def _bulk_loader(self):
+        """Extra ``encode_bulk`` arguments that load this backend in its workers."""
+        if self.backend == "onnx":
+            return {"load_model": partial(load_onnx_encoder, model_dir=str(self.onnx_dir), quantized=self.quantized)}
+        return {}
 
     def build_index(self, embeddings, chunks):
-        """Build FAISS index from embeddings."""
+        """Build FAISS index from embeddings.
+
+        Vectors are stored under stable integer chunk IDs (0..n-1 for a fresh
+        build) so later deletes and upserts don't shift existing entries.
+        IVF and SQ8 indexes are trained on a sample of the embeddings first.
+        ``embeddings`` is normalized in place when it is a writable float32
+        array, so a build holds a single copy of the matrix.
+        """
         if len(embeddings) == 0:
             logger.warning("No embeddings to index.")
             return
 
-        self.index = faiss.IndexFlatIP(self.dimension)
+        vectors = self._normalized(embeddings)
+        index = self._create_index(vectors)
+        ids = np.arange(len(chunks), dtype="int64")
+        index.add_with_ids(vectors, ids)
+        vector_file = None
+        if self.index_type in RERANK_TYPES:
+            # a new file: published snapshots keep serving the rows of the old one
+            vector_file = VectorFile.create(self.index_path, self.dimension).extended(0, vectors)
+        metadata = ColumnarMetadata().with_chunks(ids.tolist(), chunks)
+        metadata_filter = MetadataFilter().plus(ids.tolist(), chunks)
+
+        # built aside, swapped in as one unit
+        with self._state_lock:
+            self._close_index_source()
+            self.index, self.delta = index, DeltaIndex(self.dimension, len(chunks))
+            self.vectors = vector_file
+            self.chunk_metadata, self.metadata_filter = metadata, metadata_filter
+            self.deleted_ids = set()
+            self.next_id = len(chunks)
+            self._base_saved, self._delta_segments = False, []
+
+        logger.info("Built %s FAISS index with %d vectors", self.index_type, self.ntotal)
+
+    @property
+    def ntotal(self):
+        """Vectors in the base index plus the delta, tombstoned ones included."""
+        index, delta = self.index, self.delta
+        return (index.ntotal if index is not None else 0) + len(delta)
+
+    @staticmethod
+    def _normalized(embeddings):
+        """Return float32 embeddings L2-normalized for cosine similarity.
+
+        A writable, C-contiguous float32 array is normalized in place;
+        anything else is converted to one first.
+        """
+        vectors = np.require(embeddings, dtype="float32", requirements=["C", "W"])
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def _create_index(self, vectors):
+        """Create an empty, trained ID-mapped index of ``self.index_type``."""
+        params = self.index_params
+        n = len(vectors)
+        index_type = self.index_type
+
+        if index_type in ("ivf_flat", "ivf_pq"):
+            # k-means needs enough points per centroid; shrink nlist on small corpora
+            params["nlist"] = max(1, min(params["nlist"], n // MIN_POINTS_PER_CENTROID))
+            if index_type == "ivf_pq" and n < 2 ** params["pq_nbits"]:
+                logger.warning("Too few vectors (%d) to train PQ codebooks; using ivf_flat", n)
+                index_type = self.index_type = "ivf_flat"
+
+        if index_type == "flat":
+            description = "Flat"
+        elif index_type == "ivf_flat":
+            description = f"IVF{params['nlist']},Flat"
+        elif index_type == "ivf_pq":
+            description = f"IVF{params['nlist']},PQ{params['pq_m']}x{params['pq_nbits']}"
+        elif index_type == "sq8":
+            description = "SQ8"  # one byte per dimension
+        elif index_type == "binary":
+            description = "LSH"  # one sign bit per dimension, compared by Hamming distance
+        else:
+            description = f"HNSW{params['hnsw_m']},Flat"
+
+        # FAISS only implements LSH codes for the L2 metric; rank order is what matters here
+        metric = faiss.METRIC_L2 if index_type == "binary" else faiss.METRIC_INNER_PRODUCT
+        index = faiss.index_factory(self.dimension, f"IDMap2,{description}", metric)
+
+        if index_type == "hnsw":
+            faiss.downcast_index(index.index).hnsw.efConstruction = params["ef_construction"]
+        if not index.is_trained:
+            sample_size = min(n, MAX_TRAINING_POINTS)
+            sample = vectors
+            if sample_size < n:
+                rows = np.random.default_rng(0).choice(n, sample_size, replace=False)
+                sample = vectors[np.sort(rows)]
+            logger.info("Training %s index on %d vectors", index_type, sample_size)
+            index.train(sample)
+
+        return index
+
+    def _search_parameters(self, profile, k, selector=None):
+        """Map a search profile and ID selector to FAISS search parameters."""
+        profile = profile or self.search_profile
+        if profile not in SEARCH_PROFILES:
+            raise ValueError(f"Unknown search profile: {profile}")
+        settings = SEARCH_PROFILES[profile]
+
+        if self.index_type in ("ivf_flat", "ivf_pq"):
+            nlist = self.index_params["nlist"]
+            params = faiss.SearchParametersIVF()
+            params.nprobe = min(settings["nprobe"] or nlist, nlist)
+        elif self.index_type == "hnsw":
+            params = faiss.SearchParametersHNSW()
+            params.efSearch = max(settings["ef_search"], k)
+        elif selector is not None:
+            params = faiss.SearchParameters()
+        else:
+            return None
+
+        if selector is not None:
+            params.sel = selector
+        return params
+
+    def _add_vectors(self, vectors, chunks):
+        """Add normalized vectors under freshly assigned chunk IDs.
+
+        Nothing a search may be using is modified: the vectors go into a new
+        delta, metadata and filter are extended copies, and all of them are
+        swapped in together.
+        """
+        ids = np.arange(self.next_id, self.next_id + len(chunks), dtype="int64")
+        delta = self.delta.appended(ids, vectors)
+        vector_file = self.vectors.extended(self.next_id, vectors) if self.vectors is not None else None
+        metadata = self.chunk_metadata.with_chunks(ids.tolist(), chunks)
+        metadata_filter = self.metadata_filter.plus(ids.tolist(), chunks)
+        with self._state_lock:
+            self.delta, self.vectors = delta, vector_file
+            self.chunk_metadata, self.metadata_filter = metadata, metadata_filter
+            self.next_id += len(chunks)
+
+    def add_to_index(self, embeddings, chunks):
+        """Append embeddings and their metadata to the existing index.
+
+        Builds a fresh index when none is loaded yet.
+        """
+        if len(embeddings) == 0:
+            logger.warning("No embeddings to add.")
+            return
+
+        if self.index is None:
+            self.build_index(embeddings, chunks)
+            return
+
+        self._add_vectors(self._normalized(embeddings), chunks)
+
+        logger.info("Added %d vectors to FAISS index (total %d)", len(chunks), self.ntotal)
+
+    def delete_documents(self, doc_ids):
+        """Tombstone all chunks belonging to ``doc_ids``.
+
+        The vectors stay in the index until ``compact`` runs; search skips
+        them in the meantime. Returns the number of tombstoned chunks.
+        """
+        doc_ids = set(doc_ids)
+        with self._lock:
+            ids = [i for i in self.metadata_filter.doc_chunk_ids(doc_ids).tolist() if i not in self.deleted_ids]
+            if ids:
+                # a new set: searches may be iterating the current one
+                with self._state_lock:
+                    self.deleted_ids = self.deleted_ids | set(ids)
+
+        if ids:
+            logger.info("Tombstoned %d chunks for %d doc_id(s)", len(ids), len(doc_ids))
+        return len(ids)
+
+    def replace_document(self, doc_id, chunks_dir: str = "./storage/chunks", replacement_doc_id=None):
+        """Replace a document's vectors with freshly ingested chunks.
+
+        Without ``replacement_doc_id`` the chunks are re-read from
+        ``<chunks_dir>/<doc_id>``; otherwise the old document is tombstoned and
+        the replacement document is indexed in its place, in one snapshot.
+        Returns the number of chunks indexed.
+        """
+        if replacement_doc_id is None or replacement_doc_id == doc_id:
+            return self.upsert_documents([doc_id], chunks_dir)
+
+        chunks = self.load_chunks(chunks_dir, doc_ids=[replacement_doc_id])
+        if not chunks:
+            logger.warning("No chunks found for replacement doc_id: %s", replacement_doc_id)
+            return 0
+        return self.index_documents([replacement_doc_id, doc_id], self.embed_chunks(chunks), chunks)
+
+    def has_document(self, doc_id):
+        """Whether ``doc_id`` has live (not tombstoned) chunks in the latest snapshot."""
+        self.refresh_index()
+        with self._state_lock:
+            metadata_filter, deleted = self.metadata_filter, self.deleted_ids
+        return any(i not in deleted for i in metadata_filter.doc_chunk_ids([doc_id]).tolist())
+
+    def tombstone_ratio(self):
+        """Fraction of indexed vectors that are tombstoned."""
+        ntotal = self.ntotal
+        if ntotal == 0:
+            return 0.0
+        return len(self.deleted_ids) / ntotal
+
+    def compact(self, chunks_dir=None):
+        """Physically drop tombstoned vectors and metadata.
+
+        The compacted index is built next to the live one and swapped in, so
+        concurrent searches keep running. When ``chunks_dir`` is given, the
+        chunk folders of documents with no live chunks left are deleted too.
+        Returns the number of reclaimed vectors.
+        """
+        with self.writing():
+            if self.index is None or not self.deleted_ids:
+                return 0
+
+            deleted = self.deleted_ids
+            compacted = self._folded_index(drop=deleted)
+            vectors = self.vectors
+            if vectors is not None:
+                # a new file holding only live rows; snapshots still serving the old one keep it
+                live_ids = np.setdiff1d(self.metadata_filter.chunk_ids(), np.fromiter(deleted, dtype="int64"))
+                vectors = vectors.compacted(self.index_path, live_ids)
+
+            metadata = self.chunk_metadata.without(deleted)
+            metadata_filter = MetadataFilter.from_columns(*metadata.filter_columns())
+            dead_docs = {self.chunk_metadata[i].get("doc_id") for i in deleted if i in self.chunk_metadata}
+            dead_docs = {doc_id for doc_id in dead_docs if not len(metadata_filter.doc_chunk_ids([doc_id]))}
 
-        # normalize embeddings for cosine similarity
-        embeddings_normalized = embeddings.copy()
-        faiss.normalize_L2(embeddings_normalized)
+            with self._state_lock:
+                self._close_index_source()
+                self.index, self.delta, self.vectors = compacted, DeltaIndex(self.dimension, self.next_id), vectors
+                self.chunk_metadata, self.deleted_ids = metadata, set()
+                self.metadata_filter = metadata_filter
+                self._base_saved, self._delta_segments = False, []
+            self.save_index()
 
-        self.index.add(embeddings_normalized)
-        self.chunk_metadata = chunks
+            if chunks_dir is not None:
+                for doc_id in dead_docs:
+                    doc_folder = Path(chunks_dir) / doc_id
+                    if doc_id and doc_folder.is_dir():
+                        shutil.rmtree(doc_folder)
 
-        logger.info("Built FAISS index with %d vectors", self.index.ntotal)
+        logger.info("Compacted index: reclaimed %d vectors, removed %d doc folder(s)", len(deleted), len(dead_docs))
+        return len(deleted)
+
+    def _folded_index(self, drop=()):
+        """Return a new base index holding the base and delta vectors minus ``drop``.
+
+        The live base index is copied, not modified, so searches running on
+        it are unaffected.
+        """
+        drop = np.array(sorted(drop), dtype="int64")
+        delta_ids, delta_vectors = self.delta.ids, self.delta.vectors
+        if len(drop) and len(delta_ids):
+            keep = ~np.isin(delta_ids, drop)
+            delta_ids, delta_vectors = delta_ids[keep], delta_vectors[keep]
+
+        if self.index_type == "hnsw" and len(drop):
+            # HNSW graphs can't drop nodes; re-insert the stored exact vectors
+            base_ids = faiss.vector_to_array(self.index.id_map)
+            live_ids = np.setdiff1d(base_ids, drop)
+            folded = faiss.index_factory(
+                self.dimension, f"IDMap2,HNSW{self.index_params['hnsw_m']},Flat", faiss.METRIC_INNER_PRODUCT
+            )
+            faiss.downcast_index(folded.index).hnsw.efConstruction = self.index_params["ef_construction"]
+            if len(live_ids):
+                folded.add_with_ids(self.index.reconstruct_batch(live_ids), live_ids)
+        else:
+            folded = self._index_copy()
+            if len(drop):
+                folded.remove_ids(drop)
+
+        if len(delta_ids):
+            folded.add_with_ids(delta_vectors, delta_ids)
+        return folded
+
+    def _index_copy(self):
+        """Return a private in-memory copy of the base index.
+
+        A memory-mapped index is read again from the file handle opened at
+        load time (mapped IVF lists are read-only and can't be cloned), so
+        the copy matches it even if the file has since been replaced.
+        """
+        if self._index_source is None:
+            return faiss.clone_index(self.index)
+        self._index_source.seek(0)
+        return faiss.read_index(faiss.PyCallbackIOReader(self._index_source.read))
+
+    def refresh_index(self):
+        """Load the published snapshot if it is newer than the one in memory.
+
+        The new snapshot is read in full before being swapped in, so searches
+        keep running against the old one meanwhile.
+        """
+        version = index_snapshots.current_version(self.index_path)
+        if version is None:
+            return self.index is None and self.load_index()
+        if self.index is not None and version == self.index_version:
+            return False
+        with self._lock:
+            return self.load_index()
+
+    @contextmanager
+    def writing(self, refresh=True):
+        """Hold the in-process and cross-process writer locks for a write sequence.
+
+        Wrap refresh -> mutate -> ``save_index`` in this, so writers in other
+        processes can't publish in between and have their changes dropped.
+        With ``refresh`` the published snapshot is loaded first. Nested calls
+        in the same thread only re-enter.
+        """
+        with self._lock:
+            if self._writing:
+                yield
+                return
+            with index_snapshots.writer_lock(self.index_path):
+                self._writing = True
+                try:
+                    if refresh:
+                        self.refresh_index()
+                    yield
+                finally:
+                    self._writing = False
+
+    def upsert_documents(self, doc_ids, chunks_dir: str = "./storage/chunks"):
+        """Embed only the chunks of ``doc_ids`` and merge them into the saved index.
+
+        Existing vectors for the same doc_ids are tombstoned and replaced.
+        Cost depends on the size of the given documents, not on the size of
+        the corpus. Returns the number of chunks indexed.
+        """
+        chunks = self.load_chunks(chunks_dir, doc_ids=doc_ids)
+        if not chunks:
+            logger.warning("No chunks found for doc_ids: %s", doc_ids)
+            return 0
+
+        return self.index_documents(doc_ids, self.embed_chunks(chunks), chunks)
+
+    def index_documents(self, doc_ids, embeddings, chunks):
+        """Replace the vectors of ``doc_ids`` with already computed embeddings and publish.
+
+        Used by streaming ingestion, which embeds chunks batch by batch while
+        the document is still being extracted. Returns the number of chunks indexed.
+        """
+        with self.writing():
+            self.delete_documents(doc_ids)
+            self.add_to_index(embeddings, chunks)
+            self.save_index()
+
+        logger.info("Upserted %d chunks for %d doc_id(s)", len(chunks), len(doc_ids))
+        return len(chunks)
 
     def save_index(self):
-        """Persist index and metadata to disk."""
+        """Persist index and metadata as a new snapshot and publish it.
+
+        Readers switch over only when ``CURRENT`` is replaced, after the whole
+        snapshot is on disk. Old snapshots beyond ``SNAPSHOTS_KEEP`` are removed.
+        Publishing takes the writer lock; callers that loaded the snapshot
+        they modified should hold it since then (see ``writing``).
+        """
         if self.index is None:
             logger.warning("No index to save.")
             return
 
-        index_file = self.index_path / "faiss.index"
-        metadata_file = self.index_path / "metadata.pkl"
+        with self.writing(refresh=False):
+            self._save_snapshot()
+
+    def _save_snapshot(self):
+        """Write the in-memory state to a new snapshot and publish it (writer lock held).
 
-        faiss.write_index(self.index, str(index_file))
-        with open(metadata_file, "wb") as f:
-            pickle.dump(self.chunk_metadata, f)
+        While the base index is the one of the previous snapshot, its
+        faiss.index, metadata store and delta segments are hard-linked and
+        only the rows added since then are written, as a new delta segment.
+        Otherwise, or once the delta outgrows ``DELTA_MAX_ROWS`` and
+        ``DELTA_MAX_FRACTION`` of the base, the delta is folded into a new base
+        index that is written in full.
+        """
+        previous = index_snapshots.snapshot_path(self.index_path, self.index_version) if self.index_version else None
+        fold = (
+            not self._base_saved
+            or not previous.is_dir()  # collected since it was loaded
+            or (len(self.delta) > DELTA_MAX_ROWS and len(self.delta) > DELTA_MAX_FRACTION * self.index.ntotal)
+        )
+        index, delta, segments = self.index, self.delta, []
+        if fold and len(delta):
+            # tombstones stay until compaction
+            index = self._folded_index()
+        version, snapshot_dir = index_snapshots.create_snapshot(self.index_path)
+        index_file = snapshot_dir / "faiss.index"
+        metadata_dir = snapshot_dir / "metadata"
+        params_file = snapshot_dir / "index_params.json"
+
+        if fold:
+            faiss.write_index(index, str(index_file))
+            # reopening from disk drops the in-memory overlay of newly added chunks
+            metadata = self.chunk_metadata.save(metadata_dir, self.next_id, self.deleted_ids)
+        else:
+            index_snapshots.link_into(previous / "faiss.index", index_file)
+            index_snapshots.link_into(previous / "metadata", metadata_dir)
+            for name in self._delta_segments:
+                index_snapshots.link_into(previous / DELTA_DIR / name, snapshot_dir / DELTA_DIR / name)
+            segments = list(self._delta_segments)
+            saved_rows = sum(len(np.load(snapshot_dir / DELTA_DIR / name / "ids.npy", mmap_mode="r")) for name in segments)
+            if len(delta) > saved_rows:
+                write_delta_segment(
+                    snapshot_dir / DELTA_DIR / version, delta.ids[saved_rows:], delta.vectors[saved_rows:], self.chunk_metadata
+                )
+                segments.append(version)
+            metadata = self.chunk_metadata
+        np.save(snapshot_dir / "deleted.npy", np.asarray(sorted(self.deleted_ids), dtype="int64"))
 
-        logger.info("Saved index to %s", self.index_path)
+        params = {
+            "index_type": self.index_type,
+            "index_params": self.index_params,
+            "search_profile": self.search_profile,
+            "dimension": self.dimension,
+            "model_name": self.model_name,
+            "encoder": {"backend": self.backend, "int8": self.quantized},
+            "next_id": self.next_id,
+            "delta": {"start": self.next_id if fold else delta.start, "segments": segments},
+        }
+        vectors = None
+        if self.vectors is not None:
+            vectors = self.vectors.publish(snapshot_dir)
+            params["vector_rows"] = vectors.rows
+        with open(params_file, "w", encoding="utf-8") as f:
+            json.dump(params, f, indent=2)
+        index_snapshots.publish(self.index_path, version)
+        with self._state_lock:
+            if index is not self.index:
+                self._close_index_source()
+                self.index, self.delta = index, DeltaIndex(self.dimension, self.next_id)
+            self.chunk_metadata = metadata
+            self.index_version = version
+            self._base_saved, self._delta_segments = True, segments
+            if vectors is not None:
+                self.vectors = vectors
+
+        self._remove_unversioned_files()
+        remove_stale_staging(self.index_path, keep=self.vectors)
+        index_snapshots.collect_garbage(self.index_path, SNAPSHOTS_KEEP, protect=[version])
+
+        logger.info(
+            "Saved index snapshot %s to %s (%s)",
+            version,
+            snapshot_dir,
+            "base index rewritten" if fold else f"{len(delta)} delta rows in {len(segments)} segment(s)",
+        )
         logger.info("  - Index file: %s", index_file)
-        logger.info("  - Metadata file: %s", metadata_file)
+        logger.info("  - Metadata store: %s", metadata_dir)
+        logger.info("  - Params file: %s", params_file)
+
+    def _remove_unversioned_files(self):
+        """Drop index files from before snapshots existed, once one is published."""
+        for name in ("faiss.index", "index_params.json", "metadata.pkl"):
+            legacy_file = self.index_path / name
+            if legacy_file.exists():
+                legacy_file.unlink()
+        if (self.index_path / "metadata").is_dir():
+            shutil.rmtree(self.index_path / "metadata", ignore_errors=True)
+
+    def load_index(self, mmap=None):
+        """Load the published snapshot (or an unversioned index from before snapshots).
 
-    def load_index(self):
-        """Load existing index and metadata."""
-        index_file = self.index_path / "faiss.index"
-        metadata_file = self.index_path / "metadata.pkl"
+        With ``mmap`` (default ``$VECTOR_INDEX_MMAP``) the FAISS index is
+        memory-mapped read-only, so forked workers share its pages through the
+        page cache. The first mutation swaps in a private in-memory copy.
+        """
+        if mmap is None:
+            mmap = os.getenv("VECTOR_INDEX_MMAP", "0") == "1"
+        version = index_snapshots.current_version(self.index_path)
+        base_dir = index_snapshots.snapshot_path(self.index_path, version) if version else self.index_path
+        index_file = base_dir / "faiss.index"
+        metadata_dir = base_dir / "metadata"
+        params_file = base_dir / "index_params.json"
 
         if not index_file.exists():
             logger.warning("No existing index found at %s", index_file)
             return False
 
-        self.index = faiss.read_index(str(index_file))
-        with open(metadata_file, "rb") as f:
-            self.chunk_metadata = pickle.load(f)
+        index, source = None, None
+        if mmap:
+            source = open(index_file, "rb")
+            try:
+                index = faiss.read_index(str(index_file), MMAP_READ_FLAGS)
+            except RuntimeError as e:
+                logger.warning("Memory-mapping %s failed (%s); reading it into memory", index_file, e)
+                source.close()
+                source = None
+        if index is None:
+            index = faiss.read_index(str(index_file))
+
+        params = {}
+        if params_file.exists():
+            with open(params_file, "r", encoding="utf-8") as f:
+                params = json.load(f)
+            index_type = params["index_type"]
+            index_params = params["index_params"]
+            search_profile = params.get("search_profile", self.search_profile)
+        else:
+            # indexes saved before index types existed are flat
+            index_type, index_params, search_profile = "flat", {}, self.search_profile
+
+        vectors = None
+        if index_type in RERANK_TYPES:
+            vectors = VectorFile(base_dir / VECTORS_FILE, self.dimension, params["vector_rows"])
+
+        base_saved = version is not None and ColumnarMetadata.exists(metadata_dir)
+        if ColumnarMetadata.exists(metadata_dir):
+            metadata = ColumnarMetadata(metadata_dir)
+        else:
+            index, metadata = self._load_legacy_metadata(index)
+        # snapshots from before delta segments keep next_id and tombstones in the metadata store
+        next_id = params.get("next_id", metadata.next_id)
+        deleted_file = base_dir / "deleted.npy"
+        deleted_ids = np.load(deleted_file).tolist() if version and deleted_file.exists() else metadata.deleted_ids
+
+        delta_params = params.get("delta", {})
+        delta = DeltaIndex(self.dimension, delta_params.get("start", metadata.next_id))
+        for name in delta_params.get("segments", []):
+            ids, delta_vectors, segment_metadata = read_delta_segment(base_dir / DELTA_DIR / name)
+            delta = delta.appended(ids, delta_vectors)
+            metadata = metadata.with_chunks(ids.tolist(), [segment_metadata[i] for i in ids.tolist()])
+        metadata_filter = MetadataFilter.from_columns(*metadata.filter_columns())
+
+        # everything is read; swap it in as one unit
+        with self._state_lock:
+            self._close_index_source()
+            self.index, self.delta = index, delta
+            self._index_source = source
+            self.index_type, self.index_params, self.search_profile = index_type, index_params, search_profile
+            self.vectors = vectors
+            self.chunk_metadata = metadata
+            self.next_id = next_id
+            self.deleted_ids = set(deleted_ids)
+            self.metadata_filter = metadata_filter
+            self.index_version = version
+            self._base_saved, self._delta_segments = base_saved, list(delta_params.get("segments", []))
 
-        logger.info("Loaded index with %d vectors", self.index.ntotal)
+        logger.info(
+            "Loaded %s index %s with %d vectors (%d tombstoned)",
+            self.index_type,
+            version or "(unversioned)",
+            self.ntotal,
+            len(self.deleted_ids),
+        )
         return True
 
-    def search(self, query_text, k: int = 5, filters=None):
-        """Search for top-k most similar chunks."""
-        if self.index is None or self.index.ntotal == 0:
+    def _close_index_source(self):
+        if self._index_source is not None:
+            self._index_source.close()
+            self._index_source = None
+
+    def _load_legacy_metadata(self, index):
+        """Convert a pickled metadata.pkl into an in-memory columnar store.
+
+        Very old layouts pickled a plain list aligned with a bare IndexFlatIP;
+        those are re-keyed to stable chunk IDs 0..n-1.
+        """
+        with open(self.index_path / "metadata.pkl", "rb") as f:
+            legacy = pickle.load(f)
+
+        if isinstance(legacy, list):
+            logger.info("Upgrading legacy index to stable chunk IDs")
+            ids = np.arange(index.ntotal, dtype="int64")
+            vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else None
+            index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+            if vectors is not None:
+                index.add_with_ids(vectors, ids)
+            legacy = {"chunks": dict(enumerate(legacy)), "next_id": len(legacy), "deleted_ids": []}
+
+        metadata = ColumnarMetadata()
+        for chunk_id, chunk in sorted(legacy["chunks"].items()):
+            metadata[chunk_id] = chunk
+        metadata.next_id = legacy["next_id"]
+        metadata.deleted_ids = list(legacy["deleted_ids"])
+        return index, metadata
+
+    def search(self, query_text, k: int = 5, filters=None, profile=None):
+        """Search for top-k most similar chunks.
+
+        ``filters`` (see ``MetadataFilter.select``) restrict the scan to the
+        matching chunk IDs, so exactly k hits come back whenever k matching
+        chunks exist. ``profile`` is one of ``SEARCH_PROFILES`` and only
+        affects IVF/HNSW indexes and the shortlist size of two-stage
+        indexes; it defaults to the indexer's ``search_profile``.
+        """
+        results = self.search_batch([{"query": query_text, "k": k, "filters": filters, "profile": profile}])[0]
+        logger.info("Search returned %d results for query: '%s...'", len(results), query_text[:50])
+        return results
+
+    def search_batch(self, queries):
+        """Search for many queries with one encode call.
+
+        ``queries`` is a list of dicts with ``query`` and optional ``k``
+        (default 5), ``filters`` and ``profile``, as for ``search``. Queries
+        sharing the same filters and profile go through a single
+        ``index.search`` over their query matrix. Returns one result list per
+        query, in input order.
+        """
+        with self._state_lock:
+            index, delta, metadata, deleted = self.index, self.delta, self.chunk_metadata, self.deleted_ids
+            metadata_filter, vectors = self.metadata_filter, self.vectors
+        if index is None or index.ntotal + len(delta) == 0:
             logger.warning("Index is empty or not loaded.")
-            return []
+            return [[] for _ in queries]
 
-        query_embedding = self.model.encode([query_text], convert_to_numpy=True)
-        faiss.normalize_L2(query_embedding)
+        groups = {}
+        for position, query in enumerate(queries):
+            key = (json.dumps(query.get("filters") or {}, sort_keys=True), query.get("profile"))
+            groups.setdefault(key, []).append(position)
 
-        search_k = k * 3 if filters else k
-        scores, indices = self.index.search(query_embedding, min(search_k, self.index.ntotal))
+        query_embeddings = self._encode_queries([query["query"] for query in queries])
+        excluded_all = np.fromiter(deleted, dtype="int64", count=len(deleted)) if deleted else None
 
-        results = []
-        for idx, score in zip(indices[0], scores[0]):
-            if idx < 0 or idx >= len(self.chunk_metadata):
+        results = [[] for _ in queries]
+        for (_, profile), positions in groups.items():
+            allowed = metadata_filter.select(queries[positions[0]].get("filters"))
+            # base and delta are searched apart; the delta holds IDs from delta.start on
+            if allowed is not None:
+                if excluded_all is not None:
+                    allowed = np.setdiff1d(allowed, excluded_all)
+                in_delta = allowed >= delta.start
+                base_allowed, base_excluded = allowed[~in_delta], None
+                delta_allowed, delta_excluded = allowed[in_delta], None
+                base_candidates, delta_candidates = len(base_allowed), len(delta_allowed)
+            else:
+                base_allowed = delta_allowed = None
+                base_excluded = delta_excluded = excluded_all
+                if excluded_all is not None:
+                    in_delta = excluded_all >= delta.start
+                    base_excluded, delta_excluded = excluded_all[~in_delta], excluded_all[in_delta]
+                base_candidates = index.ntotal - (len(base_excluded) if base_excluded is not None else 0)
+                delta_candidates = len(delta) - (len(delta_excluded) if delta_excluded is not None else 0)
+
+            ks = [min(queries[p].get("k", 5), base_candidates + delta_candidates) for p in positions]
+            group_k = max(ks)
+            if group_k <= 0:
                 continue
 
-            chunk = self.chunk_metadata[idx].copy()
+            group_queries = query_embeddings[positions]
+            base_k = min(group_k, base_candidates)
+            if base_k <= 0:
+                scores = np.empty((len(positions), 0), dtype="float32")
+                ids = np.empty((len(positions), 0), dtype="int64")
+            elif vectors is not None:
+                scores, ids = self._rerank_search(
+                    index, vectors, group_queries, base_k, profile, base_allowed, base_excluded
+                )
+            else:
+                scores, ids = self._search_index(index, group_queries, base_k, profile, base_allowed, base_excluded)
+            if delta_candidates > 0:
+                delta_scores, delta_ids = delta.search(group_queries, group_k, delta_allowed, delta_excluded)
+                scores, ids = self._merge_hits(scores, ids, delta_scores, delta_ids, group_k)
+            for row, (position, k) in enumerate(zip(positions, ks)):
+                results[position] = self._collect_hits(metadata, ids[row][:k], scores[row][:k])
+
+        return results
+
+    @staticmethod
+    def _merge_hits(scores, ids, delta_scores, delta_ids, k):
+        """Merge base and delta hits (inner products) into the top ``k`` per query."""
+        scores = np.concatenate([np.where(ids >= 0, scores, -np.inf), delta_scores], axis=1)
+        ids = np.concatenate([ids, delta_ids], axis=1)
+        top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, top, axis=1), np.take_along_axis(ids, top, axis=1)
+
+    def _encode_queries(self, query_texts):
+        """Return L2-normalized float32 embeddings for the query texts.
+
+        Only queries missing from the query cache go through the model.
+        """
+        cache = self.query_cache
+        query_embeddings = np.zeros((len(query_texts), self.dimension), dtype="float32")
+        misses = {}  # normalized text -> positions
+        for position, text in enumerate(query_texts):
+            vector = cache.get(self.encoder_id, text) if cache is not None else None
+            if vector is None:
+                misses.setdefault(normalize_query(text), []).append(position)
+            else:
+                query_embeddings[position] = vector
+
+        if misses:
+            texts = list(misses)
+            encoded = np.asarray(self.model.encode(texts, convert_to_numpy=True), dtype="float32")
+            faiss.normalize_L2(encoded)
+            for text, vector in zip(texts, encoded):
+                query_embeddings[misses[text]] = vector
+                if cache is not None:
+                    cache.put(self.encoder_id, text, vector)
+
+        return query_embeddings
+
+    @staticmethod
+    def _collect_hits(metadata, ids, scores):
+        """Turn one row of FAISS output into chunk dicts with scores."""
+        hits = []
+        for chunk_id, score in zip(ids, scores):
+            chunk_id = int(chunk_id)
+            if chunk_id < 0 or chunk_id not in metadata:
+                continue
+
+            chunk = metadata[chunk_id].copy()
             chunk["score"] = float(score)
+            hits.append(chunk)
+        return hits
 
-            if filters:
-                if "doc_id" in filters and chunk.get("doc_id") != filters["doc_id"]:
-                    continue
+    def _search_index(self, index, query_embeddings, k, profile, allowed, excluded):
+        """Run one filtered FAISS search that returns ``k`` hits per query.
 
-            results.append(chunk)
-            if len(results) >= k:
-                break
+        ``k`` must not exceed the number of selectable chunks. Rows where an
+        approximate index comes back short (its probed lists or graph walk
+        missed the selected IDs) are searched again exhaustively.
+        """
+        selector = id_selector(allowed, excluded)
+        params = self._search_parameters(profile, k, selector)
+        scores, ids = index.search(query_embeddings, k, params=params)
 
-        logger.info("Search returned %d results for query: '%s...'", len(results), query_text[:50])
-        return results
+        short = np.flatnonzero((ids >= 0).sum(axis=1) < k)
+        if len(short):
+            if self.index_type == "hnsw" and allowed is not None:
+                # score the selected chunks directly from the stored vectors
+                exact_scores = query_embeddings[short] @ index.reconstruct_batch(allowed).T
+                top = np.argsort(-exact_scores, axis=1)[:, :k]
+                scores[short] = np.take_along_axis(exact_scores, top, axis=1)
+                ids[short] = allowed[top]
+            else:
+                params = self._search_parameters("exact", k, selector)
+                scores[short], ids[short] = index.search(query_embeddings[short], k, params=params)
+
+        return scores, ids
+
+    def _rerank_search(self, index, vectors, query_embeddings, k, profile, allowed, excluded):
+        """Shortlist with the compressed index, then re-score exactly from ``vectors``.
+
+        The shortlist holds ``rerank_factor * oversample`` candidates per hit
+        (at least ``RERANK_MIN_SHORTLIST``), and at most that many rows are
+        re-scored. A filter selecting no more chunks than that is scored
+        exactly without the first stage. FAISS's LSH index takes no ID
+        selector, so binary codes over-fetch instead: in proportion to the
+        share of the index a filter selects, or by the number of tombstones.
+        """
+        settings = SEARCH_PROFILES[profile or self.search_profile]
+        shortlist = max(k * settings["rerank_factor"] * self.index_params["oversample"], RERANK_MIN_SHORTLIST)
+
+        if allowed is not None and len(allowed) <= shortlist:
+            candidates = np.broadcast_to(allowed, (len(query_embeddings), len(allowed)))
+        elif self.index_type == "binary":
+            if allowed is not None:
+                fetch = -(-shortlist * index.ntotal // len(allowed))
+            else:
+                fetch = shortlist + (len(excluded) if excluded is not None else 0)
+            _, candidates = index.search(query_embeddings, min(fetch, index.ntotal))
+            if allowed is not None:
+                candidates = np.where(np.isin(candidates, allowed), candidates, -1)
+            elif excluded is not None:
+                candidates = np.where(np.isin(candidates, excluded), -1, candidates)
+        else:
+            params = self._search_parameters(profile, shortlist, id_selector(allowed, excluded))
+            _, candidates = index.search(query_embeddings, min(shortlist, index.ntotal), params=params)
+
+        scores = np.zeros((len(query_embeddings), k), dtype="float32")
+        ids = np.full((len(query_embeddings), k), -1, dtype="int64")
+        for row, query in enumerate(query_embeddings):
+            shortlisted = candidates[row][candidates[row] >= 0][:shortlist]
+            if allowed is not None and len(shortlisted) < k:
+                # the over-fetch missed the filter's chunks; score them all for this query
+                shortlisted = allowed
+            exact = vectors.get(shortlisted) @ query
+            top = np.argsort(-exact)[:k]
+            scores[row, : len(top)] = exact[top]
+            ids[row, : len(top)] = shortlisted[top]
+        return scores, ids
 
 
 def main():
@@ -200,14 +1157,28 @@ def main():
     print("\n[2/4] Generating embeddings...")
     embeddings = indexer.embed_chunks(chunks)
     print(f"✅ Generated embeddings with shape: {embeddings.shape}")
+    if indexer.embedding_stats:
+        stats = indexer.embedding_stats
+        print(
+            f"   Throughput: {stats['embeddings_per_second']} embeddings/s "
+            f"({stats['texts']} texts in {stats['seconds']}s, {stats['processes']} process(es))"
+        )
+    if indexer.truncation_stats:
+        stats = indexer.truncation_stats
+        print(
+            f"   Truncated: {stats['truncated_chunks']}/{stats['chunks']} chunks, "
+            f"{stats['dropped_tokens']}/{stats['total_tokens']} tokens dropped "
+            f"(limit {stats['max_seq_length']})"
+        )
 
-    print("\n[3/4] Building FAISS index...")
-    indexer.build_index(embeddings, chunks)
-    print(f"✅ Built index with {indexer.index.ntotal} vectors")
+    with indexer.writing(refresh=False):
+        print("\n[3/4] Building FAISS index...")
+        indexer.build_index(embeddings, chunks)
+        print(f"✅ Built index with {indexer.ntotal} vectors")
 
-    print("\n[4/4] Saving index to disk...")
-    indexer.save_index()
-    print("✅ Index saved successfully")
+        print("\n[4/4] Saving index to disk...")
+        indexer.save_index()
+        print("✅ Index saved successfully")
 
     print("\n" + "=" * 60)
     print("TESTING VECTOR SEARCH")
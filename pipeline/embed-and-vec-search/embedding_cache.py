@@ -0,0 +1,161 @@
+"""
+Persistent, content-addressed cache of chunk embeddings.
+
+Vectors are appended to a raw float32 file that is read through a memory map;
+a parallel file of SHA-256 digests maps each chunk text to its row. One cache
+directory is kept per model, so entries are keyed by (model, text hash).
+
+Several processes may share a cache directory. Writers take an exclusive
+``flock`` and number new rows from the key file on disk, not from their own
+view of it. Readers pick up keys other processes appended before every
+lookup. Only whole key records count: the key file is the commit point.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import hashlib
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+DIGEST_SIZE = 32  # bytes in a SHA-256 digest
+
+
+def text_key(text: str) -> bytes:
+    """Return the cache key (SHA-256 digest) for a chunk text."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir: str | Path, model_name: str, dimension: int):
+        """Open (or create) the cache for ``model_name`` under ``cache_dir``."""
+        self.dimension = dimension
+        self.path = Path(cache_dir) / re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.vectors_file = self.path / "vectors.f32"
+        self.keys_file = self.path / "keys.bin"
+        self.lock_file = self.path / ".lock"
+        self.vectors_file.touch()
+        self.keys_file.touch()
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._keys_read = 0  # bytes of keys_file indexed into _rows so far
+        self._vectors = None  # memmap over vectors_file, reopened after appends
+
+        with self._lock:
+            self._refresh()
+        logger.info("Embedding cache at %s holds %d vectors", self.path, len(self._rows))
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """Hold the cross-process writer lock of the cache directory."""
+        with open(self.lock_file, "a+b") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """Index keys appended since the last read, by any process. Call with _lock held.
+
+        Files are never truncated here: another process may be appending.
+        A torn trailing key (a writer crashed or is still writing) is left
+        for the next writer to overwrite, and vectors past the last key are
+        orphans that the next writer overwrites too.
+        """
+        size = self.keys_file.stat().st_size
+        end = size - size % DIGEST_SIZE
+        if end <= self._keys_read:
+            return
+        with open(self.keys_file, "rb") as f:
+            f.seek(self._keys_read)
+            keys = f.read(end - self._keys_read)
+        first = self._keys_read // DIGEST_SIZE
+        for i in range(len(keys) // DIGEST_SIZE):
+            self._rows.setdefault(keys[i * DIGEST_SIZE : (i + 1) * DIGEST_SIZE], first + i)
+        self._keys_read = end
+        self._open_vectors()
+
+    def _open_vectors(self) -> None:
+        rows = self._keys_read // DIGEST_SIZE
+        if rows:
+            self._vectors = np.memmap(self.vectors_file, dtype="float32", mode="r", shape=(rows, self.dimension))
+        else:
+            self._vectors = None
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_many(self, texts: Sequence[str]) -> Tuple[np.ndarray, List[int]]:
+        """Look up embeddings for ``texts``.
+
+        Returns an ``(n, dimension)`` array with cached rows filled in and the
+        positions of texts that were not found (their rows are zero).
+        """
+        out = np.zeros((len(texts), self.dimension), dtype="float32")
+        missing: List[int] = []
+
+        with self._lock:
+            self._refresh()
+            for i, text in enumerate(texts):
+                row = self._rows.get(text_key(text))
+                if row is None:
+                    missing.append(i)
+                else:
+                    out[i] = self._vectors[row]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        return out, missing
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray) -> None:
+        """Append embeddings for ``texts`` that are not cached yet."""
+        vectors = np.asarray(vectors, dtype="float32")
+
+        with self._lock, self._file_lock():
+            self._refresh()
+            new_keys: Dict[bytes, int] = {}
+            for i, text in enumerate(texts):
+                key = text_key(text)
+                if key not in self._rows and key not in new_keys:
+                    new_keys[key] = i
+            if not new_keys:
+                return
+            new_rows = list(new_keys.values())
+
+            # rows are numbered from the key file on disk, which _refresh has
+            # just read under the lock. Vectors go first: a crash between the
+            # writes leaves orphan vectors past the last key, never a key
+            # pointing at missing data.
+            row = self._keys_read // DIGEST_SIZE
+            with open(self.vectors_file, "r+b") as f:
+                f.seek(row * self.dimension * 4)
+                f.write(np.ascontiguousarray(vectors[new_rows]).tobytes())
+            with open(self.keys_file, "r+b") as f:
+                f.seek(self._keys_read)
+                f.write(b"".join(new_keys))
+            self._refresh()
+
+    def stats(self) -> Dict[str, float]:
+        """Return size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
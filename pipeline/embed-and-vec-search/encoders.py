@@ -0,0 +1,236 @@
+"""
+ONNX Runtime encoder backend for the embedding model.
+
+``export`` converts a sentence-transformers model to ONNX once (this step
+needs torch); optionally it also writes an int8 dynamically quantized copy.
+``OnnxEncoder`` then serves ``encode()`` with only onnxruntime and the
+model's fast tokenizer. It applies the same pooling and normalization as
+the original model, so it can stand in for ``SentenceTransformer`` in
+``EmbeddingIndexer`` (``EMBED_BACKEND=onnx``).
+
+Usage:
+    python encoders.py export [--model all-MiniLM-L6-v2] [--output onnx_models/all-MiniLM-L6-v2] [--quantize]
+
+An exported model directory holds:
+    model.onnx             float32 transformer, dynamic batch and sequence axes
+    model.int8.onnx        int8 dynamic quantization (with --quantize)
+    encoder_config.json    pooling, normalization, max_seq_length, dimension
+    tokenizer files
+"""
+
+from __future__ import annotations
+
+import argparse
+import inspect
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ONNX_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+CONFIG_FILE = "encoder_config.json"
+DEFAULT_OPSET = 14
+
+
+def default_onnx_dir(model_name: str) -> Path:
+    return Path("./onnx_models") / model_name.replace("/", "_")
+
+
+def _pooling_mode(st_model) -> str:
+    for module in st_model:
+        if hasattr(module, "pooling_mode_mean_tokens"):
+            if module.pooling_mode_cls_token:
+                return "cls"
+            if module.pooling_mode_max_tokens:
+                return "max"
+            return "mean"
+    return "mean"
+
+
+def export(model_name: str, output_dir: str | Path, quantize: bool = False, opset: int = DEFAULT_OPSET) -> Path:
+    """Export ``model_name`` to ONNX under ``output_dir`` and return the directory."""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    sample = st_model.tokenizer(["An example sentence to trace the graph."], return_tensors="pt")
+    input_names = list(sample.keys())
+
+    class _LastHiddenState(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs)))[0]
+
+    axes = {0: "batch", 1: "sequence"}
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        kwargs["dynamo"] = False  # the TorchScript exporter handles dynamic_axes
+    with torch.no_grad():
+        torch.onnx.export(
+            _LastHiddenState(),
+            tuple(sample[name] for name in input_names),
+            str(output_dir / ONNX_FILE),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes={name: axes for name in [*input_names, "last_hidden_state"]},
+            opset_version=opset,
+            **kwargs,
+        )
+
+    st_model.tokenizer.save_pretrained(str(output_dir))
+    config = {
+        "model_name": model_name,
+        "pooling": _pooling_mode(st_model),
+        "normalize": any(type(module).__name__ == "Normalize" for module in st_model),
+        "max_seq_length": st_model.max_seq_length,
+        "dimension": st_model.get_sentence_embedding_dimension(),
+    }
+    (output_dir / CONFIG_FILE).write_text(json.dumps(config, indent=2), encoding="utf-8")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(output_dir / ONNX_FILE), str(output_dir / INT8_FILE), weight_type=QuantType.QInt8)
+    logger.info("Exported %s to %s (int8: %s)", model_name, output_dir, quantize)
+    return output_dir
+
+
+class OnnxEncoder:
+    """``SentenceTransformer.encode``-compatible encoder running on ONNX Runtime."""
+
+    def __init__(self, model_dir: str | Path, quantized: bool = False, threads: int = 0):
+        try:
+            import onnxruntime as ort
+        except ImportError as exc:  # pragma: no cover - depends on environment
+            raise RuntimeError("EMBED_BACKEND=onnx requires the onnxruntime package") from exc
+        from transformers import AutoTokenizer
+
+        model_dir = Path(model_dir)
+        path = model_dir / (INT8_FILE if quantized else ONNX_FILE)
+        if not path.is_file():
+            raise FileNotFoundError(
+                f"{path} not found; run: python encoders.py export --output {model_dir}"
+                + (" --quantize" if quantized else "")
+            )
+        config = json.loads((model_dir / CONFIG_FILE).read_text(encoding="utf-8"))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+        self.max_seq_length = config["max_seq_length"]
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+        self.dimension = config["dimension"]
+        self.quantized = quantized
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _pool(self, hidden: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        if self.pooling == "cls":
+            return hidden[:, 0]
+        mask = mask[:, :, None].astype(hidden.dtype)
+        if self.pooling == "max":
+            return np.where(mask > 0, hidden, -1e9).max(axis=1)
+        return (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        sentences,
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        **kwargs,
+    ) -> np.ndarray:
+        """Embed ``sentences`` (a string or a list) like ``SentenceTransformer.encode``."""
+        single = isinstance(sentences, str)
+        texts: List[str] = [sentences] if single else list(sentences)
+        embeddings = np.empty((len(texts), self.dimension), dtype="float32")
+        # longest first, as sentence-transformers does, so batches pad little
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(order), batch_size):
+            rows = order[start : start + batch_size]
+            features = self.tokenizer(
+                [texts[i] for i in rows],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            inputs = {name: features[name].astype("int64") for name in self.input_names}
+            hidden = self.session.run(None, inputs)[0]
+            embeddings[rows] = self._pool(hidden, features["attention_mask"])
+        if self.normalize or normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings[0] if single else embeddings
+
+
+def load_onnx_encoder(model_name: str, model_dir: str, quantized: bool = False, threads: int = 0) -> OnnxEncoder:
+    """``bulk_embed`` worker loader for the ONNX backend; ``model_name`` is unused."""
+    return OnnxEncoder(model_dir, quantized=quantized, threads=threads)
+
+
+def compare_embeddings(reference: np.ndarray, candidate: np.ndarray, queries: int = 100, k: int = 10) -> Dict[str, Any]:
+    """
+    Compare two backends' embeddings of the same texts.
+
+    Reports the per-text cosine similarity between the two vectors, and, using
+    the first ``queries`` texts as queries against all texts, the largest
+    difference in cosine score and the mean overlap of the top ``k`` results.
+    """
+
+    def normalized(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype="float32")
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    reference, candidate = normalized(reference), normalized(candidate)
+    cosine = (reference * candidate).sum(axis=1)
+    queries = min(queries, len(reference))
+    reference_scores = reference[:queries] @ reference.T
+    candidate_scores = candidate[:queries] @ candidate.T
+    k = min(k, len(reference))
+    reference_top = np.argsort(-reference_scores, axis=1)[:, :k]
+    candidate_top = np.argsort(-candidate_scores, axis=1)[:, :k]
+    overlap = [len(set(a) & set(b)) / k for a, b in zip(reference_top.tolist(), candidate_top.tolist())]
+    return {
+        "texts": len(reference),
+        "min_cosine": round(float(cosine.min()), 6),
+        "mean_cosine": round(float(cosine.mean()), 6),
+        "max_score_diff": round(float(np.abs(reference_scores - candidate_scores).max()), 6),
+        f"top{k}_overlap": round(float(np.mean(overlap)), 4),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    export_parser = subcommands.add_parser("export", help="Export a sentence-transformers model to ONNX.")
+    export_parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    export_parser.add_argument("--output", default=None, help="Output directory (default: onnx_models/<model>).")
+    export_parser.add_argument("--quantize", action="store_true", help="Also write an int8 dynamically quantized model.")
+    export_parser.add_argument("--opset", type=int, default=DEFAULT_OPSET)
+    args = parser.parse_args()
+
+    output = Path(args.output) if args.output else default_onnx_dir(args.model)
+    export(args.model, output, quantize=args.quantize, opset=args.opset)
+    print(f"Exported {args.model} to {output.resolve()}")
+
+
+if __name__ == "__main__":
+    main()
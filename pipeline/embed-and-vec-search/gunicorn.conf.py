@@ -0,0 +1,56 @@
+"""
+Production serving config for the vector search API.
+
+    gunicorn -c gunicorn.conf.py vector_search_api:app
+
+The master imports the app once (``preload_app``): the model weights and the
+memory-mapped FAISS index are loaded before forking, so every worker shares
+those pages copy-on-write instead of holding its own copy. Each worker warms
+up after fork and only then reports ready on ``GET /ready``. Workers are
+recycled after ``max_requests`` (with jitter so they don't restart together)
+and get ``graceful_timeout`` seconds to finish in-flight requests.
+"""
+
+import gc
+import multiprocessing
+import os
+
+# must be set before the app is imported by preload_app
+os.environ.setdefault("VECTOR_INDEX_MMAP", "1")
+
+bind = os.getenv("VECTOR_API_BIND", "0.0.0.0:5001")
+workers = int(os.getenv("VECTOR_API_WORKERS", str(multiprocessing.cpu_count())))
+# a few threads per worker let the search batcher coalesce concurrent requests
+worker_class = "gthread"
+threads = int(os.getenv("VECTOR_API_THREADS", "4"))
+
+preload_app = True
+max_requests = int(os.getenv("VECTOR_API_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("VECTOR_API_MAX_REQUESTS_JITTER", "200"))
+graceful_timeout = int(os.getenv("VECTOR_API_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("VECTOR_API_TIMEOUT", "120"))
+
+
+def pre_fork(server, worker):
+    # keep the preloaded objects out of the collector's reach so GC passes in
+    # the workers don't write to (and un-share) their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # split the cores between workers instead of every worker using all of them
+    import faiss
+
+    per_worker = max(1, multiprocessing.cpu_count() // workers)
+    faiss.omp_set_num_threads(per_worker)
+    # the ONNX backend never imports torch; don't pull it in just to configure it
+    if os.getenv("EMBED_BACKEND", "torch") == "torch":
+        import torch
+
+        torch.set_num_threads(per_worker)
+
+
+def post_worker_init(worker):
+    import vector_search_api
+
+    vector_search_api.warmup()
@@ -0,0 +1,158 @@
+"""
+Versioned, immutable index snapshots with an atomic "current" pointer.
+
+Every save writes a complete snapshot (faiss.index, index_params.json,
+metadata/) into a fresh directory, then publishes it by atomically replacing
+the ``CURRENT`` file with the new version name. Files a save did not change
+are hard-linked from the previous snapshot (``link_into``) instead of being
+rewritten, so a snapshot stays complete on its own. Readers resolve ``CURRENT``
+once and load everything from that one directory, so they never see an index
+from one save paired with metadata from another.
+
+Layout under the index path::
+
+    CURRENT                 name of the published snapshot
+    snapshots/00000001/     an older snapshot, kept until garbage-collected
+    snapshots/00000002/     the published snapshot
+    embedding_cache/        shared by all snapshots
+    .writer.lock            held by the process publishing a snapshot
+
+Writers in different processes (API workers, the RAG ingest thread) hold
+``writer_lock`` from loading the published snapshot until publishing their
+own, so none of them builds on a version another one is about to replace.
+"""
+
+from __future__ import annotations
+
+import fcntl
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILE = "CURRENT"
+SNAPSHOTS_DIR = "snapshots"
+LOCK_FILE = ".writer.lock"
+
+
+class StaleSnapshotError(RuntimeError):
+    """Raised when publishing would move ``CURRENT`` back to an older version."""
+
+
+def current_version(index_path: str | Path) -> Optional[str]:
+    """Return the published snapshot version, or None if nothing is published."""
+    try:
+        version = (Path(index_path) / CURRENT_FILE).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def snapshot_path(index_path: str | Path, version: str) -> Path:
+    return Path(index_path) / SNAPSHOTS_DIR / version
+
+
+def list_versions(index_path: str | Path) -> List[str]:
+    """Return all snapshot versions on disk, oldest first."""
+    root = Path(index_path) / SNAPSHOTS_DIR
+    if not root.is_dir():
+        return []
+    return sorted((p.name for p in root.iterdir() if p.is_dir() and p.name.isdigit()), key=int)
+
+
+def create_snapshot(index_path: str | Path) -> Tuple[str, Path]:
+    """Reserve a new, empty snapshot directory and return ``(version, path)``.
+
+    ``mkdir`` is exclusive, so concurrent writers never share a version.
+    """
+    root = Path(index_path) / SNAPSHOTS_DIR
+    root.mkdir(parents=True, exist_ok=True)
+    versions = list_versions(index_path)
+    number = int(versions[-1]) + 1 if versions else 1
+    while True:
+        version = f"{number:08d}"
+        path = root / version
+        try:
+            path.mkdir()
+            return version, path
+        except FileExistsError:
+            number += 1
+
+
+def link_into(source: str | Path, target: str | Path) -> None:
+    """Hard-link ``source`` (a file, or a directory's files recursively) to ``target``.
+
+    Snapshot files are never modified once published, so sharing inodes is
+    safe. Falls back to copying where hard links are not supported.
+    """
+    source, target = Path(source), Path(target)
+    if source.is_dir():
+        target.mkdir(parents=True, exist_ok=True)
+        for child in source.iterdir():
+            link_into(child, target / child.name)
+        return
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+@contextmanager
+def writer_lock(index_path: str | Path) -> Iterator[None]:
+    """Hold the exclusive, cross-process writer lock of ``index_path``.
+
+    ``flock`` locks belong to the open file, so the lock is not re-entrant:
+    a process must not take it twice.
+    """
+    Path(index_path).mkdir(parents=True, exist_ok=True)
+    with open(Path(index_path) / LOCK_FILE, "a+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def publish(index_path: str | Path, version: str) -> None:
+    """Atomically point ``CURRENT`` at ``version``.
+
+    Refuses to go back to a version older than the published one. Callers
+    hold ``writer_lock`` so the check and the replace are not interleaved.
+    """
+    published = current_version(index_path)
+    if published is not None and int(version) < int(published):
+        raise StaleSnapshotError(f"Snapshot {version} is older than the published {published}")
+    pointer = Path(index_path) / CURRENT_FILE
+    tmp = pointer.with_name(f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, pointer)
+
+
+def collect_garbage(index_path: str | Path, keep: int, protect: Iterable[str] = ()) -> List[str]:
+    """Delete all but the newest ``keep`` snapshots, never touching ``protect``.
+
+    Processes still serving a deleted snapshot are unaffected: their open
+    files and memory maps keep the data alive until they swap.
+    """
+    protected = set(protect)
+    published = current_version(index_path)
+    if published:
+        protected.add(published)
+
+    versions = list_versions(index_path)
+    removed = []
+    for version in versions[: max(0, len(versions) - keep)]:
+        if version in protected:
+            continue
+        shutil.rmtree(snapshot_path(index_path, version), ignore_errors=True)
+        removed.append(version)
+    if removed:
+        logger.info("Removed %d old index snapshot(s)", len(removed))
+    return removed
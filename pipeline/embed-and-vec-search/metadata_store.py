@@ -0,0 +1,331 @@
+"""
+Memory-mapped columnar store for chunk metadata.
+
+Replaces the pickled metadata list: fixed-width numpy columns (chunk ID,
+doc_id/source dictionary codes, chunk_index, page, offsets) plus one UTF-8 text
+blob addressed by an offset column. Columns are opened with ``mmap_mode="r"``,
+so a search only touches the pages of the rows it returns and resident memory
+stays flat as the corpus grows.
+
+Layout of a store directory::
+
+    meta.json          row count, next_id, doc_id and source dictionaries
+    ids.npy            int64 chunk IDs, ascending
+    doc.npy            int32 code into meta.json "doc_ids" (-1 = none)
+    source.npy         int32 code into meta.json "sources" (-1 = none)
+    chunk_index.npy    int64
+    page.npy           int64 (-1 = none)
+    start_offset.npy   int64 (-1 = none)
+    end_offset.npy     int64 (-1 = none)
+    text_offsets.npy   int64, rows + 1 entries into text.bin
+    text.bin           concatenated UTF-8 chunk texts
+    extras_offsets.npy int64, rows + 1 entries into extras.bin
+    extras.bin         per row, a JSON object of the chunk's other fields (empty if none)
+    deleted.npy        int64 tombstoned chunk IDs
+
+Stores written before the extras column existed open with no extra fields.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+INT_COLUMNS = ("chunk_index", "page", "start_offset", "end_offset")
+STORED_FIELDS = {"doc_id", "source", "text", "chunk_id", *INT_COLUMNS}
+
+
+def _none_to_minus_one(value: Any) -> int:
+    return -1 if value is None else int(value)
+
+
+class ColumnarMetadata(MutableMapping):
+    """Chunk-ID -> chunk dict mapping backed by memory-mapped columns.
+
+    Chunks added after opening are kept in a small in-memory overlay until
+    ``save`` writes a new store. The fields in ``STORED_FIELDS`` get their
+    own columns (``chunk_id`` is derived from doc_id and chunk_index); any
+    other JSON-serializable field is kept in the extras column.
+    """
+
+    def __init__(self, path: Optional[str | Path] = None):
+        self.path = Path(path) if path is not None else None
+        self.next_id = 0
+        self.deleted_ids: List[int] = []
+        self._doc_names: List[str] = []
+        self._source_names: List[str] = []
+        self._columns: Dict[str, np.ndarray] = {}
+        self._text: Optional[np.ndarray] = None
+        self._extras: Optional[np.ndarray] = None
+        self._added: Dict[int, Dict[str, Any]] = {}
+        self._removed: set = set()
+
+        if self.path is not None:
+            self._open()
+
+    # ------------------------------------------------------------------
+    # reading
+    # ------------------------------------------------------------------
+    def _open(self) -> None:
+        with open(self.path / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.next_id = meta["next_id"]
+        self._doc_names = meta["doc_ids"]
+        self._source_names = meta["sources"]
+
+        for name in ("ids", "doc", "source", "text_offsets", *INT_COLUMNS):
+            self._columns[name] = np.load(self.path / f"{name}.npy", mmap_mode="r")
+        self.deleted_ids = np.load(self.path / "deleted.npy").tolist()
+        if (self.path / "extras_offsets.npy").exists():
+            self._columns["extras_offsets"] = np.load(self.path / "extras_offsets.npy", mmap_mode="r")
+
+        self._text = self._map_blob(self.path / "text.bin")
+        self._extras = self._map_blob(self.path / "extras.bin")
+
+    @staticmethod
+    def _map_blob(path: Path) -> Optional[np.ndarray]:
+        # np.memmap can't map an empty file
+        if not path.exists() or not path.stat().st_size:
+            return None
+        return np.memmap(path, dtype="uint8", mode="r")
+
+    @classmethod
+    def exists(cls, path: str | Path) -> bool:
+        return (Path(path) / "meta.json").exists()
+
+    def _base_ids(self) -> np.ndarray:
+        return self._columns.get("ids", np.empty(0, dtype="int64"))
+
+    def _row(self, chunk_id: int) -> Optional[int]:
+        ids = self._base_ids()
+        row = int(np.searchsorted(ids, chunk_id))
+        if row < len(ids) and ids[row] == chunk_id and chunk_id not in self._removed:
+            return row
+        return None
+
+    def _read_row(self, row: int) -> Dict[str, Any]:
+        columns = self._columns
+        start, end = columns["text_offsets"][row], columns["text_offsets"][row + 1]
+        text = bytes(self._text[start:end]).decode("utf-8") if self._text is not None else ""
+        doc_code = int(columns["doc"][row])
+        source_code = int(columns["source"][row])
+
+        chunk: Dict[str, Any] = {
+            "doc_id": self._doc_names[doc_code] if doc_code >= 0 else None,
+            "text": text,
+            "source": self._source_names[source_code] if source_code >= 0 else None,
+        }
+        for name in INT_COLUMNS:
+            value = int(columns[name][row])
+            chunk[name] = None if value < 0 else value
+        if self._extras is not None:
+            start, end = columns["extras_offsets"][row], columns["extras_offsets"][row + 1]
+            if end > start:
+                chunk.update(json.loads(bytes(self._extras[start:end]).decode("utf-8")))
+        chunk["chunk_id"] = f"{chunk['doc_id']}_chunk_{chunk['chunk_index']}"
+        return chunk
+
+    def __getitem__(self, chunk_id: int) -> Dict[str, Any]:
+        chunk_id = int(chunk_id)
+        if chunk_id in self._added:
+            return self._added[chunk_id]
+        row = self._row(chunk_id)
+        if row is None:
+            raise KeyError(chunk_id)
+        return self._read_row(row)
+
+    def __contains__(self, chunk_id: object) -> bool:
+        try:
+            chunk_id = int(chunk_id)  # type: ignore[arg-type]
+        except (TypeError, ValueError):
+            return False
+        return chunk_id in self._added or self._row(chunk_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._base_ids()) - len(self._removed) + len(self._added)
+
+    def __iter__(self) -> Iterator[int]:
+        for chunk_id in self._base_ids().tolist():
+            if chunk_id not in self._removed:
+                yield chunk_id
+        yield from sorted(self._added)
+
+    # ------------------------------------------------------------------
+    # writing
+    # ------------------------------------------------------------------
+    def __setitem__(self, chunk_id: int, chunk: Dict[str, Any]) -> None:
+        chunk_id = int(chunk_id)
+        if self._row(chunk_id) is not None:
+            raise KeyError(f"chunk ID {chunk_id} is already stored")
+        self._added[chunk_id] = chunk
+        self.next_id = max(self.next_id, chunk_id + 1)
+
+    def __delitem__(self, chunk_id: int) -> None:
+        chunk_id = int(chunk_id)
+        if chunk_id in self._added:
+            del self._added[chunk_id]
+        elif self._row(chunk_id) is not None:
+            self._removed.add(chunk_id)
+        else:
+            raise KeyError(chunk_id)
+
+    def without(self, chunk_ids) -> "ColumnarMetadata":
+        """Return a view sharing the same columns with ``chunk_ids`` removed."""
+        view = ColumnarMetadata()
+        view.__dict__.update(self.__dict__)
+        view._added = {i: c for i, c in self._added.items() if i not in chunk_ids}
+        view._removed = self._removed | {int(i) for i in chunk_ids if self._row(int(i)) is not None}
+        return view
+
+    def with_chunks(self, chunk_ids, chunks) -> "ColumnarMetadata":
+        """Return a view sharing the same columns with ``chunks`` added under ``chunk_ids``.
+
+        Unlike ``__setitem__`` this leaves the store as it is, for readers
+        still holding it. The IDs must be new ones.
+        """
+        view = ColumnarMetadata()
+        view.__dict__.update(self.__dict__)
+        added = {int(i): chunk for i, chunk in zip(chunk_ids, chunks)}
+        view._added = {**self._added, **added}
+        if added:
+            view.next_id = max(self.next_id, max(added) + 1)
+        return view
+
+    def filter_columns(self) -> Tuple[np.ndarray, np.ndarray, List[str], np.ndarray, List[str], np.ndarray]:
+        """Return live (ids, doc codes, doc names, source codes, source names, pages).
+
+        Used to build pre-filter posting lists without materializing chunk dicts.
+        """
+        ids = np.asarray(self._base_ids(), dtype="int64")
+        keep = slice(None)
+        if self._removed:
+            keep = ~np.isin(ids, np.fromiter(self._removed, dtype="int64"))
+        doc_names = list(self._doc_names)
+        source_names = list(self._source_names)
+        doc_lookup = {name: code for code, name in enumerate(doc_names)}
+        source_lookup = {name: code for code, name in enumerate(source_names)}
+
+        if ids.size:
+            ids = ids[keep]
+            docs = np.asarray(self._columns["doc"])[keep]
+            sources = np.asarray(self._columns["source"])[keep]
+            pages = np.asarray(self._columns["page"])[keep]
+        else:
+            docs = sources = pages = np.empty(0, dtype="int64")
+
+        if self._added:
+            added_ids = sorted(self._added)
+            chunks = [self._added[i] for i in added_ids]
+            added_docs = [self._code(doc_names, doc_lookup, c.get("doc_id")) for c in chunks]
+            added_sources = [self._code(source_names, source_lookup, c.get("source")) for c in chunks]
+            ids = np.concatenate([ids, np.asarray(added_ids, dtype="int64")])
+            docs = np.concatenate([docs, np.asarray(added_docs, dtype=docs.dtype)])
+            sources = np.concatenate([sources, np.asarray(added_sources, dtype=sources.dtype)])
+            pages = np.concatenate(
+                [pages, np.asarray([_none_to_minus_one(c.get("page")) for c in chunks], dtype=pages.dtype)]
+            )
+
+        return ids, docs, doc_names, sources, source_names, pages
+
+    @staticmethod
+    def _code(names: List[str], lookup: Dict[str, int], value: Optional[str]) -> int:
+        """Return the dictionary code of ``value``, appending it if new."""
+        if value is None:
+            return -1
+        if value not in lookup:
+            lookup[value] = len(names)
+            names.append(value)
+        return lookup[value]
+
+    def save(self, path: str | Path, next_id: int, deleted_ids=()) -> "ColumnarMetadata":
+        """Write all live rows to ``path`` and return the store reopened from it.
+
+        Kept base rows are copied column-wise; only overlay rows are encoded
+        one by one. Files are written to a temporary directory first and then
+        moved into place, so an open store at ``path`` keeps its old inodes.
+        """
+        path = Path(path)
+        tmp = path.parent / f"{path.name}.tmp"
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+
+        doc_names = list(self._doc_names)
+        source_names = list(self._source_names)
+        doc_lookup = {name: code for code, name in enumerate(doc_names)}
+        source_lookup = {name: code for code, name in enumerate(source_names)}
+
+        base_ids = np.asarray(self._base_ids(), dtype="int64")
+        keep = np.ones(len(base_ids), dtype=bool)
+        if self._removed:
+            keep = ~np.isin(base_ids, np.fromiter(self._removed, dtype="int64"))
+        added_ids = sorted(self._added)
+        added = [self._added[i] for i in added_ids]
+
+        columns: Dict[str, np.ndarray] = {"ids": np.concatenate([base_ids[keep], np.asarray(added_ids, dtype="int64")])}
+        new_values = {
+            "doc": [self._code(doc_names, doc_lookup, c.get("doc_id")) for c in added],
+            "source": [self._code(source_names, source_lookup, c.get("source")) for c in added],
+        }
+        for name in INT_COLUMNS:
+            new_values[name] = [_none_to_minus_one(c.get(name)) for c in added]
+        for name, values in new_values.items():
+            dtype = "int32" if name in ("doc", "source") else "int64"
+            base = np.asarray(self._columns[name], dtype=dtype)[keep] if base_ids.size else np.empty(0, dtype=dtype)
+            columns[name] = np.concatenate([base, np.asarray(values, dtype=dtype)])
+
+        columns["text_offsets"] = self._write_blob(
+            tmp / "text.bin", "text_offsets", self._text, keep, [c.get("text", "").encode("utf-8") for c in added]
+        )
+        columns["extras_offsets"] = self._write_blob(
+            tmp / "extras.bin", "extras_offsets", self._extras, keep, [_encode_extras(c) for c in added]
+        )
+
+        for name, values in columns.items():
+            np.save(tmp / f"{name}.npy", values)
+        np.save(tmp / "deleted.npy", np.asarray(sorted(deleted_ids), dtype="int64"))
+        with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(
+                {"count": len(columns["ids"]), "next_id": next_id, "doc_ids": doc_names, "sources": source_names},
+                f,
+            )
+
+        path.mkdir(parents=True, exist_ok=True)
+        # meta.json last: it is what marks a store as present
+        for file in sorted(tmp.iterdir(), key=lambda p: p.name == "meta.json"):
+            os.replace(file, path / file.name)
+        tmp.rmdir()
+
+        return ColumnarMetadata(path)
+
+    def _write_blob(
+        self, file: Path, offsets_name: str, blob: Optional[np.ndarray], keep: np.ndarray, encoded: List[bytes]
+    ) -> np.ndarray:
+        """Write kept base rows of a blob column (in contiguous runs) plus ``encoded``; return the offsets."""
+        lengths: List[np.ndarray] = []
+        with open(file, "wb") as out:
+            if keep.size:
+                # stores without this column read as empty rows
+                offsets = np.asarray(self._columns.get(offsets_name, np.zeros(keep.size + 1, dtype="int64")))
+                lengths.append(np.diff(offsets)[keep])
+                run_starts = np.flatnonzero(keep & ~np.concatenate([[False], keep[:-1]]))
+                run_ends = np.flatnonzero(keep & ~np.concatenate([keep[1:], [False]])) + 1
+                for start, end in zip(run_starts, run_ends):
+                    if blob is not None:
+                        out.write(blob[offsets[start] : offsets[end]].tobytes())
+            for row in encoded:
+                out.write(row)
+            lengths.append(np.asarray([len(row) for row in encoded], dtype="int64"))
+        return np.concatenate([[0], np.cumsum(np.concatenate(lengths))]).astype("int64")
+
+
+def _encode_extras(chunk: Dict[str, Any]) -> bytes:
+    extras = {key: value for key, value in chunk.items() if key not in STORED_FIELDS}
+    return json.dumps(extras, ensure_ascii=False).encode("utf-8") if extras else b""
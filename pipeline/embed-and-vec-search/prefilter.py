@@ -0,0 +1,190 @@
+"""
+Metadata pre-filtering for vector search.
+
+Keeps posting lists of chunk IDs per doc_id and per source plus a page column,
+so a filter resolves to the exact set of allowed chunk IDs before FAISS runs.
+The set is handed to FAISS as an ID selector, which restricts the scan itself
+instead of dropping hits afterwards.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+
+
+FILTER_KEYS = {"doc_id", "doc_ids", "source", "page", "page_range"}
+
+
+def _as_list(value: Any) -> List[Any]:
+    if isinstance(value, (list, tuple, set)):
+        return list(value)
+    return [value]
+
+
+class MetadataFilter:
+    def __init__(self) -> None:
+        """Create an empty filter; populate with ``add_many`` or a ``from_*`` builder."""
+        self._by_doc: Dict[Any, np.ndarray] = {}
+        self._by_source: Dict[Any, np.ndarray] = {}
+        self._ids = np.empty(0, dtype="int64")
+        self._pages = np.empty(0, dtype="int64")
+
+    @classmethod
+    def from_metadata(cls, items: Iterable[Tuple[int, Dict[str, Any]]]) -> "MetadataFilter":
+        """Build posting lists from ``(chunk_id, chunk)`` pairs."""
+        items = list(items)
+        metadata_filter = cls()
+        metadata_filter.add_many([chunk_id for chunk_id, _ in items], [chunk for _, chunk in items])
+        return metadata_filter
+
+    @classmethod
+    def from_columns(cls, ids, doc_codes, doc_names, source_codes, source_names, pages) -> "MetadataFilter":
+        """Build posting lists from dictionary-encoded metadata columns.
+
+        Code -1 stands for a missing value; page -1 for an unknown page.
+        """
+        metadata_filter = cls()
+        ids = np.asarray(ids, dtype="int64")
+        metadata_filter._by_doc = cls._group(ids, np.asarray(doc_codes), doc_names)
+        metadata_filter._by_source = cls._group(ids, np.asarray(source_codes), source_names)
+        metadata_filter._ids = ids
+        metadata_filter._pages = np.asarray(pages, dtype="int64")
+        return metadata_filter
+
+    @staticmethod
+    def _group(ids: np.ndarray, codes: np.ndarray, names: List[Any]) -> Dict[Any, np.ndarray]:
+        """Split ``ids`` into sorted posting lists keyed by ``names[code]``."""
+        if not len(ids):
+            return {}
+        order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[order]
+        boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+        groups = {}
+        for group in np.split(order, boundaries):
+            code = int(codes[group[0]])
+            groups[names[code] if code >= 0 else None] = ids[group]
+        return groups
+
+    def add_many(self, chunk_ids: List[int], chunks: List[Dict[str, Any]]) -> None:
+        """Index a batch of chunks whose IDs are larger than any indexed so far."""
+        if not len(chunk_ids):
+            return
+        ids = np.asarray(chunk_ids, dtype="int64")
+        for postings, field in ((self._by_doc, "doc_id"), (self._by_source, "source")):
+            new: Dict[Any, List[int]] = defaultdict(list)
+            for chunk_id, chunk in zip(chunk_ids, chunks):
+                new[chunk.get(field)].append(chunk_id)
+            for key, key_ids in new.items():
+                key_ids = np.asarray(key_ids, dtype="int64")
+                postings[key] = np.concatenate([postings[key], key_ids]) if key in postings else key_ids
+
+        pages = [-1 if chunk.get("page") is None else int(chunk["page"]) for chunk in chunks]
+        self._ids = np.concatenate([self._ids, ids])
+        self._pages = np.concatenate([self._pages, np.asarray(pages, dtype="int64")])
+
+    def plus(self, chunk_ids: List[int], chunks: List[Dict[str, Any]]) -> "MetadataFilter":
+        """Return a copy with a batch of chunks added; this filter is left as is.
+
+        Searches may be reading this one, so writers swap in the copy instead
+        of calling ``add_many`` on a live filter.
+        """
+        metadata_filter = MetadataFilter()
+        metadata_filter._by_doc = dict(self._by_doc)
+        metadata_filter._by_source = dict(self._by_source)
+        metadata_filter._ids, metadata_filter._pages = self._ids, self._pages
+        metadata_filter.add_many(chunk_ids, chunks)
+        return metadata_filter
+
+    def chunk_ids(self) -> np.ndarray:
+        """Return every indexed chunk ID in ascending order."""
+        return self._ids
+
+    def doc_chunk_ids(self, doc_ids: Iterable[str]) -> np.ndarray:
+        """Return the sorted chunk IDs of the given documents."""
+        return self._union(self._by_doc, doc_ids)
+
+    @staticmethod
+    def _union(postings: Dict[Any, np.ndarray], keys: Iterable[Any]) -> np.ndarray:
+        lists = [postings[key] for key in keys if key in postings]
+        if not lists:
+            return np.empty(0, dtype="int64")
+        if len(lists) == 1:
+            return lists[0]
+        return np.unique(np.concatenate(lists))
+
+    def _pages_between(self, low: Optional[int], high: Optional[int]) -> np.ndarray:
+        ids, pages = self._ids, self._pages
+        mask = pages >= 0
+        if low is not None:
+            mask &= pages >= low
+        if high is not None:
+            mask &= pages <= high
+        return ids[mask]
+
+    def select(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Resolve ``filters`` to the sorted chunk IDs they allow.
+
+        Supported keys (combined with AND, list values with OR):
+            doc_id / doc_ids: one or more document IDs
+            source: one or more source file names
+            page: a single page number
+            page_range: [first, last] inclusive; either end may be null
+
+        Returns None when ``filters`` places no restriction.
+        """
+        if not filters:
+            return None
+
+        unknown = set(filters) - FILTER_KEYS
+        if unknown:
+            raise ValueError(f"Unsupported filter field(s): {', '.join(sorted(unknown))}")
+
+        selections: List[np.ndarray] = []
+
+        doc_ids = [d for key in ("doc_id", "doc_ids") if filters.get(key) is not None for d in _as_list(filters[key])]
+        if doc_ids:
+            selections.append(self.doc_chunk_ids(doc_ids))
+        if filters.get("source") is not None:
+            selections.append(self._union(self._by_source, _as_list(filters["source"])))
+        if filters.get("page") is not None:
+            page = int(filters["page"])
+            selections.append(self._pages_between(page, page))
+        if filters.get("page_range") is not None:
+            low, high = filters["page_range"]
+            selections.append(self._pages_between(low, high))
+
+        if not selections:
+            return None
+
+        allowed = selections[0]
+        for selection in selections[1:]:
+            allowed = np.intersect1d(allowed, selection, assume_unique=True)
+        return allowed
+
+
+def id_selector(allowed: Optional[np.ndarray], excluded: Optional[np.ndarray] = None):
+    """Build a FAISS ID selector admitting ``allowed`` minus ``excluded``.
+
+    ``allowed=None`` means every ID. Returns None when nothing is restricted.
+    The caller must keep the returned selector alive for the whole search.
+    """
+    if allowed is not None:
+        if excluded is not None and len(excluded):
+            allowed = np.setdiff1d(allowed, excluded, assume_unique=True)
+        allowed = np.ascontiguousarray(allowed, dtype="int64")
+        selector = faiss.IDSelectorBatch(len(allowed), faiss.swig_ptr(allowed))
+        selector.referenced_ids = allowed
+        return selector
+
+    if excluded is not None and len(excluded):
+        excluded = np.ascontiguousarray(excluded, dtype="int64")
+        inner = faiss.IDSelectorBatch(len(excluded), faiss.swig_ptr(excluded))
+        selector = faiss.IDSelectorNot(inner)
+        selector.referenced_objects = (inner, excluded)
+        return selector
+
+    return None
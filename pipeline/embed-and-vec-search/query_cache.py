@@ -0,0 +1,96 @@
+"""
+In-memory LRU/TTL cache of normalized query embeddings.
+
+Repeated questions skip the transformer entirely. Entries are keyed by
+(model name, whitespace-normalized query text) and bounded by total bytes;
+the least recently used entries are evicted first and entries older than the
+TTL are treated as misses.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Collapse runs of whitespace and strip the ends."""
+    return " ".join(text.split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_bytes: int, ttl_seconds: Optional[float] = None):
+        """Create a cache holding at most ``max_bytes`` of keys and vectors.
+
+        ``ttl_seconds`` of None or 0 keeps entries until they are evicted.
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds or None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry_size(key: Tuple[str, str], vector: np.ndarray) -> int:
+        return vector.nbytes + sys.getsizeof(key[0]) + sys.getsizeof(key[1])
+
+    def get(self, model_name: str, query: str) -> Optional[np.ndarray]:
+        """Return the cached embedding of ``query`` or None."""
+        key = (model_name, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[1] > self.ttl_seconds:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, model_name: str, query: str, vector: np.ndarray) -> None:
+        """Store a read-only copy of ``vector``, evicting LRU entries to fit."""
+        key = (model_name, normalize_query(query))
+        vector = np.array(vector, dtype="float32")
+        vector.setflags(write=False)
+        size = self._entry_size(key, vector)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            while self._entries and self._bytes + size > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = (vector, time.monotonic(), size)
+            self._bytes += size
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        """Return size and hit/miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,130 @@
+"""
+Micro-batching of concurrent search requests.
+
+Request threads hand their query to a ``SearchBatcher`` and block on a future.
+A single worker thread drains the queue: it waits up to ``max_wait_ms`` after
+the first query for more to arrive (or until ``max_batch_size`` are queued),
+runs them through one batched search call and fans the results back out.
+Batch sizes and queue waits are recorded in histograms for tuning.
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_MS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """Thread-safe cumulative histogram over fixed upper bounds."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self._counts = [0] * (len(self.bounds) + 1)  # last bucket is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self.bounds, value)] += 1
+            self._sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return cumulative bucket counts keyed by upper bound, plus count/sum/mean."""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        buckets, running = {}, 0
+        for bound, count in zip([*map(str, self.bounds), "+Inf"], counts):
+            running += count
+            buckets[bound] = running
+        return {"buckets": buckets, "count": running, "sum": total, "mean": total / running if running else 0.0}
+
+
+class SearchBatcher:
+    def __init__(
+        self,
+        search_batch: Callable[[List[Dict[str, Any]]], List[Any]],
+        max_wait_ms: float = 2.0,
+        max_batch_size: int = 32,
+    ):
+        """Coalesce queries into calls of ``search_batch(queries) -> results``."""
+        self.search_batch = search_batch
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_MS_BUCKETS)
+
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+    def search(self, query: Dict[str, Any], timeout: float = None) -> Any:
+        """Queue one query and block until its results are ready."""
+        return self.submit(query).result(timeout=timeout)
+
+    def submit(self, query: Dict[str, Any]) -> Future:
+        """Queue one query and return a future for its results."""
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((query, future, time.perf_counter()))
+        return future
+
+    def _ensure_worker(self) -> None:
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="search-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait_ms / 1000
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: List[tuple]) -> None:
+        started = time.perf_counter()
+        self.batch_sizes.observe(len(batch))
+        for _, _, queued_at in batch:
+            self.queue_wait_ms.observe((started - queued_at) * 1000)
+
+        queries = [query for query, _, _ in batch]
+        try:
+            results = self.search_batch(queries)
+        except Exception:
+            # one bad query (e.g. an unknown filter field) must not fail the
+            # others, so rerun them one by one to pin the error on its owner
+            for query, future, _ in batch:
+                try:
+                    future.set_result(self.search_batch([query])[0])
+                except Exception as e:
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_wait_ms": self.max_wait_ms,
+            "max_batch_size": self.max_batch_size,
+            "queued": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_wait_ms": self.queue_wait_ms.snapshot(),
+        }
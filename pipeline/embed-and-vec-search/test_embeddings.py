@@ -117,10 +117,11 @@ class TestEmbeddingIndexer(unittest.TestCase):
         self.indexer.build_index(embeddings, chunks)
         self.indexer.save_index()
 
-        index_file = self.index_dir / "faiss.index"
-        metadata_file = self.index_dir / "metadata.pkl"
+        snapshot_dir = self.index_dir / "snapshots" / self.indexer.index_version
+        index_file = snapshot_dir / "faiss.index"
+        metadata_dir = snapshot_dir / "metadata"
         self.assertTrue(index_file.exists(), "Index file should exist")
-        self.assertTrue(metadata_file.exists(), "Metadata file should exist")
+        self.assertTrue((metadata_dir / "meta.json").exists(), "Metadata store should exist")
 
         new_indexer = EmbeddingIndexer(index_path=self.index_dir)
         success = new_indexer.load_index()
@@ -0,0 +1,44 @@
+import numpy as np
+
+import bulk_embed
+
+
+class LengthModel:
+    """Encodes a text as [len(text), batch size], so order and batching are visible."""
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        return np.array([[len(text), batch_size] for text in texts], dtype="float32")
+
+
+def load_length_model(model_name, threads=0):
+    assert threads == 1
+    return LengthModel()
+
+
+def test_length_batches_group_similar_lengths():
+    lengths = [5, 1, 9, 3, 7, 2]
+    assert bulk_embed.length_batches(lengths, 2) == [[2, 4], [0, 3], [5, 1]]
+
+
+def test_cpu_sets_fall_back_when_cpus_are_short(monkeypatch):
+    monkeypatch.setattr(bulk_embed.os, "sched_getaffinity", lambda pid: {0, 1, 2, 3}, raising=False)
+    assert bulk_embed.cpu_sets(2, 2) == [[0, 1], [2, 3]]
+    assert bulk_embed.cpu_sets(3, 2) == [None, None, None]
+
+
+def test_encode_bulk_restores_input_order():
+    texts = ["x" * n for n in (3, 40, 1, 17, 8, 25, 2)]
+    embeddings = bulk_embed.encode_bulk(
+        texts, "unused", processes=2, threads_per_process=1, batch_size=3,
+        start_method="fork", load_model=load_length_model,
+    )
+    assert embeddings.dtype == np.float32
+    assert embeddings[:, 0].tolist() == [3, 40, 1, 17, 8, 25, 2]
+    # longest texts share the first batch; the shortest one is batched alone
+    assert embeddings[:, 1].tolist() == [3, 3, 1, 3, 3, 3, 3]
+
+
+def test_throughput_reports_embeddings_per_second():
+    stats = bulk_embed.throughput(500, 2.0, 4, 2)
+    assert stats["embeddings_per_second"] == 250.0
+    assert stats["processes"] == 4
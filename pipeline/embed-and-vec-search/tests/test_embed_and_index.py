@@ -1,3 +1,4 @@
+import json
 import numpy as np
 import pytest
 from pathlib import Path
@@ -39,3 +40,593 @@ def test_build_and_search(sample_chunks_dir: Path, tmp_path: Path):
     results = loaded.search("query", k=1)
     assert len(results) == 1
 
+
+
+def _write_doc(chunks_dir: Path, doc_id: str, texts):
+    doc_dir = chunks_dir / doc_id
+    doc_dir.mkdir(parents=True, exist_ok=True)
+    for i, text in enumerate(texts):
+        chunk = {"doc_id": doc_id, "chunk_index": i, "text": text, "source": f"{doc_id}.txt"}
+        (doc_dir / f"chunk_{i}.json").write_text(json.dumps(chunk), encoding="utf-8")
+
+
+def test_load_chunks_reads_packed_segments(sample_chunks_dir: Path, tmp_path: Path):
+    from ingestion import utils
+
+    chunks = [{"doc_id": "doc2", "chunk_index": i, "text": f"packed {i}", "source": "doc2.txt"} for i in range(3)]
+    utils.write_segment(sample_chunks_dir / "doc2", chunks, compression="none")
+    # a left-over JSON file next to the segment is ignored
+    (sample_chunks_dir / "doc2" / "chunk_0.json").write_text('{"chunk_index": 0, "text": "stale"}', encoding="utf-8")
+
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    loaded = indexer.load_chunks(str(sample_chunks_dir), doc_ids=["doc2", "doc1"])
+    assert [c["text"] for c in loaded] == ["packed 0", "packed 1", "packed 2", "Sample chunk text"]
+    assert loaded[2]["chunk_id"] == "doc2_chunk_2"
+
+
+def test_upsert_documents_embeds_only_new_docs(sample_chunks_dir: Path, tmp_path: Path):
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    chunks = indexer.load_chunks(str(sample_chunks_dir))
+    indexer.build_index(indexer.embed_chunks(chunks), chunks)
+    indexer.save_index()
+
+    encoded = []
+    original_encode = DummyModel.encode
+
+    def counting_encode(self, texts, **kwargs):
+        encoded.extend(texts)
+        return original_encode(self, texts, **kwargs)
+
+    _write_doc(sample_chunks_dir, "doc2", ["first new chunk", "second new chunk"])
+    DummyModel.encode = counting_encode
+    try:
+        added = indexer.upsert_documents(["doc2"], str(sample_chunks_dir))
+    finally:
+        DummyModel.encode = original_encode
+
+    assert added == 2
+    assert encoded == ["first new chunk", "second new chunk"]
+    assert indexer.ntotal == 3
+    assert [c["doc_id"] for c in indexer.chunk_metadata.values()] == ["doc1", "doc2", "doc2"]
+
+    # re-upserting a doc replaces its vectors instead of duplicating them
+    _write_doc(sample_chunks_dir, "doc2", ["replacement chunk"])
+    (sample_chunks_dir / "doc2" / "chunk_1.json").unlink()
+    indexer.upsert_documents(["doc2"], str(sample_chunks_dir))
+    assert sorted(r["text"] for r in indexer.search("query", k=5)) == ["Sample chunk text", "replacement chunk"]
+
+    reloaded = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    assert reloaded.load_index()
+    assert len(reloaded.deleted_ids) == 2
+    assert reloaded.compact() == 2
+    assert reloaded.ntotal == 2
+    assert [c["text"] for c in reloaded.chunk_metadata.values()] == ["Sample chunk text", "replacement chunk"]
+
+
+def test_index_documents_takes_precomputed_embeddings(sample_chunks_dir: Path, tmp_path: Path):
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    chunks = indexer.load_chunks(str(sample_chunks_dir))
+    indexer.build_index(indexer.embed_chunks(chunks), chunks)
+    indexer.save_index()
+
+    streamed = [{"doc_id": "doc2", "chunk_index": i, "chunk_id": f"doc2_chunk_{i}", "text": f"streamed {i}"} for i in range(2)]
+    batches = [indexer.embed_chunks(streamed[:1]), indexer.embed_chunks(streamed[1:])]
+    assert indexer.index_documents(["doc2"], np.vstack(batches), streamed) == 2
+
+    reloaded = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    assert reloaded.load_index()
+    assert [c["text"] for c in reloaded.chunk_metadata.values()] == ["Sample chunk text", "streamed 0", "streamed 1"]
+
+
+def test_replace_document_publishes_one_snapshot(sample_chunks_dir: Path, tmp_path: Path):
+    import index_snapshots
+
+    index_dir = tmp_path / "index"
+    indexer = EmbeddingIndexer(index_path=str(index_dir))
+    chunks = indexer.load_chunks(str(sample_chunks_dir))
+    indexer.build_index(indexer.embed_chunks(chunks), chunks)
+    indexer.save_index()
+
+    _write_doc(sample_chunks_dir, "doc2", ["replacement"])
+    assert indexer.replace_document("doc1", str(sample_chunks_dir), replacement_doc_id="doc2") == 1
+    assert index_snapshots.list_versions(index_dir) == ["00000001", "00000002"]
+    assert [r["doc_id"] for r in indexer.search("query", k=5)] == ["doc2"]
+
+
+def _write_documents(index_dir: str, prefix: str, count: int):
+    indexer = EmbeddingIndexer(index_path=index_dir, use_cache=False)
+    for i in range(count):
+        chunks = [{"doc_id": f"{prefix}{i}", "chunk_index": 0, "text": f"{prefix}{i}"}]
+        indexer.index_documents([f"{prefix}{i}"], np.ones((1, 384), dtype="float32"), chunks)
+
+
+def test_concurrent_writer_processes_keep_every_change(tmp_path: Path):
+    import multiprocessing
+
+    index_dir = str(tmp_path / "index")
+    context = multiprocessing.get_context("fork")  # inherits the mocked model
+    writers = [context.Process(target=_write_documents, args=(index_dir, prefix, 8)) for prefix in ("a", "b")]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join(60)
+        assert writer.exitcode == 0
+
+    loaded = EmbeddingIndexer(index_path=index_dir)
+    assert loaded.load_index()
+    assert sorted(c["doc_id"] for c in loaded.chunk_metadata.values()) == sorted(
+        f"{prefix}{i}" for prefix in ("a", "b") for i in range(8)
+    )
+
+
+def test_delete_and_compact_keep_ids_stable(sample_chunks_dir: Path, tmp_path: Path):
+    _write_doc(sample_chunks_dir, "doc2", ["old regulation text"])
+    _write_doc(sample_chunks_dir, "doc3", ["new regulation text"])
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    chunks = indexer.load_chunks(str(sample_chunks_dir))
+    indexer.build_index(indexer.embed_chunks(chunks), chunks)
+    ids_before = {c["chunk_id"]: i for i, c in indexer.chunk_metadata.items()}
+
+    assert indexer.has_document("doc2")
+    assert indexer.delete_documents(["doc2"]) == 1
+    assert not indexer.has_document("doc2")
+    assert indexer.ntotal == 3  # tombstoned, not yet removed
+    assert "doc2" not in {r["doc_id"] for r in indexer.search("regulation", k=5)}
+
+    assert indexer.compact(chunks_dir=str(sample_chunks_dir)) == 1
+    assert indexer.ntotal == 2
+    assert not (sample_chunks_dir / "doc2").exists()
+    assert (sample_chunks_dir / "doc3").exists()
+    for i, chunk in indexer.chunk_metadata.items():
+        assert ids_before[chunk["chunk_id"]] == i
+
+
+def test_load_legacy_index_assigns_ids(tmp_path: Path):
+    import pickle
+    import faiss
+
+    index_dir = tmp_path / "index"
+    index_dir.mkdir()
+    legacy = faiss.IndexFlatIP(384)
+    legacy.add(np.ones((2, 384), dtype="float32"))
+    faiss.write_index(legacy, str(index_dir / "faiss.index"))
+    with open(index_dir / "metadata.pkl", "wb") as f:
+        pickle.dump([{"doc_id": "a", "text": "x"}, {"doc_id": "b", "text": "y"}], f)
+
+    indexer = EmbeddingIndexer(index_path=str(index_dir))
+    assert indexer.load_index()
+    assert indexer.next_id == 2
+    assert indexer.delete_documents(["a"]) == 1
+
+
+def test_embed_chunks_only_encodes_cache_misses(tmp_path: Path):
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    encoded = []
+    original_encode = DummyModel.encode
+
+    def counting_encode(self, texts, **kwargs):
+        encoded.append(list(texts))
+        return original_encode(self, texts, **kwargs)
+
+    chunks = [{"text": "boilerplate"}, {"text": "unique"}, {"text": "boilerplate"}]
+    DummyModel.encode = counting_encode
+    try:
+        first = indexer.embed_chunks(chunks)
+        rebuilt = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+        second = rebuilt.embed_chunks(chunks + [{"text": "new"}])
+    finally:
+        DummyModel.encode = original_encode
+
+    assert encoded == [["boilerplate", "unique"], ["new"]]
+    assert np.array_equal(first[0], first[2])
+    assert np.array_equal(first, second[:3])
+    assert rebuilt.embedding_cache.stats()["hits"] == 3
+
+
+class _TokenizingModel(DummyModel):
+    max_seq_length = 8
+
+    def tokenizer(self, texts, **kwargs):
+        # [CLS] + one id per word + [SEP]
+        return {"input_ids": [[0] * (len(text.split()) + 2) for text in texts]}
+
+
+def test_embed_chunks_reports_truncated_tokens(tmp_path: Path):
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"), use_cache=False)
+    indexer.model = _TokenizingModel()
+    chunks = [{"text": "short text"}, {"text": " ".join(["word"] * 10)}]
+    indexer.embed_chunks(chunks)
+    assert indexer.truncation_stats == {
+        "chunks": 2,
+        "max_seq_length": 8,
+        "total_tokens": 16,
+        "truncated_chunks": 1,
+        "dropped_tokens": 4,
+    }
+
+    indexer.model = DummyModel()
+    indexer.embed_chunks(chunks)
+    assert indexer.truncation_stats is None
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq", "hnsw", "sq8", "binary"])
+def test_ann_index_types_persist_and_search(tmp_path: Path, index_type):
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((400, 384)).astype("float32")
+    chunks = [{"doc_id": f"doc{i % 4}", "chunk_index": i, "text": f"t{i}"} for i in range(400)]
+
+    indexer = EmbeddingIndexer(
+        index_path=str(tmp_path / "index"), index_type=index_type, index_params={"nlist": 8, "pq_m": 8, "pq_nbits": 4}
+    )
+    indexer.build_index(embeddings, chunks)
+    indexer.save_index()
+
+    loaded = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    assert loaded.load_index()
+    assert loaded.index_type == index_type
+    for profile in ("fast", "balanced", "exact"):
+        assert len(loaded.search("query", k=5, profile=profile)) == 5
+
+    loaded.delete_documents(["doc0"])
+    assert loaded.compact() == 100
+    assert loaded.ntotal == 300
+
+
+def test_unknown_search_profile_rejected(sample_chunks_dir: Path, tmp_path: Path):
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    chunks = indexer.load_chunks(str(sample_chunks_dir))
+    indexer.build_index(indexer.embed_chunks(chunks), chunks)
+    with pytest.raises(ValueError):
+        indexer.search("query", profile="turbo")
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "hnsw", "sq8", "binary"])
+def test_narrow_filter_returns_exactly_k(tmp_path: Path, index_type):
+    rng = np.random.default_rng(1)
+    embeddings = rng.standard_normal((500, 384)).astype("float32")
+    # doc "rare" holds 7 chunks scattered through the corpus
+    chunks = [{"doc_id": "rare" if i % 83 == 0 else "common", "chunk_index": i, "text": f"t{i}"} for i in range(500)]
+
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"), index_type=index_type, index_params={"nlist": 16})
+    indexer.build_index(embeddings, chunks)
+    indexer.delete_documents(["nothing"])
+
+    results = indexer.search("query", k=5, filters={"doc_ids": ["rare"]}, profile="fast")
+    assert len(results) == 5
+    assert {r["doc_id"] for r in results} == {"rare"}
+
+    results = indexer.search("query", k=10, filters={"doc_ids": ["rare"]}, profile="fast")
+    assert len(results) == 7
+
+
+@pytest.mark.parametrize("index_type", ["sq8", "binary"])
+def test_two_stage_index_reranks_from_mapped_vectors(tmp_path: Path, index_type, monkeypatch):
+    import index_snapshots
+
+    rng = np.random.default_rng(4)
+    centers = rng.standard_normal((20, 384))
+    embeddings = (centers[rng.integers(0, 20, 2000)] + 0.8 * rng.standard_normal((2000, 384))).astype("float32")
+    queries = (embeddings[:50] + 0.3 * rng.standard_normal((50, 384))).astype("float32")
+    chunks = [{"doc_id": f"doc{i % 10}", "chunk_index": i, "text": f"t{i}"} for i in range(2000)]
+
+    class QueryModel:
+        def encode(self, texts, **kwargs):
+            return np.stack([queries[int(text[1:])] for text in texts])
+
+    flat = EmbeddingIndexer(index_path=str(tmp_path / "flat"), index_type="flat")
+    flat.build_index(embeddings.copy(), chunks)
+    flat.model = QueryModel()
+
+    index_dir = tmp_path / "index"
+    indexer = EmbeddingIndexer(index_path=str(index_dir), index_type=index_type)
+    indexer.build_index(embeddings.copy(), chunks)
+    indexer.save_index()
+    # codes are 4x (sq8) or 32x (binary) smaller than the float32 rows
+    assert indexer.vectors.nbytes() == 2000 * 384 * 4
+    code_size = module.faiss.downcast_index(indexer.index.index).code_size
+    assert code_size * (4 if index_type == "sq8" else 32) == 384 * 4
+
+    loaded = EmbeddingIndexer(index_path=str(index_dir))
+    assert loaded.load_index()
+    assert loaded.vectors.path.parent.name == loaded.index_version
+    loaded.model = QueryModel()
+    batch = [{"query": f"q{i}", "k": 10} for i in range(50)]
+    expected = flat.search_batch(batch)
+    results = loaded.search_batch(batch)
+    overlap = np.mean([len({r["text"] for r in a} & {r["text"] for r in b}) / 10 for a, b in zip(expected, results)])
+    assert overlap >= 0.95
+    # scores come from the exact float32 vectors
+    assert results[0][0]["score"] == pytest.approx(expected[0][0]["score"], abs=1e-5)
+
+    loaded.delete_documents(["doc0"])
+    hits = loaded.search("q0", k=10)
+    assert hits and all(hit["doc_id"] != "doc0" for hit in hits)
+    assert {hit["doc_id"] for hit in loaded.search("q3", k=5, filters={"doc_id": "doc3"})} == {"doc3"}
+
+    # a filter wider than the shortlist re-scores at most the shortlist, not every chunk it selects
+    rescored = []
+    original_get = module.VectorFile.get
+    monkeypatch.setattr(module.VectorFile, "get", lambda self, ids: rescored.append(len(ids)) or original_get(self, ids))
+    hits = loaded.search("q3", k=2, filters={"doc_id": "doc3"}, profile="balanced")
+    assert len(hits) == 2 and {hit["doc_id"] for hit in hits} == {"doc3"}
+    assert rescored and max(rescored) <= module.RERANK_MIN_SHORTLIST < 200
+    monkeypatch.undo()
+
+    # new rows extend the snapshot's vector file; the previous snapshot keeps its rows
+    previous = index_snapshots.snapshot_path(index_dir, loaded.index_version)
+    loaded.add_to_index(queries[:1].copy(), [{"doc_id": "new", "chunk_index": 0, "text": "new"}])
+    loaded.save_index()
+    assert loaded.vectors.rows == 2001
+    assert json.loads((previous / "index_params.json").read_text())["vector_rows"] == 2000
+    assert (previous / "vectors.f32").samefile(loaded.vectors.path)
+    assert loaded.search("q0", k=1)[0]["doc_id"] == "new"
+
+    loaded.compact()
+    assert loaded.search("q0", k=1)[0]["doc_id"] == "new"
+    assert not list(index_dir.glob("*.tmp"))
+    # compaction rewrites the vector file with the 1801 live rows only
+    assert loaded.vectors.rows == 1801
+    assert loaded.vectors.path.stat().st_size == 1801 * 384 * 4
+    assert not loaded.vectors.path.samefile(previous / "vectors.f32")
+    reloaded = EmbeddingIndexer(index_path=str(index_dir))
+    assert reloaded.load_index()
+    reloaded.model = QueryModel()
+    assert reloaded.search("q0", k=1)[0]["doc_id"] == "new"
+    assert reloaded.search("q1", k=1)[0]["score"] == pytest.approx(flat.search("q1", k=1)[0]["score"], abs=1e-5)
+
+
+def test_build_normalizes_embeddings_in_place(tmp_path: Path):
+    embeddings = np.random.default_rng(5).standard_normal((20, 384)).astype("float32")
+    chunks = [{"doc_id": "doc", "chunk_index": i, "text": f"t{i}"} for i in range(20)]
+
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"), index_type="sq8")
+    indexer.build_index(embeddings, chunks)
+
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-5)
+    assert np.array_equal(indexer.vectors.get(np.arange(20)), embeddings)
+
+
+def test_search_batch_encodes_once_and_keeps_order(tmp_path: Path):
+    rng = np.random.default_rng(2)
+    embeddings = rng.standard_normal((60, 384)).astype("float32")
+    chunks = [{"doc_id": f"doc{i % 3}", "chunk_index": i, "text": f"t{i}"} for i in range(60)]
+
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    indexer.build_index(embeddings, chunks)
+
+    class CountingModel:
+        calls = 0
+
+        def encode(self, texts, **kwargs):
+            CountingModel.calls += 1
+            return np.stack([embeddings[int(text[1:])] for text in texts])
+
+    indexer.model = CountingModel()
+    queries = [
+        {"query": "q5", "k": 3},
+        {"query": "q7", "k": 2, "filters": {"doc_id": "doc0"}},
+        {"query": "q9", "k": 1},
+        {"query": "q8", "filters": {"doc_id": "doc2"}},
+    ]
+    results = indexer.search_batch(queries)
+    assert CountingModel.calls == 1
+
+    assert [len(r) for r in results] == [3, 2, 1, 5]
+    assert results[0][0]["text"] == "t5"
+    assert {r["doc_id"] for r in results[1]} == {"doc0"}
+    assert results[2][0]["text"] == "t9"
+    assert results[3][0]["text"] == "t8"
+
+    for query, batched in zip(queries, results):
+        single = indexer.search(query["query"], k=query.get("k", 5), filters=query.get("filters"))
+        assert [r["text"] for r in single] == [r["text"] for r in batched]
+
+
+def test_repeated_queries_skip_the_model(sample_chunks_dir: Path, tmp_path: Path):
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    chunks = indexer.load_chunks(str(sample_chunks_dir))
+    indexer.build_index(indexer.embed_chunks(chunks), chunks)
+
+    encoded = []
+    model = indexer.model
+
+    class RecordingModel:
+        def encode(self, texts, **kwargs):
+            encoded.extend(texts)
+            return model.encode(texts, **kwargs)
+
+    indexer.model = RecordingModel()
+    indexer.search("ISO 13485 CAPA", k=1)
+    indexer.search("  ISO 13485   CAPA ", k=1)
+    indexer.search_batch([{"query": "ISO 13485 CAPA"}, {"query": "design controls"}])
+
+    assert encoded == ["ISO 13485 CAPA", "design controls"]
+    assert indexer.query_cache.stats()["hits"] == 2
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf_flat", "sq8"])
+def test_mmap_loaded_index_searches_and_accepts_writes(tmp_path: Path, index_type):
+    rng = np.random.default_rng(3)
+    embeddings = rng.standard_normal((200, 384)).astype("float32")
+    chunks = [{"doc_id": f"doc{i % 4}", "chunk_index": i, "text": f"t{i}"} for i in range(200)]
+
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"), index_type=index_type, index_params={"nlist": 4})
+    indexer.build_index(embeddings, chunks)
+    indexer.save_index()
+
+    loaded = EmbeddingIndexer(index_path=str(tmp_path / "index"))
+    assert loaded.load_index(mmap=True)
+    assert loaded._index_source is not None
+    inner = module.faiss.downcast_index(loaded.index.index)
+    if hasattr(inner, "codes"):
+        # the codes are a view of the mapped file, not a heap copy
+        assert not inner.codes.is_owned
+    assert len(loaded.search("query", k=3, profile="exact")) == 3
+
+    loaded.delete_documents(["doc0"])
+    loaded.compact()
+    assert loaded._index_source is None
+    assert loaded.ntotal == 150
+    loaded.add_to_index(embeddings[:2], chunks[:2])
+    assert loaded.ntotal == 152
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw", "binary"])
+def test_searches_run_safely_during_writes(tmp_path: Path, index_type):
+    import threading
+
+    rng = np.random.default_rng(6)
+    embeddings = rng.standard_normal((300, 384)).astype("float32")
+    chunks = [{"doc_id": f"doc{i % 10}", "chunk_index": i, "text": f"t{i}"} for i in range(300)]
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"), index_type=index_type, use_cache=False)
+    indexer.build_index(embeddings.copy(), chunks)
+    indexer.save_index()
+
+    stop, errors = threading.Event(), []
+
+    def search():
+        while not stop.is_set():
+            try:
+                for hits in indexer.search_batch([{"query": "q", "k": 5}, {"query": "q", "k": 3, "filters": {"doc_id": "doc1"}}]):
+                    assert hits and len({hit["text"] for hit in hits}) == len(hits)
+            except Exception as exc:  # pylint: disable=broad-except
+                errors.append(exc)
+                return
+
+    readers = [threading.Thread(target=search) for _ in range(3)]
+    for reader in readers:
+        reader.start()
+    try:
+        for round_ in range(20):
+            doc_id = f"doc{round_ % 10}"
+            new_chunks = [{"doc_id": doc_id, "chunk_index": i, "text": f"r{round_}_{i}"} for i in range(5)]
+            with indexer.writing(refresh=False):
+                indexer.delete_documents([doc_id])
+                indexer.add_to_index(rng.standard_normal((5, 384)).astype("float32"), new_chunks)
+                if round_ % 5 == 4:
+                    indexer.save_index()
+            if round_ == 10:
+                indexer.compact()
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    assert errors == []
+    live = indexer.ntotal - len(indexer.deleted_ids)
+    assert len(indexer.search("q", k=1000)) == live == 50  # 10 docs, each replaced by 5 chunks
+
+
+def test_save_publishes_snapshots_and_collects_old_ones(sample_chunks_dir: Path, tmp_path: Path, monkeypatch):
+    import index_snapshots
+
+    monkeypatch.setattr(module, "SNAPSHOTS_KEEP", 2)
+    index_dir = tmp_path / "index"
+    indexer = EmbeddingIndexer(index_path=str(index_dir))
+    chunks = indexer.load_chunks(str(sample_chunks_dir))
+    indexer.build_index(indexer.embed_chunks(chunks), chunks)
+    for _ in range(3):
+        indexer.save_index()
+
+    assert index_snapshots.current_version(index_dir) == indexer.index_version == "00000003"
+    assert index_snapshots.list_versions(index_dir) == ["00000002", "00000003"]
+    assert not (index_dir / "faiss.index").exists()
+
+
+def test_saves_link_the_base_and_write_only_a_delta_segment(tmp_path: Path, monkeypatch):
+    rng = np.random.default_rng(7)
+    embeddings = rng.standard_normal((100, 384)).astype("float32")
+    chunks = [{"doc_id": f"doc{i % 5}", "chunk_index": i, "text": f"t{i}"} for i in range(100)]
+    index_dir = tmp_path / "index"
+    indexer = EmbeddingIndexer(index_path=str(index_dir), use_cache=False)
+    indexer.build_index(embeddings.copy(), chunks)
+    indexer.save_index()
+    first = index_dir / "snapshots" / indexer.index_version
+
+    new_chunks = [{"doc_id": "doc0", "chunk_index": i, "text": f"new{i}"} for i in range(3)]
+    indexer.index_documents(["doc0"], embeddings[:3].copy(), new_chunks)
+    second = index_dir / "snapshots" / indexer.index_version
+    assert (second / "faiss.index").samefile(first / "faiss.index")
+    assert (second / "metadata" / "text.bin").samefile(first / "metadata" / "text.bin")
+    params = json.loads((second / "index_params.json").read_text())
+    assert params["delta"] == {"start": 100, "segments": [indexer.index_version]}
+
+    reloaded = EmbeddingIndexer(index_path=str(index_dir), use_cache=False)
+    assert reloaded.load_index()
+    assert (reloaded.index.ntotal, len(reloaded.delta), len(reloaded.deleted_ids)) == (100, 3, 20)
+    reloaded.model = type("QueryModel", (), {"encode": lambda self, texts, **kwargs: embeddings[:1]})()
+    assert reloaded.search("q", k=1)[0]["text"] == "new0"
+    assert reloaded.has_document("doc0") and reloaded.has_document("doc4")
+
+    # a delta past both thresholds is folded into a new base on the next save
+    monkeypatch.setattr(module, "DELTA_MAX_ROWS", 2)
+    monkeypatch.setattr(module, "DELTA_MAX_FRACTION", 0.01)
+    reloaded.index_documents(["doc1"], embeddings[3:4].copy(), [{"doc_id": "doc1", "chunk_index": 0, "text": "n"}])
+    third = index_dir / "snapshots" / reloaded.index_version
+    assert not (third / "faiss.index").samefile(first / "faiss.index")
+    assert (reloaded.index.ntotal, len(reloaded.delta)) == (104, 0)
+    assert not (third / "delta").exists()
+    assert len(reloaded.search("q", k=200)) == 104 - 40
+
+
+def test_refresh_swaps_in_snapshot_published_elsewhere(sample_chunks_dir: Path, tmp_path: Path):
+    index_dir = str(tmp_path / "index")
+    writer = EmbeddingIndexer(index_path=index_dir)
+    chunks = writer.load_chunks(str(sample_chunks_dir))
+    writer.build_index(writer.embed_chunks(chunks), chunks)
+    writer.save_index()
+
+    reader = EmbeddingIndexer(index_path=index_dir)
+    assert reader.load_index()
+    assert not reader.refresh_index()
+    old_index = reader.index
+
+    _write_doc(sample_chunks_dir, "doc2", ["new text"])
+    writer.upsert_documents(["doc2"], str(sample_chunks_dir))
+
+    assert reader.refresh_index()
+    assert reader.index is not old_index
+    assert reader.index_version == writer.index_version
+    assert {r["doc_id"] for r in reader.search("query", k=5)} == {"doc1", "doc2"}
+
+
+def test_unversioned_index_is_migrated_on_save(sample_chunks_dir: Path, tmp_path: Path):
+    index_dir = tmp_path / "index"
+    indexer = EmbeddingIndexer(index_path=str(index_dir))
+    chunks = indexer.load_chunks(str(sample_chunks_dir))
+    indexer.build_index(indexer.embed_chunks(chunks), chunks)
+    import faiss
+
+    faiss.write_index(indexer.index, str(index_dir / "faiss.index"))
+    indexer.chunk_metadata.save(index_dir / "metadata", indexer.next_id)
+
+    loaded = EmbeddingIndexer(index_path=str(index_dir))
+    assert loaded.load_index()
+    assert loaded.index_version is None
+    loaded.save_index()
+    assert loaded.index_version is not None
+    assert not (index_dir / "metadata").exists()
+    assert EmbeddingIndexer(index_path=str(index_dir)).load_index()
+
+
+def test_embed_chunks_uses_bulk_mode_for_large_batches(sample_chunks_dir: Path, tmp_path: Path, monkeypatch):
+    calls = []
+
+    def fake_bulk(texts, model_name, processes, threads_per_process=None, batch_size=32, tokenizer=None):
+        calls.append((len(texts), processes, threads_per_process))
+        return np.ones((len(texts), 384), dtype="float32")
+
+    monkeypatch.setattr(module, "encode_bulk", fake_bulk)
+    monkeypatch.setattr(module, "BULK_MIN_TEXTS", 3)
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"), use_cache=False, embed_processes=2, embed_threads=1)
+
+    chunks = [{"doc_id": "doc", "chunk_index": i, "text": f"text {i}"} for i in range(3)]
+    assert indexer.embed_chunks(chunks).shape == (3, 384)
+    assert calls == [(3, 2, 1)]
+    assert indexer.embedding_stats["processes"] == 2
+
+    # below the threshold the model runs in-process
+    indexer.embed_chunks(chunks[:2])
+    assert len(calls) == 1
+    assert indexer.embedding_stats["processes"] == 1
+    assert indexer.embedding_stats["texts"] == 2
@@ -0,0 +1,60 @@
+import numpy as np
+from pathlib import Path
+
+from embedding_cache import EmbeddingCache
+
+
+def test_get_many_reports_misses_then_hits(tmp_path: Path):
+    cache = EmbeddingCache(tmp_path, "all-MiniLM-L6-v2", 4)
+    vectors, missing = cache.get_many(["a", "b"])
+    assert missing == [0, 1]
+
+    cache.put_many(["a", "b", "a"], np.array([[1, 1, 1, 1], [2, 2, 2, 2], [1, 1, 1, 1]]))
+    assert len(cache) == 2
+
+    vectors, missing = cache.get_many(["b", "c", "a"])
+    assert missing == [1]
+    assert vectors[0].tolist() == [2, 2, 2, 2]
+    assert vectors[2].tolist() == [1, 1, 1, 1]
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 3
+
+
+def test_cache_persists_and_is_scoped_per_model(tmp_path: Path):
+    EmbeddingCache(tmp_path, "model-a", 4).put_many(["text"], np.ones((1, 4)))
+
+    _, missing = EmbeddingCache(tmp_path, "model-a", 4).get_many(["text"])
+    assert missing == []
+    _, missing = EmbeddingCache(tmp_path, "model-b", 4).get_many(["text"])
+    assert missing == [0]
+
+
+def test_partial_append_is_ignored_then_overwritten(tmp_path: Path):
+    cache = EmbeddingCache(tmp_path, "m", 4)
+    cache.put_many(["x"], np.ones((1, 4)))
+    with open(cache.vectors_file, "ab") as f:
+        f.write(b"\0" * 16)  # vector written, key never made it
+    with open(cache.keys_file, "ab") as f:
+        f.write(b"\1" * 5)  # torn key
+
+    reopened = EmbeddingCache(tmp_path, "m", 4)
+    assert len(reopened) == 1
+    assert reopened.vectors_file.stat().st_size == 32  # shared files are never truncated
+
+    reopened.put_many(["y"], np.full((1, 4), 2.0))
+    vectors, missing = EmbeddingCache(tmp_path, "m", 4).get_many(["x", "y"])
+    assert missing == []
+    assert vectors.tolist() == [[1.0] * 4, [2.0] * 4]
+
+
+def test_instances_sharing_a_directory_see_each_others_rows(tmp_path: Path):
+    a = EmbeddingCache(tmp_path, "m", 4)
+    b = EmbeddingCache(tmp_path, "m", 4)
+    a.put_many(["alpha"], np.ones((1, 4)))
+    b.put_many(["beta"], np.full((1, 4), 2.0))
+
+    for cache in (a, b):
+        vectors, missing = cache.get_many(["alpha", "beta"])
+        assert missing == []
+        assert vectors.tolist() == [[1.0] * 4, [2.0] * 4]
+    assert len(a) == len(b) == 2
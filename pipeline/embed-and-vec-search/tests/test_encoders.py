@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import embed_and_index as module
+import encoders
+from embed_and_index import EmbeddingIndexer
+
+
+def test_compare_embeddings_identical_and_perturbed():
+    rng = np.random.default_rng(0)
+    reference = rng.normal(size=(50, 16)).astype("float32")
+
+    same = encoders.compare_embeddings(reference, reference * 3, queries=10, k=5)
+    assert same["min_cosine"] == pytest.approx(1.0)
+    assert same["max_score_diff"] == pytest.approx(0.0, abs=1e-6)
+    assert same["top5_overlap"] == 1.0
+
+    noisy = encoders.compare_embeddings(reference, reference + rng.normal(scale=0.5, size=reference.shape), k=5)
+    assert noisy["min_cosine"] < 0.99
+    assert noisy["top5_overlap"] < 1.0
+
+
+class FakeOnnxEncoder:
+    dimension = 8
+
+    def __init__(self, model_dir, quantized=False, threads=0):
+        self.model_dir = model_dir
+        self.quantized = quantized
+        self.threads = threads
+
+    def encode(self, texts, **kwargs):
+        return np.ones((len(texts), self.dimension), dtype="float32")
+
+
+def test_indexer_onnx_backend_uses_its_own_cache_namespace(tmp_path, monkeypatch):
+    monkeypatch.setattr(module, "OnnxEncoder", FakeOnnxEncoder)
+    monkeypatch.setattr(module, "SentenceTransformer", lambda *args, **kwargs: pytest.fail("torch model loaded"))
+
+    indexer = EmbeddingIndexer(index_path=str(tmp_path / "index"), backend="onnx", onnx_dir=str(tmp_path), quantized=True)
+    assert indexer.model.quantized
+    assert indexer.dimension == 8
+    assert indexer.encoder_id == "all-MiniLM-L6-v2@int8"
+    assert indexer.embedding_cache.path.name == "all-MiniLM-L6-v2_int8"
+    assert indexer.embed_chunks([{"text": "a"}, {"text": "b"}]).shape == (2, 8)
+
+    monkeypatch.setattr(encoders, "OnnxEncoder", FakeOnnxEncoder)
+    worker_model = indexer._bulk_loader()["load_model"]("unused", threads=3)
+    assert (worker_model.model_dir, worker_model.quantized, worker_model.threads) == (str(tmp_path), True, 3)
+
+    with pytest.raises(ValueError):
+        EmbeddingIndexer(index_path=str(tmp_path / "index"), backend="tensorrt")
+
+
+def test_export_matches_sentence_transformers(tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    models = pytest.importorskip("sentence_transformers.models")
+    from sentence_transformers import SentenceTransformer
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    words = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", *"design controls shall be documented and reviewed".split()]
+    bert_dir = tmp_path / "bert"
+    bert_dir.mkdir()
+    (bert_dir / "vocab.txt").write_text("\n".join(words), encoding="utf-8")
+    BertTokenizerFast(str(bert_dir / "vocab.txt")).save_pretrained(str(bert_dir))
+    config = BertConfig(vocab_size=len(words), hidden_size=32, num_hidden_layers=1, num_attention_heads=2, intermediate_size=64)
+    BertModel(config).save_pretrained(str(bert_dir))
+    st_model = SentenceTransformer(
+        modules=[models.Transformer(str(bert_dir), max_seq_length=64), models.Pooling(32, "mean"), models.Normalize()]
+    )
+    st_model.save(str(tmp_path / "st"))
+
+    onnx_dir = encoders.export(str(tmp_path / "st"), tmp_path / "onnx", quantize=True)
+    texts = ["design controls shall be documented", "reviewed", "and " * 40]
+    reference = SentenceTransformer(str(tmp_path / "st"), device="cpu").encode(texts, batch_size=2)
+
+    fp32 = encoders.OnnxEncoder(onnx_dir).encode(texts, batch_size=2)
+    assert encoders.compare_embeddings(reference, fp32)["min_cosine"] > 0.9999
+    int8 = encoders.OnnxEncoder(onnx_dir, quantized=True).encode(texts, batch_size=2)
+    assert encoders.compare_embeddings(reference, int8)["min_cosine"] > 0.99
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import pytest
+
+import index_snapshots
+
+
+def test_publish_and_current_version(tmp_path: Path):
+    assert index_snapshots.current_version(tmp_path) is None
+    version, path = index_snapshots.create_snapshot(tmp_path)
+    assert path.is_dir()
+    assert index_snapshots.current_version(tmp_path) is None
+
+    index_snapshots.publish(tmp_path, version)
+    assert index_snapshots.current_version(tmp_path) == version
+    assert not list(tmp_path.glob("CURRENT.*"))
+
+
+def test_versions_increase_and_gc_keeps_published(tmp_path: Path):
+    versions = [index_snapshots.create_snapshot(tmp_path)[0] for _ in range(4)]
+    assert versions == sorted(versions) and len(set(versions)) == 4
+
+    index_snapshots.publish(tmp_path, versions[0])
+    removed = index_snapshots.collect_garbage(tmp_path, keep=1, protect=[versions[2]])
+    assert removed == [versions[1]]
+    assert index_snapshots.list_versions(tmp_path) == [versions[0], versions[2], versions[3]]
+
+
+def test_publish_refuses_older_version(tmp_path: Path):
+    older, _ = index_snapshots.create_snapshot(tmp_path)
+    newer, _ = index_snapshots.create_snapshot(tmp_path)
+    index_snapshots.publish(tmp_path, newer)
+
+    with pytest.raises(index_snapshots.StaleSnapshotError):
+        index_snapshots.publish(tmp_path, older)
+    assert index_snapshots.current_version(tmp_path) == newer
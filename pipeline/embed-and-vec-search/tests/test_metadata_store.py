@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from metadata_store import ColumnarMetadata
+
+
+def _chunk(doc_id, index, text, page=1, source="reg.pdf"):
+    return {
+        "doc_id": doc_id,
+        "chunk_index": index,
+        "text": text,
+        "start_offset": index * 10,
+        "end_offset": index * 10 + 10,
+        "source": source,
+        "page": page,
+    }
+
+
+def test_round_trip_reads_rows_from_columns(tmp_path: Path):
+    store = ColumnarMetadata()
+    store[0] = _chunk("a", 0, "first")
+    store[1] = _chunk("a", 1, "zweite Überschrift", page=None)
+    store[2] = _chunk("b", 0, "", source=None)
+
+    opened = store.save(tmp_path / "metadata", next_id=3, deleted_ids={2})
+
+    assert len(opened) == 3
+    assert opened.next_id == 3
+    assert opened.deleted_ids == [2]
+    assert opened[1] == {
+        "doc_id": "a",
+        "chunk_index": 1,
+        "text": "zweite Überschrift",
+        "start_offset": 10,
+        "end_offset": 20,
+        "source": "reg.pdf",
+        "page": None,
+        "chunk_id": "a_chunk_1",
+    }
+    assert opened[2]["text"] == "" and opened[2]["source"] is None
+    assert isinstance(opened._columns["ids"], np.memmap)
+    with pytest.raises(KeyError):
+        opened[3]
+
+
+def test_save_merges_overlay_and_drops_removed_rows(tmp_path: Path):
+    store = ColumnarMetadata()
+    for i in range(4):
+        store[i] = _chunk("a" if i < 2 else "b", i, f"text {i}")
+    opened = store.save(tmp_path / "metadata", next_id=4)
+
+    opened[4] = _chunk("c", 0, "new text")
+    compacted = opened.without({1, 2})
+    assert list(compacted) == [0, 3, 4]
+    assert 1 in opened  # the original view is untouched
+
+    reopened = compacted.save(tmp_path / "metadata", next_id=5)
+    assert list(reopened) == [0, 3, 4]
+    assert [reopened[i]["text"] for i in reopened] == ["text 0", "text 3", "new text"]
+
+    ids, docs, doc_names, _, _, pages = reopened.filter_columns()
+    assert ids.tolist() == [0, 3, 4]
+    assert [doc_names[c] for c in docs] == ["a", "b", "c"]
+
+
+def test_round_trip_keeps_extra_fields_and_missing_doc_id(tmp_path: Path):
+    store = ColumnarMetadata()
+    store[0] = {**_chunk("a", 0, "tokens"), "token_count": 12, "section": {"title": "Scope"}}
+    store[1] = {**_chunk(None, 0, "orphan"), "token_count": 3}
+    opened = store.save(tmp_path / "metadata", next_id=2)
+
+    assert opened[0]["token_count"] == 12
+    assert opened[0]["section"] == {"title": "Scope"}
+    assert opened[1]["doc_id"] is None
+    assert opened[1]["token_count"] == 3
+
+    # a second save copies the extras of kept rows along with the new ones
+    opened[2] = _chunk("b", 0, "plain")
+    reopened = opened.without({1}).save(tmp_path / "metadata", next_id=3)
+    assert reopened[0]["token_count"] == 12
+    assert "token_count" not in reopened[2]
+
+
+def test_missing_doc_id_reads_back_as_none_in_an_empty_dictionary(tmp_path: Path):
+    store = ColumnarMetadata()
+    store[0] = _chunk(None, 0, "no document")
+    opened = store.save(tmp_path / "metadata", next_id=1)
+    assert opened._doc_names == []
+    assert opened[0]["doc_id"] is None
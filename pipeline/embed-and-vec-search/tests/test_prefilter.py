@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from prefilter import MetadataFilter
+
+
+@pytest.fixture
+def metadata_filter():
+    chunks = [
+        {"doc_id": "a", "source": "fda.pdf", "page": 1},
+        {"doc_id": "a", "source": "fda.pdf", "page": 2},
+        {"doc_id": "b", "source": "iso.pdf", "page": 1},
+        {"doc_id": "c", "source": "iso.pdf", "page": None},
+        {"doc_id": "c", "source": "iso.pdf", "page": 7},
+    ]
+    return MetadataFilter.from_metadata(enumerate(chunks))
+
+
+def test_no_filters_selects_everything(metadata_filter):
+    assert metadata_filter.select(None) is None
+    assert metadata_filter.select({}) is None
+
+
+def test_doc_ids_are_ored(metadata_filter):
+    assert metadata_filter.select({"doc_id": "a"}).tolist() == [0, 1]
+    assert metadata_filter.select({"doc_ids": ["a", "c"]}).tolist() == [0, 1, 3, 4]
+    assert metadata_filter.select({"doc_ids": ["missing"]}).tolist() == []
+
+
+def test_fields_are_anded(metadata_filter):
+    assert metadata_filter.select({"source": "iso.pdf", "page": 1}).tolist() == [2]
+    assert metadata_filter.select({"doc_ids": ["a", "b"], "page_range": [2, None]}).tolist() == [1]
+    assert metadata_filter.select({"page_range": [None, 5]}).tolist() == [0, 1, 2]
+
+
+def test_unknown_field_rejected(metadata_filter):
+    with pytest.raises(ValueError):
+        metadata_filter.select({"author": "x"})
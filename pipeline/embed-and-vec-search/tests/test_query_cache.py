@@ -0,0 +1,63 @@
+import threading
+
+import numpy as np
+
+from query_cache import QueryEmbeddingCache, normalize_query
+
+
+def test_normalize_query_collapses_whitespace():
+    assert normalize_query("  ISO 13485\n CAPA ") == "ISO 13485 CAPA"
+
+
+def test_hit_miss_and_lru_eviction():
+    vector = np.ones(384, dtype="float32")
+    entry_size = vector.nbytes + 200
+    cache = QueryEmbeddingCache(max_bytes=2 * entry_size)
+
+    assert cache.get("m", "a") is None
+    cache.put("m", "a", vector)
+    cache.put("m", "b", vector * 2)
+    assert cache.get("m", " a ") is not None  # "a" is now most recent
+    cache.put("m", "c", vector * 3)
+
+    assert cache.get("m", "b") is None
+    assert cache.get("other-model", "a") is None
+    np.testing.assert_array_equal(cache.get("m", "c"), vector * 3)
+
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+    assert stats["hits"] == 2 and stats["misses"] == 3
+
+
+def test_ttl_expiry(monkeypatch):
+    import query_cache
+
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, "monotonic", lambda: now[0])
+    cache = QueryEmbeddingCache(max_bytes=10_000, ttl_seconds=10)
+    cache.put("m", "q", np.zeros(4, dtype="float32"))
+    now[0] += 5
+    assert cache.get("m", "q") is not None
+    now[0] += 6
+    assert cache.get("m", "q") is None
+    assert len(cache) == 0
+
+
+def test_concurrent_puts_respect_byte_limit():
+    cache = QueryEmbeddingCache(max_bytes=20_000)
+
+    def worker(offset):
+        for i in range(200):
+            cache.put("m", f"q{offset}-{i}", np.zeros(16, dtype="float32"))
+            cache.get("m", f"q{offset}-{i // 2}")
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = cache.stats()
+    assert 0 < stats["bytes"] <= 20_000
+    assert stats["hits"] + stats["misses"] == 8 * 200
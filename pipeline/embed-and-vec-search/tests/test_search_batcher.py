@@ -0,0 +1,43 @@
+import pytest
+
+from search_batcher import Histogram, SearchBatcher
+
+
+def test_histogram_cumulative_buckets():
+    histogram = Histogram([1, 5])
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    assert snapshot["buckets"] == {"1": 2, "5": 3, "+Inf": 4}
+    assert snapshot["count"] == 4
+    assert snapshot["sum"] == pytest.approx(14.5)
+
+
+def test_concurrent_queries_share_one_batch():
+    calls = []
+
+    def search_batch(queries):
+        calls.append(len(queries))
+        return [q["query"].upper() for q in queries]
+
+    batcher = SearchBatcher(search_batch, max_wait_ms=200, max_batch_size=4)
+    futures = [batcher.submit({"query": q}) for q in ("a", "b", "c", "d")]
+    assert [f.result(timeout=5) for f in futures] == ["A", "B", "C", "D"]
+    assert calls == [4]
+
+    stats = batcher.stats()
+    assert stats["batch_size"]["count"] == 1
+    assert stats["queue_wait_ms"]["count"] == 4
+
+
+def test_failing_query_does_not_fail_the_batch():
+    def search_batch(queries):
+        if any(q["query"] == "bad" for q in queries):
+            raise ValueError("bad query")
+        return [q["query"] for q in queries]
+
+    batcher = SearchBatcher(search_batch, max_wait_ms=200, max_batch_size=2)
+    good, bad = batcher.submit({"query": "good"}), batcher.submit({"query": "bad"})
+    assert good.result(timeout=5) == "good"
+    with pytest.raises(ValueError):
+        bad.result(timeout=5)
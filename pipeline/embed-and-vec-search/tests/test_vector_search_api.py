@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+
 import pytest
 from vector_search_api import app
 import vector_search_api as api
@@ -6,7 +8,12 @@ import vector_search_api as api
 class DummyIndexer:
     def __init__(self):
         self.index = type("Index", (), {"ntotal": 1})()
+        self.ntotal = 1
         self._chunks = [{"chunk_id": "doc1_chunk_0", "text": "hello", "score": 0.9, "doc_id": "doc1"}]
+        self.deleted_ids = set()
+        self.embedding_cache = None
+        self.query_cache = None
+        self.index_version = "00000001"
 
     def load_chunks(self, *_args, **_kwargs):
         return self._chunks
@@ -23,9 +30,36 @@ class DummyIndexer:
     def load_index(self):
         return True
 
-    def search(self, query, k=5, filters=None):
+    def search(self, query, k=5, filters=None, profile=None):
+        if filters and "author" in filters:
+            raise ValueError("Unsupported filter field(s): author")
         return self._chunks[:k]
 
+    def search_batch(self, queries):
+        return [self.search(q["query"], k=q["k"], filters=q["filters"], profile=q["profile"]) for q in queries]
+
+    def delete_documents(self, doc_ids):
+        deleted = [c for c in self._chunks if c["doc_id"] in doc_ids]
+        self.deleted_ids.update(range(len(deleted)))
+        return len(deleted)
+
+    def upsert_documents(self, doc_ids, chunks_dir):
+        self.upserted = doc_ids
+        return len(doc_ids)
+
+    def replace_document(self, doc_id, chunks_dir, replacement_doc_id=None):
+        return 1 if doc_id == "doc1" else 0
+
+    def refresh_index(self):
+        return False
+
+    @contextmanager
+    def writing(self, refresh=True):
+        yield
+
+    def tombstone_ratio(self):
+        return 0.0
+
 
 @pytest.fixture(autouse=True)
 def override_indexer():
@@ -40,6 +74,7 @@ def test_health_endpoint():
     assert res.status_code == 200
     data = res.get_json()
     assert data["status"] == "healthy"
+    assert data["index_version"] == "00000001"
 
 
 def test_vector_search_requires_query():
@@ -55,3 +90,104 @@ def test_vector_search_returns_results():
     data = res.get_json()
     assert data["count"] == 1
 
+
+
+def test_delete_document():
+    client = app.test_client()
+    res = client.delete("/vector/doc/doc1")
+    assert res.status_code == 200
+    assert res.get_json()["deleted_chunks"] == 1
+
+    res = client.delete("/vector/doc/missing")
+    assert res.status_code == 404
+
+
+def test_replace_document():
+    client = app.test_client()
+    res = client.put("/vector/doc/doc1", json={"replacement_doc_id": "doc1"})
+    assert res.status_code == 200
+    assert res.get_json()["status"] == "replaced"
+
+    res = client.put("/vector/doc/unknown")
+    assert res.status_code == 404
+
+
+def test_index_upserts_listed_doc_ids():
+    client = app.test_client()
+    res = client.post("/vector/index", json={"doc_ids": ["doc1", "doc2"]})
+    assert res.status_code == 200
+    assert api.indexer.upserted == ["doc1", "doc2"]
+
+
+@pytest.mark.parametrize(
+    "doc_ids", ["doc1", ["../etc"], ["a/b"], ["a\\b"], [".."], [""], [7], {"doc": "doc1"}]
+)
+def test_index_rejects_doc_ids_that_are_not_plain_names(doc_ids):
+    res = app.test_client().post("/vector/index", json={"doc_ids": doc_ids})
+    assert res.status_code == 400
+    assert not hasattr(api.indexer, "upserted")
+
+
+def test_replace_document_rejects_path_like_replacement_id():
+    client = app.test_client()
+    assert client.put("/vector/doc/doc1", json={"replacement_doc_id": "../doc2"}).status_code == 400
+
+
+def test_vector_search_rejects_unknown_profile():
+    client = app.test_client()
+    res = client.post("/vector/search", json={"query": "hello", "profile": "turbo"})
+    assert res.status_code == 400
+
+    res = client.post("/vector/search", json={"query": "hello", "profile": "fast"})
+    assert res.status_code == 200
+
+
+def test_vector_search_rejects_unknown_filter():
+    client = app.test_client()
+    res = client.post("/vector/search", json={"query": "hello", "filters": {"author": "x"}})
+    assert res.status_code == 400
+
+
+def test_vector_search_batch_returns_results_in_order():
+    client = app.test_client()
+    res = client.post("/vector/search/batch", json={"queries": ["first", {"query": "second", "k": 0}], "k": 1})
+    assert res.status_code == 200
+    data = res.get_json()
+    assert data["count"] == 2
+    assert [r["query"] for r in data["results"]] == ["first", "second"]
+    assert [r["count"] for r in data["results"]] == [1, 0]
+
+
+def test_vector_search_batch_validates_queries():
+    client = app.test_client()
+    assert client.post("/vector/search/batch", json={"queries": []}).status_code == 400
+    assert client.post("/vector/search/batch", json={"queries": [{"k": 1}]}).status_code == 400
+    res = client.post("/vector/search/batch", json={"queries": ["a"], "profile": "turbo"})
+    assert res.status_code == 400
+    res = client.post("/vector/search/batch", json={"queries": [{"query": "a", "filters": {"author": "x"}}]})
+    assert res.status_code == 400
+
+
+def test_vector_metrics_reports_batching_histograms():
+    client = app.test_client()
+    client.post("/vector/search", json={"query": "hello", "k": 1})
+    res = client.get("/vector/metrics")
+    assert res.status_code == 200
+    data = res.get_json()["search_batching"]
+    assert data["batch_size"]["count"] >= 1
+    assert "+Inf" in data["queue_wait_ms"]["buckets"]
+
+
+def test_ready_flips_after_warmup(monkeypatch):
+    class Model:
+        def encode(self, texts, **kwargs):
+            return [[0.0] * 384 for _ in texts]
+
+    monkeypatch.setattr(api, "_ready", api.threading.Event())
+    api.indexer.model = Model()
+    api.indexer.index = None
+    client = app.test_client()
+    assert client.get("/ready").status_code == 503
+
+    api.warmup()
+    assert client.get("/ready").status_code == 200
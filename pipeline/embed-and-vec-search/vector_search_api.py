@@ -1,7 +1,13 @@
 from flask import Flask, request, jsonify
 import logging
+import os
+import threading
+import time
 
-from embed_and_index import EmbeddingIndexer
+import numpy as np
+
+from embed_and_index import EmbeddingIndexer, SEARCH_PROFILES
+from search_batcher import SearchBatcher
 
 
 logging.basicConfig(level=logging.INFO)
@@ -9,21 +15,103 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+CHUNKS_DIR = os.getenv("CHUNKS_DIR", "../storage/chunks")
+# Start a background compaction once this fraction of vectors is tombstoned
+COMPACTION_THRESHOLD = float(os.getenv("COMPACTION_THRESHOLD", "0.2"))
+# Upper bound on queries accepted by one POST /vector/search/batch
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "1000"))
+# Concurrent /vector/search calls are coalesced for up to this long...
+SEARCH_BATCH_MAX_WAIT_MS = float(os.getenv("SEARCH_BATCH_MAX_WAIT_MS", "2"))
+# ...or until this many are queued, then answered by one batched search
+SEARCH_BATCH_MAX_SIZE = int(os.getenv("SEARCH_BATCH_MAX_SIZE", "32"))
+# How often to check for a newly published index snapshot (0 disables)
+INDEX_POLL_SECONDS = float(os.getenv("INDEX_POLL_SECONDS", "5"))
+
+_compaction_thread = None
+_ready = threading.Event()  # set by warmup(); gates GET /ready
+_watcher_thread = None
+
 # Initialize indexer (load existing index if present)
 indexer = EmbeddingIndexer()
 if indexer.load_index():
-    logger.info("[OK] Loaded existing index with %d vectors", indexer.index.ntotal)
+    logger.info("[OK] Loaded existing index with %d vectors", indexer.ntotal)
 else:
     logger.warning("[WARN] No index loaded. Run embed_and_index.py or POST /vector/index.")
 
+# looks up the module-level indexer on every batch, so reassigning it is safe
+search_batcher = SearchBatcher(
+    lambda queries: indexer.search_batch(queries),
+    max_wait_ms=SEARCH_BATCH_MAX_WAIT_MS,
+    max_batch_size=SEARCH_BATCH_MAX_SIZE,
+)
+
+
+def warmup():
+    """Run one query through the model and index, then report ready.
+
+    Under gunicorn this runs in each worker after fork (see gunicorn.conf.py):
+    the first inference starts torch/OpenMP thread pools, which must not exist
+    in the parent when it forks.
+    """
+    query_embedding = indexer.model.encode(["warmup"], convert_to_numpy=True)
+    if indexer.index is not None and indexer.index.ntotal:
+        # a full scan also faults the memory-mapped index pages in
+        indexer.index.search(np.asarray(query_embedding, dtype="float32"), 1)
+    start_index_watcher()
+    _ready.set()
+    logger.info("[OK] Warmup complete (pid %d)", os.getpid())
+
+
+def _watch_index():
+    """Hot-swap in snapshots published by other processes (e.g. the RAG API)."""
+    while True:
+        time.sleep(INDEX_POLL_SECONDS)
+        try:
+            if indexer.refresh_index():
+                logger.info("[OK] Now serving index snapshot %s", indexer.index_version)
+        except Exception as e:  # pragma: no cover - defensive
+            logger.error("Index reload error: %s", e, exc_info=True)
+
+
+def start_index_watcher():
+    """Start the snapshot polling thread once per process."""
+    global _watcher_thread
+    if INDEX_POLL_SECONDS <= 0 or (_watcher_thread is not None and _watcher_thread.is_alive()):
+        return
+    _watcher_thread = threading.Thread(target=_watch_index, name="index-watcher", daemon=True)
+    _watcher_thread.start()
+
+
+def _is_doc_id(value) -> bool:
+    """A plain name that stays inside CHUNKS_DIR when joined to it."""
+    return (
+        isinstance(value, str)
+        and bool(value)
+        and ".." not in value
+        and not any(sep in value for sep in ("/", "\\", os.sep, os.altsep) if sep)
+    )
+
 
 @app.route("/vector/index", methods=["POST"])
 def index_documents():
-    """Trigger re-indexing of all chunks from storage/chunks/."""
+    """Trigger re-indexing of all chunks from storage/chunks/.
+
+    An optional ``{"doc_ids": [...]}`` body upserts just those documents.
+    """
     try:
         logger.info("Starting indexing job...")
 
-        chunks = indexer.load_chunks("../storage/chunks")
+        doc_ids = (request.get_json(silent=True) or {}).get("doc_ids")
+        if doc_ids is not None and not (isinstance(doc_ids, list) and all(map(_is_doc_id, doc_ids))):
+            return jsonify({"error": "doc_ids must be a list of document ids without path separators or '..'"}), 400
+        if doc_ids:
+            num_chunks = indexer.upsert_documents(doc_ids, CHUNKS_DIR)
+            if not num_chunks:
+                return jsonify({"error": "No chunks found for doc_ids", "doc_ids": doc_ids}), 404
+            logger.info("[OK] Upsert complete: %d chunks", num_chunks)
+            return jsonify({"status": "success", "num_chunks": num_chunks, "index_size": indexer.ntotal})
+
+        chunks = indexer.load_chunks(CHUNKS_DIR)
         if not chunks:
             return (
                 jsonify(
@@ -36,12 +124,13 @@ def index_documents():
             )
 
         embeddings = indexer.embed_chunks(chunks)
-        indexer.build_index(embeddings, chunks)
-        indexer.save_index()
+        with indexer.writing(refresh=False):
+            indexer.build_index(embeddings, chunks)
+            indexer.save_index()
 
         logger.info("[OK] Indexing complete: %d chunks", len(chunks))
 
-        return jsonify({"status": "success", "num_chunks": len(chunks), "index_size": indexer.index.ntotal})
+        return jsonify({"status": "success", "num_chunks": len(chunks), "index_size": indexer.ntotal})
 
     except Exception as e:  # pragma: no cover - defensive
         logger.error("Indexing error: %s", e, exc_info=True)
@@ -50,7 +139,11 @@ def index_documents():
 
 @app.route("/vector/search", methods=["POST"])
 def search():
-    """Search for similar chunks."""
+    """Search for similar chunks.
+
+    Concurrent calls are coalesced by ``search_batcher`` into one batched
+    encode and FAISS search.
+    """
     try:
         data = request.json
 
@@ -60,32 +153,220 @@ def search():
         query = data.get("query")
         k = data.get("k", 5)
         filters = data.get("filters")
+        profile = data.get("profile")
 
         if not query:
             return jsonify({"error": "query field is required"}), 400
 
-        if indexer.index is None or indexer.index.ntotal == 0:
+        if profile is not None and profile not in SEARCH_PROFILES:
+            return jsonify({"error": f"profile must be one of: {', '.join(SEARCH_PROFILES)}"}), 400
+
+        if indexer.index is None or indexer.ntotal == 0:
             return (
                 jsonify({"error": "Index not loaded or empty", "message": "Run POST /vector/index first to build the index"}),
                 503,
             )
 
-        results = indexer.search(query, k=k, filters=filters)
+        results = search_batcher.search({"query": query, "k": k, "filters": filters, "profile": profile})
         logger.info("Search query='%s...' returned %d results", query[:50], len(results))
 
         return jsonify({"query": query, "results": results, "count": len(results)})
 
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     except Exception as e:  # pragma: no cover - defensive
         logger.error("Search error: %s", e, exc_info=True)
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/vector/search/batch", methods=["POST"])
+def search_batch():
+    """Search for many queries in one request.
+
+    Body ``{"queries": [...], "k"?, "filters"?, "profile"?}``. Each entry of
+    ``queries`` is a query string or ``{query, k?, filters?, profile?}``; the
+    top-level fields are defaults for entries that omit them. Results come
+    back in input order.
+    """
+    try:
+        data = request.json
+
+        if not data:
+            return jsonify({"error": "Request body is required"}), 400
+
+        entries = data.get("queries")
+        if not isinstance(entries, list) or not entries:
+            return jsonify({"error": "queries must be a non-empty list"}), 400
+        if len(entries) > MAX_BATCH_QUERIES:
+            return jsonify({"error": f"At most {MAX_BATCH_QUERIES} queries per batch"}), 400
+
+        queries = []
+        for position, entry in enumerate(entries):
+            if isinstance(entry, str):
+                entry = {"query": entry}
+            if not isinstance(entry, dict) or not entry.get("query"):
+                return jsonify({"error": f"queries[{position}]: query field is required"}), 400
+
+            profile = entry.get("profile", data.get("profile"))
+            if profile is not None and profile not in SEARCH_PROFILES:
+                return (
+                    jsonify({"error": f"queries[{position}]: profile must be one of: {', '.join(SEARCH_PROFILES)}"}),
+                    400,
+                )
+
+            queries.append(
+                {
+                    "query": entry["query"],
+                    "k": entry.get("k", data.get("k", 5)),
+                    "filters": entry.get("filters", data.get("filters")),
+                    "profile": profile,
+                }
+            )
+
+        if indexer.index is None or indexer.ntotal == 0:
+            return (
+                jsonify({"error": "Index not loaded or empty", "message": "Run POST /vector/index first to build the index"}),
+                503,
+            )
+
+        batch_results = indexer.search_batch(queries)
+        logger.info("Batch search of %d queries returned %d results", len(queries), sum(map(len, batch_results)))
+
+        return jsonify(
+            {
+                "results": [
+                    {"query": query["query"], "results": results, "count": len(results)}
+                    for query, results in zip(queries, batch_results)
+                ],
+                "count": len(queries),
+            }
+        )
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    except Exception as e:  # pragma: no cover - defensive
+        logger.error("Batch search error: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
+def start_compaction():
+    """Run indexer.compact() in a background thread unless one is running."""
+    global _compaction_thread
+    if _compaction_thread is not None and _compaction_thread.is_alive():
+        return False
+
+    def _run(target):
+        try:
+            # compact() refreshes to the latest snapshot under the writer lock
+            target.compact(chunks_dir=CHUNKS_DIR)
+        except Exception as e:  # pragma: no cover - defensive
+            logger.error("Compaction error: %s", e, exc_info=True)
+
+    _compaction_thread = threading.Thread(target=_run, args=(indexer,), name="index-compaction", daemon=True)
+    _compaction_thread.start()
+    return True
+
+
+def _maybe_compact():
+    """Kick off compaction when enough of the index is tombstoned."""
+    if indexer.tombstone_ratio() >= COMPACTION_THRESHOLD:
+        start_compaction()
+
+
+@app.route("/vector/doc/<doc_id>", methods=["DELETE"])
+def delete_document(doc_id):
+    """Tombstone all chunks of a document; space is reclaimed by compaction."""
+    try:
+        # tombstone on top of the latest snapshot, with no other writer in between
+        with indexer.writing():
+            deleted = indexer.delete_documents([doc_id])
+            if deleted:
+                indexer.save_index()
+        if not deleted:
+            return jsonify({"error": "Document not found in index", "doc_id": doc_id}), 404
+
+        _maybe_compact()
+
+        return jsonify({"status": "deleted", "doc_id": doc_id, "deleted_chunks": deleted})
+
+    except Exception as e:  # pragma: no cover - defensive
+        logger.error("Delete error: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/vector/doc/<doc_id>", methods=["PUT"])
+def replace_document(doc_id):
+    """Replace a document's vectors.
+
+    Body ``{"replacement_doc_id": "..."}`` swaps in another ingested document;
+    without it the document is re-read from storage/chunks/<doc_id>.
+    """
+    try:
+        replacement_doc_id = (request.get_json(silent=True) or {}).get("replacement_doc_id")
+        if not _is_doc_id(doc_id) or (replacement_doc_id is not None and not _is_doc_id(replacement_doc_id)):
+            return jsonify({"error": "Document ids must not contain path separators or '..'"}), 400
+        indexed = indexer.replace_document(doc_id, CHUNKS_DIR, replacement_doc_id=replacement_doc_id)
+        if not indexed:
+            return (
+                jsonify({"error": "No chunks found for replacement", "doc_id": replacement_doc_id or doc_id}),
+                404,
+            )
+
+        _maybe_compact()
+
+        return jsonify(
+            {
+                "status": "replaced",
+                "doc_id": doc_id,
+                "replacement_doc_id": replacement_doc_id or doc_id,
+                "num_chunks": indexed,
+            }
+        )
+
+    except Exception as e:  # pragma: no cover - defensive
+        logger.error("Replace error: %s", e, exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/vector/compact", methods=["POST"])
+def compact_index():
+    """Start a background compaction of tombstoned vectors."""
+    started = start_compaction()
+    return jsonify({"status": "started" if started else "already_running", "tombstoned": len(indexer.deleted_ids)}), 202
+
+
+@app.route("/vector/metrics", methods=["GET"])
+def metrics():
+    """Search micro-batching histograms (batch size and queue wait)."""
+    return jsonify({"search_batching": search_batcher.stats()})
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness probe: 200 only once this worker has finished warmup."""
+    if not _ready.is_set():
+        return jsonify({"status": "warming_up"}), 503
+    return jsonify({"status": "ready", "pid": os.getpid()})
+
+
 @app.route("/health", methods=["GET"])
 def health():
     """Health check endpoint."""
-    index_size = indexer.index.ntotal if indexer.index else 0
+    index_size = indexer.ntotal
 
-    return jsonify({"status": "healthy", "index_size": index_size, "index_loaded": indexer.index is not None})
+    return jsonify(
+        {
+            "status": "healthy",
+            "index_size": index_size,
+            "index_loaded": indexer.index is not None,
+            "index_version": indexer.index_version,
+            "tombstoned": len(indexer.deleted_ids),
+            "embedding_cache": indexer.embedding_cache.stats() if indexer.embedding_cache is not None else None,
+            "query_cache": indexer.query_cache.stats() if indexer.query_cache is not None else None,
+        }
+    )
 
 
 @app.route("/", methods=["GET"])
@@ -95,11 +376,17 @@ def root():
         {
             "service": "Vector Search API (Person 3)",
             "endpoints": {
-                "POST /vector/index": "Re-index all chunks from storage/chunks/",
-                "POST /vector/search": "Search for similar chunks (body: {query, k?, filters?})",
+                "POST /vector/index": "Re-index all chunks from storage/chunks/ (body: {doc_ids?} to upsert only those)",
+                "POST /vector/search": "Search for similar chunks (body: {query, k?, filters?, profile?})",
+                "POST /vector/search/batch": "Search many queries at once (body: {queries: [...], k?, filters?, profile?})",
+                "DELETE /vector/doc/<doc_id>": "Tombstone a document's chunks",
+                "PUT /vector/doc/<doc_id>": "Replace a document (body: {replacement_doc_id?})",
+                "POST /vector/compact": "Reclaim space held by deleted documents",
+                "GET /vector/metrics": "Search batching histograms",
+                "GET /ready": "Readiness probe (503 until warmup finishes)",
                 "GET /health": "Health check",
             },
-            "index_status": {"loaded": indexer.index is not None, "size": indexer.index.ntotal if indexer.index else 0},
+            "index_status": {"loaded": indexer.index is not None, "size": indexer.ntotal},
         }
     )
 
@@ -112,8 +399,16 @@ if __name__ == "__main__":
     print("\nEndpoints:")
     print("  POST /vector/index  - Build/rebuild index")
     print("  POST /vector/search - Search for chunks")
+    print("  POST /vector/search/batch - Search for many queries")
+    print("  DELETE /vector/doc/<doc_id> - Delete a document")
+    print("  PUT  /vector/doc/<doc_id> - Replace a document")
+    print("  POST /vector/compact - Compact the index")
+    print("  GET  /vector/metrics - Search batching metrics")
+    print("  GET  /ready         - Readiness probe")
     print("  GET  /health        - Health check")
+    print("  (production: gunicorn -c gunicorn.conf.py vector_search_api:app)")
     print("=" * 60)
 
+    warmup()
     app.run(host="0.0.0.0", port=5001, debug=True)
 
@@ -0,0 +1,147 @@
+"""
+Full-precision vectors for exact re-ranking, read through a memory map.
+
+Rows of the raw float32 file hold normalized vectors in ascending chunk ID
+order; a parallel raw int64 file (``<name>.ids``) records the chunk ID of
+each row. Chunk IDs are never reused, so rows are only ever appended past
+the end of what any snapshot has recorded. A search reads just the rows of
+its shortlist; the matrix itself stays in the page cache instead of in
+process memory. Files from before the ID file existed hold chunk ID ``i``
+in row ``i``.
+
+Each snapshot hard-links the files as ``vectors.f32`` (+ ``.ids``) and
+records the row count. Later saves link the same files and extend them,
+which older snapshots never see because they only map their own rows. A
+fresh build, and compaction, start new files (the latter holding only live
+rows), so neither can overwrite rows that a published snapshot still serves.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.f32"
+IDS_SUFFIX = ".ids"  # chunk ID per row, next to the vectors file
+STAGING_SUFFIX = ".f32.tmp"  # written by a build that has not been saved yet
+COPY_BATCH_ROWS = 65536  # rows copied at a time when compacting
+
+
+def _ids_path(path: Path) -> Path:
+    return path.with_name(path.name + IDS_SUFFIX)
+
+
+def _link(source: Path, target: Path) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+class VectorFile:
+    """Float32 rows keyed by chunk ID in a raw file; ``rows`` of them are visible."""
+
+    def __init__(self, path: str | Path, dimension: int, rows: Optional[int] = None):
+        self.path = Path(path)
+        self.dimension = dimension
+        self.row_bytes = dimension * 4
+        if rows is None:
+            rows = self.path.stat().st_size // self.row_bytes
+        self.rows = rows
+        self.keyed = _ids_path(self.path).exists()  # False: row i is chunk ID i
+        self._vectors = None
+        self._ids = None
+        self._map()
+
+    @classmethod
+    def create(cls, directory: str | Path, dimension: int) -> "VectorFile":
+        """Start an empty staging file in ``directory`` for a fresh build."""
+        path = Path(directory) / f"vectors.{uuid.uuid4().hex}{STAGING_SUFFIX}"
+        path.touch()
+        _ids_path(path).touch()
+        return cls(path, dimension, rows=0)
+
+    def _map(self) -> None:
+        if self.rows:
+            self._vectors = np.memmap(self.path, dtype="float32", mode="r", shape=(self.rows, self.dimension))
+            if self.keyed:
+                self._ids = np.memmap(_ids_path(self.path), dtype="int64", mode="r", shape=(self.rows,))
+        else:
+            self._vectors = np.empty((0, self.dimension), dtype="float32")
+            self._ids = np.empty(0, dtype="int64")
+
+    def extended(self, first_id: int, vectors: np.ndarray) -> "VectorFile":
+        """Store ``vectors`` as the rows of chunk IDs ``first_id``, ``first_id + 1``, ...
+
+        Returns a new ``VectorFile`` that sees them; this one keeps its row
+        count and map, so searches using it are unaffected. ``first_id`` must
+        be above every stored ID.
+        """
+        row = self.rows if self.keyed else first_id
+        with open(self.path, "r+b") as f:
+            f.seek(row * self.row_bytes)
+            np.ascontiguousarray(vectors, dtype="float32").tofile(f)
+        if self.keyed:
+            with open(_ids_path(self.path), "r+b") as f:
+                f.seek(row * 8)
+                np.arange(first_id, first_id + len(vectors), dtype="int64").tofile(f)
+        return VectorFile(self.path, self.dimension, row + len(vectors))
+
+    def rows_of(self, ids: np.ndarray) -> np.ndarray:
+        """Map chunk IDs to row numbers."""
+        ids = np.asarray(ids, dtype="int64")
+        return np.searchsorted(self._ids, ids) if self.keyed else ids
+
+    def get(self, ids: np.ndarray) -> np.ndarray:
+        """Copy the rows of ``ids`` into memory."""
+        return np.asarray(self._vectors[self.rows_of(ids)])
+
+    def nbytes(self) -> int:
+        return self.rows * self.row_bytes
+
+    def compacted(self, directory: str | Path, live_ids: np.ndarray) -> "VectorFile":
+        """Copy the rows of ``live_ids`` (ascending) into a new staging file in ``directory``.
+
+        Rows of deleted and replaced chunks are left behind in this file,
+        which snapshots still serving them keep alive until they are collected.
+        """
+        target = VectorFile.create(directory, self.dimension)
+        live_ids = np.asarray(live_ids, dtype="int64")
+        with open(target.path, "wb") as vectors_out, open(_ids_path(target.path), "wb") as ids_out:
+            for start in range(0, len(live_ids), COPY_BATCH_ROWS):
+                batch = live_ids[start : start + COPY_BATCH_ROWS]
+                np.ascontiguousarray(self.get(batch)).tofile(vectors_out)
+                batch.tofile(ids_out)
+        return VectorFile(target.path, self.dimension, len(live_ids))
+
+    def publish(self, directory: str | Path) -> "VectorFile":
+        """Link the file into a snapshot ``directory`` and return it opened there.
+
+        A staging file is removed once linked; the snapshot now owns it.
+        Falls back to copying where hard links are not supported.
+        """
+        target = Path(directory) / VECTORS_FILE
+        _link(self.path, target)
+        if self.keyed:
+            _link(_ids_path(self.path), _ids_path(target))
+        if self.path.name.endswith(STAGING_SUFFIX):
+            self.path.unlink()
+            _ids_path(self.path).unlink(missing_ok=True)
+        return VectorFile(target, self.dimension, self.rows)
+
+
+def remove_stale_staging(directory: str | Path, keep: Optional[VectorFile] = None) -> None:
+    """Delete staging files left behind by builds that were never saved."""
+    for path in Path(directory).glob(f"vectors.*{STAGING_SUFFIX}"):
+        if keep is None or path != keep.path:
+            path.unlink(missing_ok=True)
+            _ids_path(path).unlink(missing_ok=True)
+            logger.info("Removed unsaved vector file %s", path)
@@ -0,0 +1,97 @@
+"""
+Compare OCR backends on the same rendered pages.
+Usage:
+    python benchmark_ocr.py <file> [<file> ...] [--backends tesserocr pytesseract] [--dpi 300] [--max-pages 20]
+
+PDF pages are rendered once up front so only OCR time is measured.
+Prints pages/second per backend and a JSON summary.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import pdfplumber
+from PIL import Image
+
+from extractor import OCR_BACKENDS, OCR_LANG, detect_file_type
+
+
+def load_pages(paths: List[Path], dpi: int, max_pages: int) -> List[Image.Image]:
+    """Render PDF pages / load images as PIL images, at most ``max_pages``."""
+    images: List[Image.Image] = []
+    for path in paths:
+        if detect_file_type(path) == "pdf":
+            with pdfplumber.open(path) as pdf:
+                for page in pdf.pages:
+                    if len(images) >= max_pages:
+                        return images
+                    images.append(page.to_image(resolution=dpi).original.copy())
+        elif detect_file_type(path) == "image":
+            if len(images) >= max_pages:
+                return images
+            with Image.open(path) as img:
+                images.append(img.copy())
+    return images
+
+
+def benchmark(backend_name: str, images: List[Image.Image]) -> Dict[str, float]:
+    started = time.perf_counter()
+    backend = OCR_BACKENDS[backend_name](OCR_LANG)
+    startup = time.perf_counter() - started
+
+    chars = 0
+    started = time.perf_counter()
+    for image in images:
+        chars += len(backend.image_to_text(image))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "pages": len(images),
+        "startup_seconds": round(startup, 3),
+        "ocr_seconds": round(elapsed, 3),
+        "pages_per_second": round(len(images) / elapsed, 2) if elapsed else 0.0,
+        "chars": chars,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark OCR backends (pages/second).")
+    parser.add_argument("files", nargs="+", help="PDF or image files to OCR.")
+    parser.add_argument("--backends", nargs="+", default=list(OCR_BACKENDS), choices=list(OCR_BACKENDS))
+    parser.add_argument("--dpi", type=int, default=300, help="Render resolution for PDF pages.")
+    parser.add_argument("--max-pages", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = [Path(f) for f in args.files]
+    missing = [p for p in paths if not p.exists()]
+    if missing:
+        print(f"[error] File not found: {missing[0]}")
+        sys.exit(1)
+
+    images = load_pages(paths, args.dpi, args.max_pages)
+    if not images:
+        print("[error] No PDF pages or images to OCR")
+        sys.exit(1)
+
+    results = {}
+    for name in args.backends:
+        try:
+            results[name] = benchmark(name, images)
+        except Exception as exc:  # pylint: disable=broad-except
+            results[name] = {"error": str(exc)}
+            print(f"{name:12s} unavailable: {exc}")
+            continue
+        r = results[name]
+        print(f"{name:12s} {r['pages_per_second']:8.2f} pages/s  ({r['pages']} pages in {r['ocr_seconds']}s)")
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
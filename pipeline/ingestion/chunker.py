@@ -1,10 +1,23 @@
 """
 Chunking utilities for sliding-window, word-based segmentation.
+iter_chunks() does the same over a stream of pages with bounded memory.
+Given a tokenizer, windows are sized in the embedding model's tokens
+instead of words (CHUNK_MODE=tokens), so chunks fit its sequence limit.
 """
 
 from __future__ import annotations
 
-from typing import List, Dict, Optional, Any
+import os
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+CHUNK_MODE = os.getenv("CHUNK_MODE", "words")  # words | tokens
+CHUNK_TOKENIZER = os.getenv("CHUNK_TOKENIZER", "sentence-transformers/all-MiniLM-L6-v2")
+# the embedding model's max sequence length, special tokens included
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+TOKENIZE_BATCH_WORDS = 2048
 
 
 def split_words(text: str) -> List[str]:
@@ -44,6 +57,44 @@ def _find_page(page_ranges: Optional[List[Dict[str, int]]], start_offset: int) -
     return page_ranges[-1]["page"] if page_ranges else None
 
 
+@lru_cache(maxsize=None)
+def load_tokenizer(name: str = CHUNK_TOKENIZER):
+    """Load (once per process) the fast tokenizer of an embedding model."""
+    try:
+        from transformers import AutoTokenizer
+    except ImportError as exc:
+        raise RuntimeError("Token chunking needs the transformers package") from exc
+    return AutoTokenizer.from_pretrained(name, use_fast=True)
+
+
+def chunking_options(mode: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Keyword arguments for chunk_text()/iter_chunks() in the given mode
+    (default CHUNK_MODE). "words" keeps the defaults; "tokens" sizes windows
+    to CHUNK_MAX_TOKENS minus the special tokens the model adds.
+    """
+    mode = mode or CHUNK_MODE
+    if mode == "words":
+        return {}
+    if mode != "tokens":
+        raise ValueError(f"Unknown chunk mode: {mode}")
+    tokenizer = load_tokenizer(CHUNK_TOKENIZER)
+    return {
+        "tokenizer": tokenizer,
+        "chunk_size": CHUNK_MAX_TOKENS - tokenizer.num_special_tokens_to_add(),
+        "overlap": CHUNK_OVERLAP_TOKENS,
+    }
+
+
+def count_tokens(tokenizer, words: List[str]) -> List[int]:
+    """Return the number of tokens each word encodes to, tokenizing in batches."""
+    counts: List[int] = []
+    for i in range(0, len(words), TOKENIZE_BATCH_WORDS):
+        encoded = tokenizer(words[i : i + TOKENIZE_BATCH_WORDS], add_special_tokens=False)
+        counts.extend(len(ids) for ids in encoded["input_ids"])
+    return counts
+
+
 def chunk_text(
     text: str,
     doc_id: str,
@@ -51,13 +102,23 @@ def chunk_text(
     overlap: int = 50,
     source: Optional[str] = None,
     page_ranges: Optional[List[Dict[str, int]]] = None,
+    tokenizer=None,
 ) -> List[Dict]:
     """
     Split text into overlapping word chunks with metadata.
     Chunks follow sliding window:
       chunk_1 = words[0:chunk_size]
       chunk_2 = words[chunk_size - overlap : chunk_size - overlap + chunk_size]
+    With a tokenizer, chunk_size and overlap count tokens (see iter_chunks).
     """
+    if tokenizer is not None:
+        chunks = list(
+            _iter_token_chunks([{"text": text}], doc_id, tokenizer, chunk_size, overlap, source, None)
+        )
+        for chunk in chunks:
+            chunk["page"] = _find_page(page_ranges, chunk["start_offset"])
+        return chunks
+
     words = split_words(text)
     if not words:
         return []
@@ -93,3 +154,175 @@ def chunk_text(
 
     return chunks
 
+
+
+def iter_chunks(
+    pages: Iterable[Dict[str, Any]],
+    doc_id: str,
+    chunk_size: int = 500,
+    overlap: int = 50,
+    source: Optional[str] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    tokenizer=None,
+) -> Iterator[Dict]:
+    """
+    Streaming equivalent of chunk_text(full_text, ..., page_ranges=build_page_ranges(pages)).
+    Consumes {"page": int, "text": str} entries and yields each chunk as soon
+    as its window is full, so only about one window of words is held at a time.
+    If ``stats`` is given it is updated with pages, words, chars (length of the
+    space-joined text) and ocr_seconds as the stream is consumed.
+
+    With a (Hugging Face fast) ``tokenizer``, each chunk holds as many whole
+    words as fit in ``chunk_size`` tokens and repeats at most ``overlap``
+    tokens of the previous one; chunks also carry ``token_count``. Offsets
+    stay in words. Words are tokenized on their own, which is exact for
+    WordPiece models like all-MiniLM-L6-v2.
+    """
+    if tokenizer is not None:
+        yield from _iter_token_chunks(pages, doc_id, tokenizer, chunk_size, overlap, source, stats)
+        return
+
+    _init_stats(stats)
+    step = max(chunk_size - overlap, 1)
+    buffer: List[str] = []  # words[base:total]
+    base = 0
+    total = 0
+    start = 0
+    index = 0
+    ranges: deque = deque()  # (page, start_offset, end_offset) of pages that still overlap the buffer
+
+    def emit(end: int) -> Dict:
+        while ranges and ranges[0][2] <= start:
+            ranges.popleft()
+        return {
+            "doc_id": doc_id,
+            "chunk_index": index,
+            "text": " ".join(buffer[start - base : end - base]),
+            "start_offset": start,
+            "end_offset": end,
+            "source": source,
+            "page": ranges[0][0] if ranges else None,
+        }
+
+    for entry in pages:
+        words = split_words(entry.get("text", ""))
+        _update_stats(stats, entry, words)
+        if not words:
+            continue
+
+        ranges.append((entry.get("page"), total, total + len(words)))
+        buffer.extend(words)
+        total += len(words)
+
+        while start + chunk_size <= total:
+            yield emit(start + chunk_size)
+            index += 1
+            start += step
+
+        # drop words no later window can reach
+        drop = min(start - base, len(buffer))
+        if drop:
+            del buffer[:drop]
+            base += drop
+
+    while start < total:
+        yield emit(min(start + chunk_size, total))
+        index += 1
+        start += step
+
+
+def _init_stats(stats: Optional[Dict[str, Any]]) -> None:
+    if stats is not None:
+        stats.update({"pages": 0, "words": 0, "chars": 0, "ocr_seconds": 0.0})
+
+
+def _update_stats(stats: Optional[Dict[str, Any]], entry: Dict[str, Any], words: List[str]) -> None:
+    if stats is None:
+        return
+    stats["pages"] += 1
+    stats["chars"] += sum(map(len, words)) + (len(words) if stats["words"] else max(len(words) - 1, 0))
+    stats["words"] += len(words)
+    stats["ocr_seconds"] += entry.get("ocr_seconds", 0.0)
+
+
+def _iter_token_chunks(
+    pages: Iterable[Dict[str, Any]],
+    doc_id: str,
+    tokenizer,
+    max_tokens: int,
+    overlap_tokens: int,
+    source: Optional[str],
+    stats: Optional[Dict[str, Any]],
+) -> Iterator[Dict]:
+    _init_stats(stats)
+    if stats is not None:
+        stats["tokens"] = 0
+
+    buffer: List[str] = []  # words[base:total]
+    costs: List[int] = []  # token count of each buffered word
+    base = total = 0
+    start = end = 0  # current window is words[start:end] ...
+    window_tokens = 0  # ... holding this many tokens
+    index = 0
+    ranges: deque = deque()
+
+    def windows(final: bool) -> Iterator[Dict]:
+        nonlocal start, end, window_tokens, index
+        while start < total:
+            # grow the window until the next word would not fit; a single
+            # word longer than max_tokens still gets a window of its own
+            while end < total and (end == start or window_tokens + costs[end - base] <= max_tokens):
+                window_tokens += costs[end - base]
+                end += 1
+            if end == total and not final:
+                return  # the next page may still fit in this window
+
+            while ranges and ranges[0][2] <= start:
+                ranges.popleft()
+            yield {
+                "doc_id": doc_id,
+                "chunk_index": index,
+                "text": " ".join(buffer[start - base : end - base]),
+                "start_offset": start,
+                "end_offset": end,
+                "source": source,
+                "page": ranges[0][0] if ranges else None,
+                "token_count": window_tokens,
+            }
+            index += 1
+            if end == total:
+                start = total
+                return
+
+            # keep at most overlap_tokens, and leave room for the next word
+            window_tokens -= costs[start - base]
+            start += 1
+            while start < end and (
+                window_tokens > overlap_tokens or window_tokens + costs[end - base] > max_tokens
+            ):
+                window_tokens -= costs[start - base]
+                start += 1
+
+    for entry in pages:
+        words = split_words(entry.get("text", ""))
+        _update_stats(stats, entry, words)
+        if not words:
+            continue
+
+        word_costs = count_tokens(tokenizer, words)
+        if stats is not None:
+            stats["tokens"] += sum(word_costs)
+        ranges.append((entry.get("page"), total, total + len(words)))
+        buffer.extend(words)
+        costs.extend(word_costs)
+        total += len(words)
+
+        yield from windows(final=False)
+
+        drop = start - base
+        if drop:
+            del buffer[:drop]
+            del costs[:drop]
+            base += drop
+
+    yield from windows(final=True)
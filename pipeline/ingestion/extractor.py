@@ -1,19 +1,159 @@
 """
 Text extraction utilities for ingestion pipeline.
 Supports PDF (with OCR fallback), DOCX, and TXT inputs.
+Large PDFs are split into page ranges extracted by a process pool.
+An OCR planner decides per PDF page whether to OCR, at what DPI, and whether
+to crop to the page's images first.
+OCR goes through a pluggable backend: an in-process Tesseract engine
+(tesserocr) kept alive per process when installed, else pytesseract.
+Results for PDFs, DOCX files and images are cached on disk by file content
+hash plus a fingerprint of the extractor and OCR settings, one page per line
+so cache hits can be replayed page by page.
+iter_pages() streams page entries one at a time for very large documents.
 """
 
 from __future__ import annotations
 
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
 import re
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple, Dict
+from typing import Any, Iterator, List, Optional, Tuple, Dict
 
 import pdfplumber
 import pytesseract
 from docx import Document
+from pdfminer.pdftypes import resolve1
 from PIL import Image
 
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+try:
+    import tesserocr
+except ImportError:  # optional: in-process OCR engine
+    tesserocr = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# Bump when extraction output changes so cached results are not reused
+EXTRACTOR_VERSION = "4"
+EXTRACTION_CACHE = os.getenv("EXTRACTION_CACHE", "1") == "1"
+EXTRACTION_CACHE_DIR = Path(
+    os.getenv("EXTRACTION_CACHE_DIR", str(Path(__file__).parent.parent / "storage" / "extraction_cache"))
+)
+
+# Worker processes for PDF extraction (0 = one per CPU, or serial when
+# already running inside a worker process; 1 = serial)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "0"))
+# PDFs with fewer pages than this are always extracted serially
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+# Pages handed to a worker per task
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+# Address-space ceiling per worker process in MB (0 = unlimited)
+PDF_WORKER_MEMORY_MB = int(os.getenv("PDF_WORKER_MEMORY_MB", "0"))
+
+# OCR engine: "auto" (tesserocr when installed), "tesserocr" or "pytesseract"
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto")
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+
+# OCR planner: render DPIs to choose from, lowest first
+OCR_DPI_TIERS = (150, 200, 300)
+# Text layers denser than this (chars per square inch) are trusted as-is
+OCR_MIN_TEXT_DENSITY = float(os.getenv("OCR_MIN_TEXT_DENSITY", "2.0"))
+# Pages with a thin text layer are OCR'd when images cover this share of them
+OCR_MIN_IMAGE_COVERAGE = float(os.getenv("OCR_MIN_IMAGE_COVERAGE", "0.3"))
+# Below this image coverage only the images' bounding box is OCR'd
+OCR_CROP_MAX_COVERAGE = float(os.getenv("OCR_CROP_MAX_COVERAGE", "0.7"))
+
+
+class PytesseractBackend:
+    """Runs the tesseract CLI once per image (fork + temp file round trip)."""
+
+    name = "pytesseract"
+
+    def __init__(self, lang: str = "eng"):
+        self.lang = lang
+
+    def image_to_text(self, image: Image.Image) -> str:
+        return pytesseract.image_to_string(image, lang=self.lang)
+
+
+class TesserocrBackend:
+    """
+    Keeps one Tesseract engine loaded in this process and feeds it images
+    in memory. The engine is not thread-safe, so calls are serialized.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, lang: str = "eng"):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self.lang = lang
+        self._api = tesserocr.PyTessBaseAPI(lang=lang)
+        self._lock = threading.Lock()
+
+    def image_to_text(self, image: Image.Image) -> str:
+        with self._lock:
+            self._api.SetImage(image)
+            return self._api.GetUTF8Text()
+
+    def close(self) -> None:
+        self._api.End()
+
+
+OCR_BACKENDS = {"pytesseract": PytesseractBackend, "tesserocr": TesserocrBackend}
+
+_ocr_backend = None
+_ocr_backend_pid = None
+
+
+def create_ocr_backend(name: str = "auto", lang: str = "eng"):
+    """
+    Build an OCR backend by name. "auto" and "tesserocr" fall back to
+    pytesseract when the in-process engine can't be created.
+    """
+    if name not in ("auto", *OCR_BACKENDS):
+        raise ValueError(f"Unknown OCR backend: {name}")
+    if name in ("auto", "tesserocr"):
+        try:
+            return TesserocrBackend(lang)
+        except Exception as exc:  # pylint: disable=broad-except
+            if name == "tesserocr":
+                logger.warning("tesserocr unavailable (%s); falling back to pytesseract", exc)
+    return PytesseractBackend(lang)
+
+
+def get_ocr_backend():
+    """
+    Return this process's OCR backend, creating it on first use.
+    Engines are never shared across fork: a child builds its own.
+    """
+    global _ocr_backend, _ocr_backend_pid
+    if _ocr_backend is None or _ocr_backend_pid != os.getpid():
+        _ocr_backend = create_ocr_backend(OCR_BACKEND, OCR_LANG)
+        _ocr_backend_pid = os.getpid()
+    return _ocr_backend
+
+
+def ocr_image(image: Image.Image) -> str:
+    """OCR one image with the process's backend and clean the result."""
+    return clean_text(get_ocr_backend().image_to_text(image))
+
 
 def detect_file_type(file_path: str | Path) -> str:
     """
@@ -44,25 +184,185 @@ def clean_text(text: str) -> str:
     return text.strip()
 
 
-def _extract_pdf(file_path: Path) -> Tuple[str, List[Dict[str, str]]]:
-    full_text_parts: List[str] = []
-    page_texts: List[Dict[str, str]] = []
+def _image_boxes(page) -> List[Tuple[float, float, float, float]]:
+    """Return the page's image bounding boxes clipped to the page."""
+    boxes = []
+    for image in page.images:
+        x0, top = max(image["x0"], 0), max(image["top"], 0)
+        x1, bottom = min(image["x1"], page.width), min(image["bottom"], page.height)
+        if x1 > x0 and bottom > top:
+            boxes.append((x0, top, x1, bottom))
+    return boxes
+
 
+def _has_drawable_content(page) -> bool:
+    """
+    True unless the page draws nothing at all. Form XObjects count even when
+    pdfplumber reports no objects for them: a scan wrapped in a form must
+    still be OCR'd.
+    """
+    if page.images or page.curves or page.lines or getattr(page, "rects", None):
+        return True
+    page_obj = getattr(page, "page_obj", None)
+    resources = resolve1(getattr(page_obj, "resources", None) or {})
+    return bool(resolve1(resources.get("XObject"))) if isinstance(resources, dict) else False
+
+
+def _dpi_tier(page) -> int:
+    """
+    Pick the lowest DPI tier that captures the page images' native resolution.
+    Rendering above the scan's own resolution adds cost but no detail.
+    """
+    native = 0.0
+    for image in page.images:
+        width_in = (image["x1"] - image["x0"]) / 72
+        if image.get("srcsize") and width_in > 0:
+            native = max(native, image["srcsize"][0] / width_in)
+    if not native:
+        return OCR_DPI_TIERS[-1]
+    for tier in OCR_DPI_TIERS:
+        if tier >= native * 0.9:
+            return tier
+    return OCR_DPI_TIERS[-1]
+
+
+def plan_page_ocr(page, text: str) -> Dict[str, Any]:
+    """
+    Decide how to OCR a PDF page given its extracted text layer.
+
+    Scores the page by text density (chars per square inch) and image
+    coverage (share of the page area under images). Returns a dict with
+    "ocr" (bool), "dpi" (render resolution), "crop" (bbox to OCR, or None
+    for the full page) and "reason". A page without a text layer is always
+    OCR'd unless it draws nothing at all, so low-coverage and form-wrapped
+    scans are never skipped.
+    """
+    area_sq_in = (page.width * page.height) / (72 * 72)
+    density = len(text) / area_sq_in if area_sq_in else 0.0
+    boxes = _image_boxes(page)
+    page_area = page.width * page.height
+    # overlapping images are counted twice, hence the cap
+    coverage = min(1.0, sum((x1 - x0) * (b - t) for x0, t, x1, b in boxes) / page_area) if page_area else 0.0
+    plan: Dict[str, Any] = {"ocr": False, "dpi": None, "crop": None, "density": density, "coverage": coverage}
+
+    if text and (density >= OCR_MIN_TEXT_DENSITY or coverage < OCR_MIN_IMAGE_COVERAGE):
+        plan["reason"] = "text_layer"
+        return plan
+
+    if not boxes:
+        # no text layer from here on; only a page that draws nothing is skipped
+        if not _has_drawable_content(page):
+            plan["reason"] = "blank"
+            return plan
+        # no image to read a native resolution from, so render at the top tier
+        plan.update(ocr=True, dpi=OCR_DPI_TIERS[-1], reason="no_text_layer")
+        return plan
+
+    plan.update(ocr=True, dpi=_dpi_tier(page), reason="scanned" if not text else "thin_text_layer")
+    if coverage < OCR_CROP_MAX_COVERAGE:
+        plan["crop"] = (
+            min(b[0] for b in boxes),
+            min(b[1] for b in boxes),
+            max(b[2] for b in boxes),
+            max(b[3] for b in boxes),
+        )
+    return plan
+
+
+def _extract_pdf_page(page) -> Dict[str, Any]:
+    text = page.extract_text() or ""
+    text = clean_text(text)
+
+    plan = plan_page_ocr(page, text)
+    entry: Dict[str, Any] = {"text": text, "ocr_seconds": 0.0, "ocr_dpi": None}
+    if not plan["ocr"]:
+        return entry
+
+    started = time.perf_counter()
+    region = page.crop(plan["crop"]) if plan["crop"] else page
+    pil_image: Image.Image = region.to_image(resolution=plan["dpi"]).original
+    ocr_text = ocr_image(pil_image)
+    entry["ocr_seconds"] = round(time.perf_counter() - started, 3)
+    entry["ocr_dpi"] = plan["dpi"]
+
+    if plan["crop"]:
+        # the text layer covers the rest of the page; add what the images hold
+        entry["text"] = clean_text(f"{text} {ocr_text}")
+    elif len(ocr_text) > len(text):
+        entry["text"] = ocr_text
+    return entry
+
+
+def _iter_pdf_range(file_path: Path, start: int, end: int) -> Iterator[Dict[str, Any]]:
     with pdfplumber.open(file_path) as pdf:
-        for idx, page in enumerate(pdf.pages, start=1):
-            text = page.extract_text() or ""
-            text = clean_text(text)
+        for idx in range(start, end):
+            page = pdf.pages[idx]
+            yield {"page": idx + 1, **_extract_pdf_page(page)}
+            # drop the parsed layout objects so memory stays flat on long ranges
+            page.close()
 
-            if not text:
-                # OCR fallback for scanned or empty pages
-                page_image = page.to_image(resolution=300)
-                pil_image: Image.Image = page_image.original
-                text = clean_text(pytesseract.image_to_string(pil_image))
 
-            page_texts.append({"page": idx, "text": text})
-            full_text_parts.append(text)
+def _extract_pdf_range(file_path: Path, start: int, end: int) -> List[Dict[str, str]]:
+    """
+    Extract pages [start, end) (0-based) of a PDF.
+    Opens the file itself so it can run in a worker process.
+    """
+    return list(_iter_pdf_range(file_path, start, end))
+
+
+def _init_pdf_worker(limit_mb: int) -> None:
+    """
+    Pool initializer: cap the worker's address space at ``limit_mb`` and
+    load its OCR engine once, so every range it handles reuses it.
+    """
+    if limit_mb > 0 and resource is not None:
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    get_ocr_backend()
+
+
+def _pdf_workers(page_count: int, workers: Optional[int]) -> int:
+    if workers is None:
+        workers = PDF_WORKERS
+    if workers <= 0:
+        # an outer pool (ingest jobs, ingest_batch) already fills the CPUs
+        workers = 1 if multiprocessing.parent_process() is not None else os.cpu_count() or 1
+    if page_count < PDF_PARALLEL_MIN_PAGES:
+        return 1
+    return min(workers, -(-page_count // PDF_PAGES_PER_TASK))
+
+
+def _iter_pdf_pages(file_path: Path, workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield page entries in document order. In parallel mode at most two
+    ranges per worker are in flight, so finished pages don't pile up
+    ahead of a slow consumer.
+    """
+    with pdfplumber.open(file_path) as pdf:
+        page_count = len(pdf.pages)
+
+    workers = _pdf_workers(page_count, workers)
+    if workers <= 1:
+        yield from _iter_pdf_range(file_path, 0, page_count)
+        return
+
+    ranges = deque(
+        (start, min(start + PDF_PAGES_PER_TASK, page_count)) for start in range(0, page_count, PDF_PAGES_PER_TASK)
+    )
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_pdf_worker, initargs=(PDF_WORKER_MEMORY_MB,)
+    ) as pool:
+        in_flight = deque()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < workers * 2:
+                in_flight.append(pool.submit(_extract_pdf_range, file_path, *ranges.popleft()))
+            # futures are in range order, so pages come back in document order
+            yield from in_flight.popleft().result()
+
 
-    full_text = clean_text(" ".join(full_text_parts))
+def _extract_pdf(file_path: Path, workers: Optional[int] = None) -> Tuple[str, List[Dict[str, str]]]:
+    page_texts = list(_iter_pdf_pages(file_path, workers))
+    full_text = clean_text(" ".join(page["text"] for page in page_texts))
     return full_text, page_texts
 
 
@@ -84,20 +384,208 @@ def _extract_image(file_path: Path) -> Tuple[str, List[Dict[str, str]]]:
     OCR single image file; treat as one-page document.
     """
     with Image.open(file_path) as img:
-        text = clean_text(pytesseract.image_to_string(img))
+        text = ocr_image(img)
     return text, [{"page": 1, "text": text}]
 
 
-def extract_text(file_path: str | Path) -> Tuple[str, List[Dict[str, str]]]:
+def file_sha256(file_path: str | Path) -> str:
+    """SHA-256 hex digest of a file's bytes, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=2)
+def _tesseract_version(backend: str) -> str:
+    try:
+        if backend == "tesserocr":
+            return str(tesserocr.tesseract_version()).splitlines()[0]
+        return str(pytesseract.get_tesseract_version())
+    except Exception:  # pylint: disable=broad-except
+        return "unknown"
+
+
+def extraction_fingerprint() -> str:
+    """
+    Short hash of everything besides the file bytes that shapes the output:
+    extractor version, OCR engine and language, and OCR planner settings.
+    The engine is the one this process's backend resolved to, so a failed
+    tesserocr load that fell back to pytesseract is keyed as pytesseract.
+    """
+    backend = get_ocr_backend().name
+    settings = {
+        "extractor": EXTRACTOR_VERSION,
+        "backend": backend,
+        "tesseract": _tesseract_version(backend),
+        "lang": OCR_LANG,
+        "dpi_tiers": OCR_DPI_TIERS,
+        "min_text_density": OCR_MIN_TEXT_DENSITY,
+        "min_image_coverage": OCR_MIN_IMAGE_COVERAGE,
+        "crop_max_coverage": OCR_CROP_MAX_COVERAGE,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def _cache_file(path: Path) -> Path:
+    """Page file of a cache entry: one JSON page entry per line."""
+    file_hash = file_sha256(path)
+    return EXTRACTION_CACHE_DIR / file_hash[:2] / f"{file_hash}-{extraction_fingerprint()}.pages.jsonl"
+
+
+def _text_file(cache_file: Path) -> Path:
+    """full_text of a cache entry, stored beside its page file."""
+    return cache_file.with_name(cache_file.name[: -len(".pages.jsonl")] + ".txt")
+
+
+def _iter_cached_pages(cache_file: Path) -> Iterator[Dict[str, Any]]:
+    """Replay a cache entry's pages one line at a time.
+
+    No OCR runs on a hit, so ocr_seconds is reported as 0: warm-cache runs
+    must not count the OCR time of the run that filled the cache.
+    """
+    with cache_file.open("r", encoding="utf-8") as f:
+        for line in f:
+            page = json.loads(line)
+            if "ocr_seconds" in page:
+                page["ocr_seconds"] = 0.0
+            yield page
+
+
+def _read_cache(cache_file: Path) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+    try:
+        full_text = _text_file(cache_file).read_text(encoding="utf-8")
+        return full_text, list(_iter_cached_pages(cache_file))
+    except (OSError, ValueError):
+        return None
+
+
+def _temp_files(cache_file: Path) -> Tuple[Path, Path]:
+    """Private page and text temp files for one cache write.
+
+    Unique per write, not per process: threads of one process (thread-mode
+    jobs, duplicate uploads) may extract the same file at once.
+    """
+    tag = uuid.uuid4().hex
+    return cache_file.with_name(f"{cache_file.name}.{tag}.tmp"), cache_file.with_name(f"{cache_file.name}.{tag}.text.tmp")
+
+
+def _publish_cache(cache_file: Path, tmp: Path, spool: Path) -> None:
+    # The page file goes last: an entry counts as cached once it exists
+    os.replace(spool, _text_file(cache_file))
+    os.replace(tmp, cache_file)
+
+
+def _write_cache(cache_file: Path, full_text: str, page_texts: List[Dict[str, Any]]) -> None:
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp, spool = _temp_files(cache_file)
+    try:
+        spool.write_text(full_text, encoding="utf-8")
+        with tmp.open("w", encoding="utf-8") as f:
+            for page in page_texts:
+                f.write(json.dumps(page, ensure_ascii=False) + "\n")
+        _publish_cache(cache_file, tmp, spool)
+    finally:
+        for leftover in (tmp, spool):
+            if leftover.exists():
+                leftover.unlink()
+
+
+def _write_cache_streaming(cache_file: Path, pages: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Pass ``pages`` through while writing them to ``cache_file`` in the same
+    format as _write_cache, so neither pages nor full_text are held in
+    memory. Nothing is published unless the stream is consumed to the end.
+    """
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp, spool = _temp_files(cache_file)
+    try:
+        with tmp.open("w", encoding="utf-8") as f, spool.open("w", encoding="utf-8") as text:
+            separator = ""
+            for page in pages:
+                f.write(json.dumps(page, ensure_ascii=False) + "\n")
+                cleaned = clean_text(page.get("text", ""))
+                if cleaned:
+                    text.write(separator + cleaned)
+                    separator = " "
+                yield page
+        _publish_cache(cache_file, tmp, spool)
+    finally:
+        for leftover in (tmp, spool):
+            if leftover.exists():
+                leftover.unlink()
+
+
+def extract_text(
+    file_path: str | Path, workers: Optional[int] = None, use_cache: Optional[bool] = None
+) -> Tuple[str, List[Dict[str, str]]]:
     """
     Extract text from PDF/DOCX/TXT.
     Returns (full_text_string, page_texts_list).
+    ``workers`` overrides PDF_WORKERS for PDF extraction.
+    PDF/DOCX/image results are served from the extraction cache when the
+    same bytes were extracted with the same settings before (``use_cache``
+    defaults to EXTRACTION_CACHE); TXT files are cheaper to re-read.
     """
     path = Path(file_path)
     ftype = detect_file_type(path)
 
+    if use_cache is None:
+        use_cache = EXTRACTION_CACHE
+    if use_cache and ftype != "txt":
+        cache_file = _cache_file(path)
+        cached = _read_cache(cache_file)
+        if cached is not None:
+            logger.info("Extraction cache hit for %s", path.name)
+            return cached
+        full_text, page_texts = _extract_uncached(path, ftype, workers)
+        _write_cache(cache_file, full_text, page_texts)
+        return full_text, page_texts
+
+    return _extract_uncached(path, ftype, workers)
+
+
+def page_count(file_path: str | Path) -> int:
+    """Number of pages iter_pages() yields for a file (1 for non-PDF files)."""
+    path = Path(file_path)
+    if detect_file_type(path) != "pdf":
+        return 1
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def iter_pages(
+    file_path: str | Path, workers: Optional[int] = None, use_cache: Optional[bool] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream page entries ({"page", "text", ...}) without building full_text.
+    PDFs are yielded page by page as they are extracted; other types are a
+    single page. Cache hits are replayed from the extraction cache, and
+    misses are written to it page by page as the stream is consumed.
+    """
+    path = Path(file_path)
+    if detect_file_type(path) != "pdf":
+        yield from extract_text(path, workers, use_cache)[1]
+        return
+
+    if use_cache is None:
+        use_cache = EXTRACTION_CACHE
+    if not use_cache:
+        yield from _iter_pdf_pages(path, workers)
+        return
+
+    cache_file = _cache_file(path)
+    if cache_file.exists():
+        logger.info("Extraction cache hit for %s", path.name)
+        yield from _iter_cached_pages(cache_file)
+        return
+    yield from _write_cache_streaming(cache_file, _iter_pdf_pages(path, workers))
+
+
+def _extract_uncached(path: Path, ftype: str, workers: Optional[int]) -> Tuple[str, List[Dict[str, str]]]:
     if ftype == "pdf":
-        return _extract_pdf(path)
+        return _extract_pdf(path, workers=workers)
     if ftype == "docx":
         return _extract_docx(path)
     if ftype == "txt":
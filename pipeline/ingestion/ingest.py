@@ -1,7 +1,9 @@
 """
 CLI entrypoint for ingestion pipeline.
 Usage:
-    python ingest.py <file_path>
+    python ingest.py <file_path> [--content-id] [--chunk-mode words|tokens]
+
+For whole directories, see ingest_batch.py.
 """
 
 from __future__ import annotations
@@ -9,16 +11,75 @@ from __future__ import annotations
 import argparse
 import os
 import sys
+import time
 from pathlib import Path
+from typing import Any, Dict, Optional
+
+from chunker import CHUNK_MODE, chunking_options, iter_chunks
+from extractor import iter_pages
+from utils import chunk_writer, count_saved_chunks, file_doc_id, generate_doc_id
+
 
-from chunker import chunk_text, build_page_ranges
-from extractor import extract_text
-from utils import generate_doc_id, save_chunk
+def ingest_file(
+    file_path: str | Path,
+    content_id: bool = False,
+    chunk_mode: Optional[str] = None,
+    workers: Optional[int] = None,
+    doc_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Extract, chunk and store one file. Returns its stats: doc_id, file,
+    total_chars, pages, ocr_seconds, chunks, seconds (plus tokens in token
+    mode), and duplicate=True when --content-id finds it already ingested.
+    ``workers`` overrides PDF_WORKERS for this file. ``doc_id`` replaces the
+    random doc_id when not using content ids, so a retry overwrites the
+    chunks of an earlier attempt instead of adding a second document.
+    """
+    started = time.perf_counter()
+    file_path = Path(file_path)
+    doc_id = file_doc_id(file_path) if content_id else doc_id or generate_doc_id()
+    existing = count_saved_chunks(doc_id) if content_id else 0
+    if existing:
+        return {"doc_id": doc_id, "file": file_path.name, "chunks": existing, "duplicate": True}
+
+    # stream pages into the chunker and write each chunk as soon as its
+    # window fills, so memory stays bounded on very large documents
+    stats: Dict[str, Any] = {}
+    options = chunking_options(chunk_mode)
+    pages = iter_pages(file_path, workers=workers)
+    with chunk_writer(doc_id) as writer:
+        for chunk in iter_chunks(pages, doc_id, source=file_path.name, stats=stats, **options):
+            writer.add(chunk)
+
+    result = {
+        "doc_id": doc_id,
+        "file": file_path.name,
+        "total_chars": stats["chars"],
+        "pages": stats["pages"],
+        "ocr_seconds": round(stats["ocr_seconds"], 3),
+        "chunks": writer.count,
+        "seconds": round(time.perf_counter() - started, 3),
+        "duplicate": False,
+    }
+    if "tokens" in stats:
+        result["tokens"] = stats["tokens"]
+    return result
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Ingest a document and chunk it.")
     parser.add_argument("file_path", help="Path to the input document (pdf/docx/txt).")
+    parser.add_argument(
+        "--content-id",
+        action="store_true",
+        help="Derive doc_id from the file's SHA-256 and skip files that were already ingested.",
+    )
+    parser.add_argument(
+        "--chunk-mode",
+        choices=["words", "tokens"],
+        default=CHUNK_MODE,
+        help="Size chunks in whitespace words or in the embedding model's tokens (default: $CHUNK_MODE or words).",
+    )
     args = parser.parse_args()
 
     file_path = Path(args.file_path)
@@ -27,28 +88,28 @@ def main() -> None:
         sys.exit(1)
 
     try:
-        doc_id = generate_doc_id()
-        full_text, page_texts = extract_text(file_path)
-        page_ranges = build_page_ranges(page_texts)
-        chunks = chunk_text(full_text, doc_id, source=file_path.name, page_ranges=page_ranges)
+        result = ingest_file(file_path, content_id=args.content_id, chunk_mode=args.chunk_mode)
     except Exception as exc:  # pylint: disable=broad-except
         print(f"[error] Extraction failed: {exc}")
         sys.exit(1)
 
-    for idx, chunk in enumerate(chunks):
-        save_chunk(doc_id, idx, chunk)
+    if result["duplicate"]:
+        print(f"Already ingested: doc_id {result['doc_id']} ({result['chunks']} chunks)")
+        return
 
-    output_folder = Path("storage") / "chunks" / doc_id
+    output_folder = Path("storage") / "chunks" / result["doc_id"]
     print("Ingestion summary")
     print("-----------------")
-    print(f"doc_id: {doc_id}")
-    print(f"file: {file_path.name}")
-    print(f"total_chars: {len(full_text)}")
-    print(f"pages: {len(page_texts)}")
-    print(f"chunks: {len(chunks)}")
+    print(f"doc_id: {result['doc_id']}")
+    print(f"file: {result['file']}")
+    print(f"total_chars: {result['total_chars']}")
+    print(f"pages: {result['pages']}")
+    print(f"ocr_seconds: {result['ocr_seconds']:.2f}")
+    print(f"chunks: {result['chunks']}")
+    if "tokens" in result:
+        print(f"tokens: {result['tokens']}")
     print(f"output: {output_folder.resolve()}")
 
 
 if __name__ == "__main__":
     main()
-
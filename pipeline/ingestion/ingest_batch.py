@@ -0,0 +1,297 @@
+"""
+Batch ingestion of whole directories across a process pool.
+Usage:
+    python ingest_batch.py <dir-or-file-or-glob> [...] [--workers N] [--content-id]
+                           [--chunk-mode words|tokens] [--manifest PATH] [--summary PATH]
+
+Directories are searched recursively for supported files and globs may use
+``**``. Every finished file is appended to a JSONL manifest (with its
+per-file stats) as soon as it completes; on the next run files whose path,
+size and mtime match a successful manifest entry are skipped, so an
+interrupted load resumes where it stopped. Failed files are retried.
+Without --content-id a "started" entry records each file's random doc_id
+before it is chunked, and retries reuse it, so a file interrupted or failed
+part way is re-ingested under the same doc_id rather than duplicated.
+
+Progress lines report pages/s, chunks/s and the share of worker time spent
+in OCR. A JSON summary of the run is written at the end, also when the
+run stops early; a worker crash only fails the files it took down with it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from extractor import detect_file_type
+from ingest import ingest_file
+from utils import STORAGE_DIR, generate_doc_id
+
+DEFAULT_MANIFEST = STORAGE_DIR / "ingest_manifest.jsonl"
+
+
+def _supported(path: Path) -> bool:
+    try:
+        detect_file_type(path)
+    except ValueError:
+        return False
+    return True
+
+
+def expand_inputs(inputs: List[str]) -> List[Path]:
+    """Resolve directories, globs and files into a sorted, de-duplicated file list."""
+    files = set()
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            candidates = path.rglob("*")
+        elif path.is_file():
+            candidates = [path]
+        else:
+            candidates = (Path(p) for p in glob.glob(item, recursive=True))
+        files.update(p.resolve() for p in candidates if p.is_file() and _supported(p))
+    return sorted(files)
+
+
+def _file_key(path: Path) -> Dict[str, Any]:
+    stat = path.stat()
+    return {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_manifest(manifest: Path) -> Dict[str, Dict[str, Any]]:
+    """Return the latest manifest entry per path; a torn last line is ignored."""
+    entries: Dict[str, Dict[str, Any]] = {}
+    if not manifest.exists():
+        return entries
+    with manifest.open("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            entries[entry["path"]] = entry
+    return entries
+
+
+def is_done(path: Path, entry: Optional[Dict[str, Any]]) -> bool:
+    """True if ``entry`` records a successful run on the file as it is now."""
+    if not entry or entry.get("status") != "ok":
+        return False
+    return all(entry.get(key) == value for key, value in _file_key(path).items())
+
+
+def _ingest_one(path: str, content_id: bool, chunk_mode: Optional[str], doc_id: Optional[str]) -> Dict[str, Any]:
+    # files are the unit of parallelism, so each one is extracted serially
+    try:
+        result = ingest_file(path, content_id=content_id, chunk_mode=chunk_mode, workers=1, doc_id=doc_id)
+        return {"status": "ok", **result}
+    except Exception as exc:  # pylint: disable=broad-except
+        return {"status": "failed", "doc_id": doc_id, "error": f"{type(exc).__name__}: {exc}"}
+
+
+def _failed(path: Path, doc_id: Optional[str], exc: BaseException) -> Dict[str, Any]:
+    return {**_file_key(path), "status": "failed", "doc_id": doc_id, "error": f"{type(exc).__name__}: {exc}"}
+
+
+def _append(log, entry: Dict[str, Any]) -> None:
+    log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    log.flush()
+    os.fsync(log.fileno())
+
+
+class Throughput:
+    """Running totals for the progress line and the final summary."""
+
+    def __init__(self, total_files: int):
+        self.total_files = total_files
+        self.started = time.perf_counter()
+        self.counts = {"ok": 0, "failed": 0, "duplicate": 0}
+        self.pages = self.chunks = self.chars = 0
+        self.ocr_seconds = self.worker_seconds = 0.0
+
+    def add(self, result: Dict[str, Any]) -> None:
+        if result["status"] == "failed":
+            self.counts["failed"] += 1
+            return
+        if result.get("duplicate"):
+            self.counts["duplicate"] += 1
+            return
+        self.counts["ok"] += 1
+        self.pages += result.get("pages", 0)
+        self.chunks += result.get("chunks", 0)
+        self.chars += result.get("total_chars", 0)
+        self.ocr_seconds += result.get("ocr_seconds", 0.0)
+        self.worker_seconds += result.get("seconds", 0.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self.started
+        return {
+            "files": self.total_files,
+            "processed": sum(self.counts.values()),
+            "succeeded": self.counts["ok"],
+            "duplicates": self.counts["duplicate"],
+            "failed": self.counts["failed"],
+            "pages": self.pages,
+            "chunks": self.chunks,
+            "total_chars": self.chars,
+            "ocr_seconds": round(self.ocr_seconds, 3),
+            "wall_seconds": round(elapsed, 3),
+            "pages_per_second": round(self.pages / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_second": round(self.chunks / elapsed, 2) if elapsed else 0.0,
+            "ocr_share": round(self.ocr_seconds / self.worker_seconds, 3) if self.worker_seconds else 0.0,
+        }
+
+    def progress_line(self) -> str:
+        s = self.snapshot()
+        return (
+            f"[{s['processed']}/{s['files']}] {s['pages_per_second']:.1f} pages/s  "
+            f"{s['chunks_per_second']:.1f} chunks/s  OCR {s['ocr_share']:.0%}  failed {s['failed']}"
+        )
+
+
+def run_batch(
+    files: List[Path],
+    manifest: Path,
+    workers: int,
+    content_id: bool = False,
+    chunk_mode: Optional[str] = None,
+    progress_interval: float = 5.0,
+    entries: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Ingest ``files`` over ``workers`` processes, appending each result to
+    ``manifest`` as it completes, and yield the results. None is yielded
+    when nothing finished within ``progress_interval`` so callers can still
+    report progress. At most two files per worker are queued, so huge
+    batches don't build a huge backlog. ``entries`` is the manifest as read
+    by load_manifest (read here if not given); without ``content_id`` each
+    file keeps the doc_id of its last entry.
+
+    A worker that dies (OOM kill, segfault in a native parser) breaks the
+    whole pool: every file in flight is recorded as failed, so a resumed run
+    retries it, and the remaining files go to a new pool.
+    """
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    if entries is None:
+        entries = load_manifest(manifest)
+    pending = iter(files)
+    in_flight: Dict[Any, Tuple[Path, Optional[str]]] = {}
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        with manifest.open("a", encoding="utf-8") as log:
+            while True:
+                broken: Optional[BaseException] = None
+                while len(in_flight) < workers * 2 and broken is None:
+                    path = next(pending, None)
+                    if path is None:
+                        break
+                    doc_id = None
+                    if not content_id:
+                        doc_id = (entries.get(str(path)) or {}).get("doc_id") or generate_doc_id()
+                        _append(log, {**_file_key(path), "status": "started", "doc_id": doc_id})
+                    try:
+                        in_flight[pool.submit(_ingest_one, str(path), content_id, chunk_mode, doc_id)] = (path, doc_id)
+                    except BrokenProcessPool as exc:
+                        result = _failed(path, doc_id, exc)
+                        _append(log, result)
+                        yield result
+                        broken = exc
+                if not in_flight and broken is None:
+                    return
+                done = set()
+                if broken is None:
+                    done, _ = wait(in_flight, timeout=progress_interval or None, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, doc_id = in_flight.pop(future)
+                    try:
+                        outcome = future.result()
+                    except BrokenProcessPool as exc:
+                        broken = exc
+                        result = _failed(path, doc_id, exc)
+                    else:
+                        result = {**_file_key(path), **outcome}
+                    _append(log, result)
+                    yield result
+                if broken is not None:
+                    # the rest of the in-flight files died with the pool
+                    for path, doc_id in in_flight.values():
+                        result = _failed(path, doc_id, broken)
+                        _append(log, result)
+                        yield result
+                    in_flight.clear()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = ProcessPoolExecutor(max_workers=workers)
+                elif not done:
+                    yield None
+    finally:
+        pool.shutdown(wait=not in_flight, cancel_futures=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingest many documents in parallel, resumably.")
+    parser.add_argument("inputs", nargs="+", help="Files, directories (searched recursively) or glob patterns.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Files processed in parallel.")
+    parser.add_argument("--content-id", action="store_true", help="Content-addressed doc_ids; skip re-ingesting identical files.")
+    parser.add_argument("--chunk-mode", choices=["words", "tokens"], default=None)
+    parser.add_argument("--manifest", default=str(DEFAULT_MANIFEST), help="JSONL log of finished files.")
+    parser.add_argument("--summary", default=None, help="Where to write the JSON summary (default: next to the manifest).")
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress lines.")
+    args = parser.parse_args()
+
+    manifest = Path(args.manifest)
+    summary_path = Path(args.summary) if args.summary else manifest.with_name("ingest_summary.json")
+
+    files = expand_inputs(args.inputs)
+    if not files:
+        print("[error] No supported files found")
+        sys.exit(1)
+
+    done = load_manifest(manifest)
+    todo = [path for path in files if not is_done(path, done.get(str(path)))]
+    print(f"{len(files)} files, {len(files) - len(todo)} already ingested, {len(todo)} to go")
+
+    throughput = Throughput(len(todo))
+    failures = []
+    last_report = time.perf_counter()
+    batch = run_batch(todo, manifest, max(1, args.workers), args.content_id, args.chunk_mode, args.progress_interval, done)
+    completed = False
+    try:
+        for result in batch:
+            if result:
+                throughput.add(result)
+                if result["status"] == "failed":
+                    failures.append({"path": result["path"], "error": result["error"]})
+                    print(f"[error] {result['path']}: {result['error']}")
+            if time.perf_counter() - last_report >= args.progress_interval:
+                print(throughput.progress_line(), flush=True)
+                last_report = time.perf_counter()
+        completed = True
+    finally:
+        # written even when the run is interrupted, so partial progress is on record
+        summary = {
+            **throughput.snapshot(),
+            "skipped": len(files) - len(todo),
+            "workers": args.workers,
+            "manifest": str(manifest.resolve()),
+            "completed": completed,
+            "failures": failures,
+        }
+        summary_path.parent.mkdir(parents=True, exist_ok=True)
+        summary_path.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+    print(throughput.progress_line())
+    print(f"summary: {summary_path.resolve()}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Pack existing chunk_<i>.json files into one chunks.seg segment per document.
+Usage:
+    python migrate_chunks.py [--chunks-dir storage/chunks] [--compression none|zstd] [--keep-json] [--dry-run]
+
+Each segment is read back and compared with the JSON files before those are
+deleted, so an interrupted run can simply be restarted. Documents that
+already have a segment are skipped.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from utils import CHUNK_COMPRESSION, SEGMENT_FILE, get_chunks_dir, load_saved_chunks, read_segment, write_segment
+
+
+def migrate_doc(doc_dir: Path, compression: str, keep_json: bool, dry_run: bool) -> dict:
+    json_files = list(doc_dir.glob("chunk_*.json"))
+    json_bytes = sum(path.stat().st_size for path in json_files)
+    chunks = load_saved_chunks(doc_dir.name, base_dir=doc_dir.parent)
+    result = {"chunks": len(chunks), "json_files": len(json_files), "json_bytes": json_bytes, "segment_bytes": 0}
+    if dry_run:
+        return result
+
+    segment = write_segment(doc_dir, chunks, compression)
+    if read_segment(segment) != chunks:
+        segment.unlink()
+        raise RuntimeError(f"Segment for {doc_dir.name} does not match its JSON chunks")
+    result["segment_bytes"] = segment.stat().st_size
+
+    if not keep_json:
+        for path in json_files:
+            path.unlink()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Migrate per-chunk JSON files to packed segments.")
+    parser.add_argument("--chunks-dir", default=None, help="Chunks root (default: storage/chunks).")
+    parser.add_argument("--compression", choices=["none", "zstd"], default=CHUNK_COMPRESSION)
+    parser.add_argument("--keep-json", action="store_true", help="Leave the chunk_<i>.json files in place.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be migrated.")
+    args = parser.parse_args()
+
+    chunks_dir = Path(args.chunks_dir) if args.chunks_dir else get_chunks_dir()
+    if not chunks_dir.is_dir():
+        print(f"[error] Chunks directory not found: {chunks_dir}")
+        sys.exit(1)
+
+    totals = {"docs": 0, "skipped": 0, "failed": 0, "chunks": 0, "json_files": 0, "json_bytes": 0, "segment_bytes": 0}
+    for doc_dir in sorted(p for p in chunks_dir.iterdir() if p.is_dir()):
+        if (doc_dir / SEGMENT_FILE).exists() or not any(doc_dir.glob("chunk_*.json")):
+            totals["skipped"] += 1
+            continue
+        try:
+            result = migrate_doc(doc_dir, args.compression, args.keep_json, args.dry_run)
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"[error] {doc_dir.name}: {exc}")
+            totals["failed"] += 1
+            continue
+        totals["docs"] += 1
+        for key, value in result.items():
+            totals[key] += value
+
+    print(json.dumps(totals, indent=2))
+    if totals["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,5 @@
+import pytest
+
 from ingestion import chunker
 
 
@@ -24,3 +26,106 @@ def test_chunk_text_with_overlap():
     assert chunks[1]["start_offset"] == 3  # chunk_size - overlap
     assert chunks[0]["page"] is None
 
+
+
+def _page_cases():
+    words = [f"w{i}" for i in range(53)]
+    yield [{"page": 1, "text": " ".join(words)}]
+    yield [{"page": n + 1, "text": " ".join(words[i:i + 7])} for n, i in enumerate(range(0, 53, 7))]
+    yield [
+        {"page": 1, "text": ""},
+        {"page": 2, "text": " ".join(words[:3])},
+        {"page": 3, "text": "   "},
+        {"page": 4, "text": " ".join(words[3:40])},
+        {"page": 5, "text": " ".join(words[40:])},
+        {"page": 6, "text": ""},
+    ]
+
+
+def test_iter_chunks_matches_chunk_text():
+    for pages in _page_cases():
+        full_text = " ".join(p["text"] for p in pages)
+        for size, overlap in [(5, 2), (10, 0), (4, 3), (100, 10), (3, 5)]:
+            expected = chunker.chunk_text(
+                full_text, "doc1", chunk_size=size, overlap=overlap, source="a.pdf",
+                page_ranges=chunker.build_page_ranges(pages),
+            )
+            streamed = list(chunker.iter_chunks(iter(pages), "doc1", chunk_size=size, overlap=overlap, source="a.pdf"))
+            assert streamed == expected
+
+
+def test_iter_chunks_emits_before_stream_ends():
+    def pages():
+        yield {"page": 1, "text": "a b c d e f"}
+        raise AssertionError("read past the first full window")
+
+    first = next(chunker.iter_chunks(pages(), "doc1", chunk_size=5, overlap=1))
+    assert first["text"] == "a b c d e"
+    assert first["page"] == 1
+
+
+def test_iter_chunks_stats():
+    stats = {}
+    pages = [{"page": 1, "text": "one  two", "ocr_seconds": 0.5}, {"page": 2, "text": ""}, {"page": 3, "text": "three"}]
+    list(chunker.iter_chunks(pages, "doc1", stats=stats))
+    assert stats == {"pages": 3, "words": 3, "chars": len("one two three"), "ocr_seconds": 0.5}
+
+
+class _PieceTokenizer:
+    """Stand-in for a fast tokenizer: one token per 3 characters of a word."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, words, add_special_tokens=True):
+        self.calls += 1
+        return {"input_ids": [[0] * -(-len(word) // 3) for word in words]}
+
+
+def _tokens(words):
+    return sum(-(-len(word) // 3) for word in words)
+
+
+def test_token_chunks_fit_limit_and_overlap():
+    words = [("x" * (i % 9 + 1)) for i in range(200)]
+    pages = [{"page": n + 1, "text": " ".join(words[i:i + 30])} for n, i in enumerate(range(0, 200, 30))]
+    tokenizer = _PieceTokenizer()
+    chunks = list(chunker.iter_chunks(pages, "doc1", chunk_size=20, overlap=5, tokenizer=tokenizer))
+
+    assert tokenizer.calls == len(pages)  # one batched call per page
+    assert chunks[0]["start_offset"] == 0
+    assert chunks[-1]["end_offset"] == 200
+    for prev, chunk in zip(chunks, chunks[1:]):
+        assert prev["start_offset"] < chunk["start_offset"] <= prev["end_offset"] < chunk["end_offset"]
+        assert _tokens(words[chunk["start_offset"]:prev["end_offset"]]) <= 5
+    for chunk in chunks:
+        window = words[chunk["start_offset"]:chunk["end_offset"]]
+        assert chunk["text"] == " ".join(window)
+        assert chunk["token_count"] == _tokens(window) <= 20
+        assert chunk["page"] == chunk["start_offset"] // 30 + 1
+        if chunk["end_offset"] < 200:  # windows are filled as far as the next word allows
+            assert _tokens(words[chunk["start_offset"]:chunk["end_offset"] + 1]) > 20
+
+
+def test_token_chunks_match_chunk_text():
+    pages = [{"page": 1, "text": "alpha beta"}, {"page": 2, "text": ""}, {"page": 3, "text": "gamma delta epsilon " * 9}]
+    full_text = " ".join(p["text"] for p in pages)
+    expected = chunker.chunk_text(
+        full_text, "doc1", chunk_size=12, overlap=4, page_ranges=chunker.build_page_ranges(pages),
+        tokenizer=_PieceTokenizer(),
+    )
+    stats = {}
+    streamed = list(chunker.iter_chunks(pages, "doc1", chunk_size=12, overlap=4, stats=stats, tokenizer=_PieceTokenizer()))
+    assert streamed == expected
+    assert stats["tokens"] == _tokens(full_text.split())
+
+
+def test_token_chunks_give_oversized_words_their_own_window():
+    chunks = chunker.chunk_text("a " + "y" * 40 + " b", "doc1", chunk_size=4, overlap=1, tokenizer=_PieceTokenizer())
+    assert [c["text"] for c in chunks] == ["a", "y" * 40, "b"]
+
+
+def test_chunking_options_words_mode_keeps_defaults():
+    assert chunker.chunking_options("words") == {}
+    with pytest.raises(ValueError):
+        chunker.chunking_options("sentences")
@@ -1,8 +1,16 @@
+import tracemalloc
 import pytest
 from pathlib import Path
 from ingestion import extractor
 
 
+@pytest.fixture(autouse=True)
+def extraction_cache_dir(tmp_path: Path, monkeypatch):
+  cache_dir = tmp_path / "extraction_cache"
+  monkeypatch.setattr(extractor, "EXTRACTION_CACHE_DIR", cache_dir)
+  return cache_dir
+
+
 def test_detect_file_type_supported():
   assert extractor.detect_file_type("file.pdf") == "pdf"
   assert extractor.detect_file_type("file.docx") == "docx"
@@ -31,3 +39,233 @@ def test_extract_text_invalid(tmp_path: Path):
   with pytest.raises(ValueError):
     extractor.extract_text(bad_file)
 
+
+
+def test_extract_pdf_parallel_matches_serial(make_pdf, monkeypatch):
+  monkeypatch.setattr(extractor, "PDF_PARALLEL_MIN_PAGES", 4)
+  monkeypatch.setattr(extractor, "PDF_PAGES_PER_TASK", 3)
+  pdf_path = make_pdf([f"Page number {i} text" for i in range(1, 11)])
+
+  serial = extractor.extract_text(pdf_path, workers=1, use_cache=False)
+  parallel = extractor.extract_text(pdf_path, workers=3, use_cache=False)
+
+  assert parallel == serial
+  assert [page["page"] for page in parallel[1]] == list(range(1, 11))
+  assert parallel[1][9]["text"] == "Page number 10 text"
+
+
+def test_iter_pages_streams_pdf_pages_in_order(make_pdf, monkeypatch):
+  monkeypatch.setattr(extractor, "PDF_PARALLEL_MIN_PAGES", 4)
+  monkeypatch.setattr(extractor, "PDF_PAGES_PER_TASK", 2)
+  pdf_path = make_pdf([f"Page number {i} text" for i in range(1, 11)])
+  _, expected = extractor.extract_text(pdf_path, workers=1, use_cache=False)
+
+  serial = extractor.iter_pages(pdf_path, workers=1, use_cache=False)
+  assert next(serial) == expected[0]
+  assert [expected[0], *serial] == expected
+  assert list(extractor.iter_pages(pdf_path, workers=2, use_cache=False)) == expected
+
+
+def test_iter_pages_writes_extraction_cache(make_pdf, extraction_cache_dir):
+  pdf_path = make_pdf(["First  page", "", "Second page \"quoted\""])
+  streamed = extractor.iter_pages(pdf_path, workers=1)
+  next(streamed)
+  streamed.close()
+  assert not list(extraction_cache_dir.rglob("*.jsonl"))  # abandoned streams are not cached
+
+  pages = list(extractor.iter_pages(pdf_path, workers=1))
+  cached = extractor._read_cache(extractor._cache_file(pdf_path))
+  assert cached == extractor.extract_text(pdf_path, workers=1, use_cache=False)
+  assert cached[1] == pages
+  assert not [p for p in extraction_cache_dir.rglob("*") if p.name.endswith(".tmp")]
+
+
+def test_concurrent_cache_writes_of_one_file_do_not_collide(make_pdf, extraction_cache_dir):
+  pdf_path = make_pdf(["Shared page"])
+  cache_file = extractor._cache_file(pdf_path)
+  pages = [{"page": 1, "text": "Shared page", "ocr_seconds": 0.0, "ocr_dpi": None}]
+  first = extractor._write_cache_streaming(cache_file, iter(pages))
+  second = extractor._write_cache_streaming(cache_file, iter(pages))
+  assert next(first) == next(second) == pages[0]
+  assert list(first) == list(second) == []
+  assert extractor._read_cache(cache_file) == ("Shared page", pages)
+
+
+def test_cache_hits_report_no_ocr_time(make_pdf, extraction_cache_dir):
+  pdf_path = make_pdf(["Scanned page"])
+  cache_file = extractor._cache_file(pdf_path)
+  extractor._write_cache(cache_file, "Scanned page", [{"page": 1, "text": "Scanned page", "ocr_seconds": 2.5, "ocr_dpi": 300}])
+
+  assert [p["ocr_seconds"] for p in extractor.iter_pages(pdf_path, workers=1)] == [0.0]
+  assert extractor.extract_text(pdf_path, workers=1)[1][0]["ocr_seconds"] == 0.0
+
+
+def test_iter_pages_cache_hit_streams_pages(make_pdf, extraction_cache_dir, monkeypatch):
+  pdf_path = make_pdf(["Cached page"])
+  cache_file = extractor._cache_file(pdf_path)
+  pages = [{"page": i + 1, "text": f"page {i} " + "x" * 200_000} for i in range(50)]
+  extractor._write_cache(cache_file, "unused", pages)
+
+  def fail(*_args, **_kwargs):
+    raise AssertionError("a cache hit must not load the whole entry")
+
+  monkeypatch.setattr(extractor, "_read_cache", fail)
+  monkeypatch.setattr(extractor, "_iter_pdf_pages", fail)
+  tracemalloc.start()
+  try:
+    for expected, page in zip(pages, extractor.iter_pages(pdf_path, workers=1)):
+      assert page == expected
+    peak = tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+  assert peak < 3_000_000  # the entry is ~10 MB; only a few pages are ever held
+
+
+def test_pdf_workers_falls_back_to_serial_for_short_documents(monkeypatch):
+  monkeypatch.setattr(extractor, "PDF_PARALLEL_MIN_PAGES", 16)
+  monkeypatch.setattr(extractor, "PDF_PAGES_PER_TASK", 8)
+  assert extractor._pdf_workers(10, workers=4) == 1
+  assert extractor._pdf_workers(20, workers=4) == 3
+  assert extractor._pdf_workers(800, workers=4) == 4
+
+
+def test_pdf_workers_default_is_serial_inside_a_worker_process(monkeypatch):
+  monkeypatch.setattr(extractor, "PDF_WORKERS", 0)
+  monkeypatch.setattr(extractor, "PDF_PAGES_PER_TASK", 1)
+  monkeypatch.setattr(extractor.os, "cpu_count", lambda: 8)
+  assert extractor._pdf_workers(800, workers=None) == 8
+  monkeypatch.setattr(extractor.multiprocessing, "parent_process", lambda: object())
+  assert extractor._pdf_workers(800, workers=None) == 1
+  assert extractor._pdf_workers(800, workers=4) == 4
+
+
+class _FakePage:
+  def __init__(self, images=(), curves=0, width=612, height=792, xobjects=None):
+    self.images = list(images)
+    self.curves = [None] * curves
+    self.lines = []
+    self.rects = []
+    self.page_obj = type("PageObj", (), {"resources": {"XObject": xobjects} if xobjects else {}})()
+    self.width, self.height = width, height
+
+
+def _image(x0, top, x1, bottom, px_width=None):
+  image = {"x0": x0, "top": top, "x1": x1, "bottom": bottom}
+  if px_width:
+    image["srcsize"] = (px_width, px_width)
+  return image
+
+
+def test_plan_skips_dense_text_and_blank_pages():
+  assert extractor.plan_page_ocr(_FakePage(), "word " * 400)["ocr"] is False
+  blank = extractor.plan_page_ocr(_FakePage(), "")
+  assert blank["ocr"] is False and blank["reason"] == "blank"
+
+
+def test_plan_ocrs_thin_text_layer_over_full_page_scan():
+  # 8.5in wide scan at 200 DPI covering the whole page
+  page = _FakePage(images=[_image(0, 0, 612, 792, px_width=1700)])
+  plan = extractor.plan_page_ocr(page, "Header")
+  assert plan["ocr"] is True
+  assert plan["reason"] == "thin_text_layer"
+  assert plan["dpi"] == 200
+  assert plan["crop"] is None
+
+
+def test_plan_ocrs_pages_without_text_layer_unless_nothing_is_drawn():
+  # a small scan: coverage well under OCR_MIN_IMAGE_COVERAGE
+  stamp = extractor.plan_page_ocr(_FakePage(images=[_image(500, 700, 560, 760)]), "")
+  assert stamp["ocr"] is True and stamp["coverage"] < extractor.OCR_MIN_IMAGE_COVERAGE
+  # a scan wrapped in a form XObject, and a few vector strokes
+  for page in (_FakePage(xobjects={"Fm0": object()}), _FakePage(curves=3)):
+    plan = extractor.plan_page_ocr(page, "")
+    assert plan["ocr"] is True and plan["reason"] == "no_text_layer"
+    assert plan["dpi"] == 300
+  assert extractor.plan_page_ocr(_FakePage(), "")["ocr"] is False
+
+
+def test_plan_crops_to_partial_images_and_defaults_to_max_dpi():
+  page = _FakePage(images=[_image(100, 100, 300, 400), _image(320, 120, 500, 380)])
+  plan = extractor.plan_page_ocr(page, "")
+  assert plan["ocr"] is True
+  assert plan["crop"] == (100, 100, 500, 400)
+  assert plan["dpi"] == 300
+
+
+def test_extract_pdf_records_ocr_seconds(make_pdf):
+  _, pages = extractor.extract_text(make_pdf(["Plenty of text on this page " * 20]), workers=1)
+  assert pages[0]["ocr_seconds"] == 0.0
+  assert pages[0]["ocr_dpi"] is None
+
+
+def test_ocr_backend_falls_back_to_pytesseract(monkeypatch):
+  monkeypatch.setattr(extractor, "tesserocr", None)
+  assert extractor.create_ocr_backend("auto").name == "pytesseract"
+  assert extractor.create_ocr_backend("tesserocr").name == "pytesseract"
+  with pytest.raises(ValueError):
+    extractor.create_ocr_backend("cuneiform")
+
+
+def test_tesserocr_backend_is_created_once_per_process(monkeypatch):
+  created = []
+
+  class FakeApi:
+    def __init__(self, lang):
+      created.append(lang)
+
+    def SetImage(self, image):
+      self.image = image
+
+    def GetUTF8Text(self):
+      return "  scanned   text \n"
+
+  monkeypatch.setattr(extractor, "tesserocr", type("FakeTesserocr", (), {"PyTessBaseAPI": FakeApi}))
+  monkeypatch.setattr(extractor, "OCR_BACKEND", "auto")
+  monkeypatch.setattr(extractor, "_ocr_backend", None)
+
+  assert extractor.ocr_image(object()) == "scanned text"
+  assert extractor.ocr_image(object()) == "scanned text"
+  assert extractor.get_ocr_backend().name == "tesserocr"
+  assert created == ["eng"]
+
+
+def test_extraction_fingerprint_uses_the_resolved_ocr_backend(monkeypatch):
+  monkeypatch.setattr(extractor, "OCR_BACKEND", "auto")
+  monkeypatch.setattr(extractor, "tesserocr", None)
+  monkeypatch.setattr(extractor, "_ocr_backend", None)
+  pytesseract_fingerprint = extractor.extraction_fingerprint()
+
+  class BrokenApi:
+    def __init__(self, lang):
+      raise RuntimeError("traineddata missing")
+
+  # importable, but the engine can't load, so OCR really runs through pytesseract
+  monkeypatch.setattr(extractor, "tesserocr", type("FakeTesserocr", (), {"PyTessBaseAPI": BrokenApi}))
+  monkeypatch.setattr(extractor, "_ocr_backend", None)
+  assert extractor.extraction_fingerprint() == pytesseract_fingerprint
+
+
+def test_extraction_cache_skips_reextraction(make_pdf, extraction_cache_dir, monkeypatch):
+  pdf_path = make_pdf(["Cached page text"])
+  first = extractor.extract_text(pdf_path, workers=1)
+  assert list(extraction_cache_dir.rglob("*.pages.jsonl"))
+
+  def fail(*_args, **_kwargs):
+    raise AssertionError("extraction should come from the cache")
+
+  monkeypatch.setattr(extractor, "_extract_pdf", fail)
+  copy = pdf_path.with_name("renamed.pdf")
+  copy.write_bytes(pdf_path.read_bytes())
+  assert extractor.extract_text(copy) == first
+
+
+def test_extraction_cache_misses_when_settings_change(make_pdf, monkeypatch):
+  pdf_path = make_pdf(["Some page text"])
+  extractor.extract_text(pdf_path, workers=1)
+  calls = []
+  original = extractor._extract_pdf
+  monkeypatch.setattr(extractor, "_extract_pdf", lambda *a, **k: calls.append(1) or original(*a, **k))
+
+  monkeypatch.setattr(extractor, "OCR_LANG", "deu")
+  extractor.extract_text(pdf_path, workers=1)
+  assert calls == [1]
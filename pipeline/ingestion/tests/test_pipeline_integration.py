@@ -24,3 +24,102 @@ def test_ingest_cli_invalid_path(monkeypatch, capsys):
     captured = capsys.readouterr()
     assert "File not found" in captured.out
 
+
+
+def test_batch_ingest_resumes_from_manifest(tmp_path: Path, monkeypatch):
+    from ingestion import ingest_batch
+
+    docs = tmp_path / "docs"
+    (docs / "nested").mkdir(parents=True)
+    for name in ("a.txt", "nested/b.txt", "bad.txt", "notes.csv"):
+        (docs / name).write_text(f"text of {name}", encoding="utf-8")
+
+    def fake_ingest_file(path, **kwargs):
+        if path.endswith("bad.txt"):
+            raise ValueError("cannot parse")
+        return {"doc_id": Path(path).stem, "pages": 2, "chunks": 3, "ocr_seconds": 0.5, "seconds": 1.0}
+
+    # workers are forked, so they see the patched function
+    monkeypatch.setattr(ingest_batch, "ingest_file", fake_ingest_file)
+    files = ingest_batch.expand_inputs([str(docs), str(docs / "*.txt")])
+    assert [p.name for p in files] == ["a.txt", "bad.txt", "b.txt"]
+
+    manifest = tmp_path / "manifest.jsonl"
+    results = [r for r in ingest_batch.run_batch(files, manifest, workers=2) if r]
+    assert sorted(r["status"] for r in results) == ["failed", "ok", "ok"]
+
+    throughput = ingest_batch.Throughput(len(files))
+    for result in results:
+        throughput.add(result)
+    summary = throughput.snapshot()
+    assert (summary["succeeded"], summary["failed"], summary["pages"], summary["chunks"]) == (2, 1, 4, 6)
+    assert summary["ocr_share"] == 0.5
+
+    done = ingest_batch.load_manifest(manifest)
+    todo = [p for p in files if not ingest_batch.is_done(p, done.get(str(p)))]
+    assert [p.name for p in todo] == ["bad.txt"]  # failures are retried
+
+    (docs / "a.txt").write_text("edited", encoding="utf-8")
+    assert not ingest_batch.is_done(files[0], done[str(files[0])])
+
+
+def test_batch_ingest_survives_a_worker_crash(tmp_path: Path, monkeypatch):
+    import os
+    from ingestion import ingest_batch
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name in ("a.txt", "b_crash.txt", "c.txt", "d.txt", "e.txt"):
+        (docs / name).write_text(f"text of {name}", encoding="utf-8")
+    files = ingest_batch.expand_inputs([str(docs)])
+
+    def crashing_ingest_file(path, doc_id=None, **kwargs):
+        if "crash" in path:
+            os._exit(1)  # a worker killed outright, e.g. by the OOM killer
+        return {"doc_id": doc_id, "pages": 1, "chunks": 1}
+
+    monkeypatch.setattr(ingest_batch, "ingest_file", crashing_ingest_file)
+    manifest = tmp_path / "manifest.jsonl"
+    results = [r for r in ingest_batch.run_batch(files, manifest, workers=1) if r]
+
+    by_name = {Path(r["path"]).name: r for r in results}
+    assert sorted(by_name) == ["a.txt", "b_crash.txt", "c.txt", "d.txt", "e.txt"]
+    assert by_name["b_crash.txt"]["status"] == "failed"
+    assert "BrokenProcessPool" in by_name["b_crash.txt"]["error"]
+    assert by_name["e.txt"]["status"] == "ok"  # later files ran on a new pool
+
+    done = ingest_batch.load_manifest(manifest)
+    assert all(entry["status"] != "started" for entry in done.values())
+    assert all(entry["doc_id"] for entry in done.values())
+
+
+def test_batch_ingest_resume_reuses_random_doc_ids(tmp_path: Path, monkeypatch):
+    from ingestion import ingest_batch
+
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name in ("a.txt", "b.txt"):
+        (docs / name).write_text(f"text of {name}", encoding="utf-8")
+    files = ingest_batch.expand_inputs([str(docs)])
+    manifest = tmp_path / "manifest.jsonl"
+
+    def flaky_ingest_file(path, doc_id=None, **kwargs):
+        if path.endswith("b.txt") and not (tmp_path / "b.retry").exists():
+            raise OSError("worker interrupted")
+        return {"doc_id": doc_id, "pages": 1, "chunks": 1}
+
+    monkeypatch.setattr(ingest_batch, "ingest_file", flaky_ingest_file)
+    first = {Path(r["path"]).name: r for r in ingest_batch.run_batch(files, manifest, workers=1) if r}
+    assert first["b.txt"]["status"] == "failed"
+
+    # an interrupted run leaves only its "started" entry behind
+    last = ingest_batch.load_manifest(manifest)[str(files[0])]
+    assert (last["status"], last["doc_id"]) == ("ok", first["a.txt"]["doc_id"])
+    with manifest.open("a", encoding="utf-8") as log:
+        log.write('{"path": "%s", "status": "started", "doc_id": "%s"}\n' % (files[0], last["doc_id"]))
+
+    (tmp_path / "b.retry").touch()
+    second = {Path(r["path"]).name: r for r in ingest_batch.run_batch(files, manifest, workers=1) if r}
+    assert second["a.txt"]["doc_id"] == first["a.txt"]["doc_id"]
+    assert second["b.txt"]["doc_id"] == first["b.txt"]["doc_id"]
+    assert second["b.txt"]["status"] == "ok"
@@ -1,3 +1,4 @@
+import pytest
 from pathlib import Path
 from ingestion import utils
 
@@ -16,3 +17,83 @@ def test_save_chunk(tmp_path: Path):
     data = path.read_text()
     assert "hello" in data
 
+
+
+def test_hashing_writer_and_content_doc_id(tmp_path):
+    import hashlib
+
+    target = tmp_path / "upload.bin"
+    with target.open("wb") as f:
+        writer = utils.HashingWriter(f)
+        writer.write(b"hello ")
+        writer.write(b"world")
+    assert writer.hexdigest() == hashlib.sha256(b"hello world").hexdigest()
+    assert target.read_bytes() == b"hello world"
+    assert utils.file_doc_id(target) == utils.content_doc_id(writer.hexdigest())
+    assert len(utils.file_doc_id(target)) == len(utils.generate_doc_id())
+
+
+def test_count_saved_chunks(tmp_path):
+    assert utils.count_saved_chunks("doc", base_dir=tmp_path) == 0
+    utils.save_chunk("doc", 0, {"text": "a"}, base_dir=tmp_path)
+    utils.save_chunk("doc", 1, {"text": "b"}, base_dir=tmp_path)
+    assert utils.count_saved_chunks("doc", base_dir=tmp_path) == 2
+
+
+def _chunks(n):
+    return [{"doc_id": "doc", "chunk_index": i, "text": f"line {i}\nwith \"quotes\" and ünïcode", "page": None} for i in range(n)]
+
+
+def test_segment_roundtrip_across_blocks(tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "BLOCK_RECORDS", 4)
+    chunks = _chunks(10)
+    with utils.chunk_writer("doc", base_dir=tmp_path, chunk_format="segment") as writer:
+        for chunk in chunks:
+            writer.add(chunk)
+
+    segment = tmp_path / "doc" / utils.SEGMENT_FILE
+    assert writer.count == 10
+    assert [p.name for p in segment.parent.iterdir()] == [utils.SEGMENT_FILE]
+    assert utils.read_segment(segment) == chunks
+    assert utils.read_chunk(segment, 9) == chunks[9]
+    assert utils.count_saved_chunks("doc", base_dir=tmp_path) == 10
+    assert utils.load_saved_chunks("doc", base_dir=tmp_path) == chunks
+
+
+def test_segment_is_not_published_on_error(tmp_path):
+    try:
+        with utils.chunk_writer("doc", base_dir=tmp_path, chunk_format="segment") as writer:
+            writer.add(_chunks(1)[0])
+            raise RuntimeError("extraction failed")
+    except RuntimeError:
+        pass
+    assert list((tmp_path / "doc").iterdir()) == []
+    assert utils.count_saved_chunks("doc", base_dir=tmp_path) == 0
+
+
+def test_zstd_segment_roundtrip(tmp_path):
+    pytest.importorskip("zstandard")
+    chunks = _chunks(300)
+    segment = utils.write_segment(tmp_path / "doc", chunks, compression="zstd")
+    assert utils.read_segment(segment) == chunks
+    assert utils.read_chunk(segment, 299) == chunks[299]
+
+
+def test_json_chunk_writer_keeps_legacy_layout(tmp_path):
+    with utils.chunk_writer("doc", base_dir=tmp_path, chunk_format="json") as writer:
+        for chunk in _chunks(2):
+            writer.add(chunk)
+    assert sorted(p.name for p in (tmp_path / "doc").iterdir()) == ["chunk_0.json", "chunk_1.json"]
+    assert utils.load_saved_chunks("doc", base_dir=tmp_path) == _chunks(2)
+
+
+def test_migrate_doc_packs_json_chunks(tmp_path):
+    from ingestion.migrate_chunks import migrate_doc
+
+    for chunk in _chunks(3):
+        utils.save_chunk("doc", chunk["chunk_index"], chunk, base_dir=tmp_path)
+    result = migrate_doc(tmp_path / "doc", "none", keep_json=False, dry_run=False)
+
+    assert result["chunks"] == result["json_files"] == 3
+    assert [p.name for p in (tmp_path / "doc").iterdir()] == [utils.SEGMENT_FILE]
+    assert utils.load_saved_chunks("doc", base_dir=tmp_path) == _chunks(3)
@@ -1,26 +1,104 @@
 """
 Utility helpers for ingestion pipeline.
+
+Chunks are stored per document under storage/chunks/<doc_id>/, either as
+one chunk_<i>.json per chunk or packed into a single chunks.seg segment:
+
+    block 0 .. block n-1     up to BLOCK_RECORDS chunks each, one compact JSON
+                             object per line, raw or zstd-compressed
+    offset table             (offset, length) of every block, uint64 pairs
+    footer                   SEGMENT_FOOTER: magic, codec, record count,
+                             block count, offset of the offset table
+
+All integers are little-endian. Blocks hold a fixed number of records (the
+last may be shorter), so record i lives in block i // BLOCK_RECORDS, and
+the footer alone gives the chunk count. Segments are written to a temp file
+and renamed into place, so readers never see a partial one. The vector
+service has its own reader (embed-and-vec-search/chunk_segments.py); keep
+the two in step.
 """
 
 from __future__ import annotations
 
+import hashlib
 import json
 import os
+import struct
 import uuid
 from pathlib import Path
-from typing import Any
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+try:  # optional: zstd-compressed chunk segments
+    import zstandard
+except ImportError:  # pragma: no cover - depends on environment
+    zstandard = None
 
 
 # Base storage directory (relative to pipeline root)
 PIPELINE_ROOT = Path(__file__).parent.parent
 STORAGE_DIR = PIPELINE_ROOT / "storage"
 
+SEGMENT_FILE = "chunks.seg"
+SEGMENT_MAGIC = b"CHUNKSG1"
+SEGMENT_FOOTER = struct.Struct("<8sB7xQQQ")  # magic, codec, records, blocks, table offset
+BLOCK_ENTRY = struct.Struct("<QQ")  # block offset, stored length
+BLOCK_RECORDS = 256
+CODECS = {"none": 0, "zstd": 1}
+
+CHUNK_FORMAT = os.getenv("CHUNK_FORMAT", "segment")  # segment | json (one file per chunk)
+CHUNK_COMPRESSION = os.getenv("CHUNK_COMPRESSION", "none")  # none | zstd
+
 
 def generate_doc_id() -> str:
     """Generate a unique hex document identifier."""
     return uuid.uuid4().hex
 
 
+def content_doc_id(sha256_hex: str) -> str:
+    """
+    Content-addressed document identifier: the first 32 hex chars of the
+    file's SHA-256, the same length as a generate_doc_id() value.
+    """
+    return sha256_hex[:32]
+
+
+class HashingWriter:
+    """
+    File-like wrapper that hashes bytes as they are written, so an upload's
+    digest is known once it has been saved without reading it back.
+    """
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        return self.raw.write(data)
+
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+
+def file_doc_id(file_path: str | Path) -> str:
+    """Content-addressed doc_id of a file on disk."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return content_doc_id(digest.hexdigest())
+
+
+def count_saved_chunks(doc_id: str, base_dir: Path | None = None) -> int:
+    """Number of chunks already stored for doc_id in either layout (0 if none)."""
+    doc_dir = (get_chunks_dir() if base_dir is None else Path(base_dir)) / doc_id
+    if (doc_dir / SEGMENT_FILE).is_file():
+        return segment_count(doc_dir / SEGMENT_FILE)
+    if not doc_dir.is_dir():
+        return 0
+    return sum(1 for _ in doc_dir.glob("chunk_*.json"))
+
+
 def ensure_folder(path: str | Path) -> None:
     """Create folder path if it does not exist."""
     Path(path).mkdir(parents=True, exist_ok=True)
@@ -63,3 +141,172 @@ def save_chunk(doc_id: str, chunk_index: int, chunk_data: Any, base_dir: Path |
         json.dump(chunk_data, f, ensure_ascii=False, indent=2)
 
     return file_path
+
+
+def _require_zstd() -> None:
+    if zstandard is None:
+        raise RuntimeError("zstd-compressed chunk segments need the zstandard package")
+
+
+class SegmentWriter:
+    """
+    Write a document's chunks into one segment, block by block, so memory
+    is bounded by BLOCK_RECORDS chunks. Use as a context manager; the
+    segment is only published if the block exits without an exception.
+    """
+
+    def __init__(self, doc_dir: str | Path, compression: Optional[str] = None):
+        compression = compression or CHUNK_COMPRESSION
+        if compression not in CODECS:
+            raise ValueError(f"Unknown chunk compression: {compression}")
+        if compression == "zstd":
+            _require_zstd()
+        self.path = Path(doc_dir) / SEGMENT_FILE
+        self.codec = CODECS[compression]
+        self.count = 0
+        self._compressor = zstandard.ZstdCompressor() if self.codec else None
+        self._pending: List[bytes] = []
+        self._blocks: List[tuple] = []
+        self._tmp = self.path.with_name(f"{SEGMENT_FILE}.{os.getpid()}.tmp")
+        self._file = None
+
+    def __enter__(self) -> "SegmentWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self._tmp.open("wb")
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+            self._tmp.unlink(missing_ok=True)
+
+    def add(self, chunk: Dict[str, Any]) -> None:
+        self._pending.append(json.dumps(chunk, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        self.count += 1
+        if len(self._pending) == BLOCK_RECORDS:
+            self._flush_block()
+
+    def _flush_block(self) -> None:
+        data = b"\n".join(self._pending)
+        if self._compressor is not None:
+            data = self._compressor.compress(data)
+        self._blocks.append((self._file.tell(), len(data)))
+        self._file.write(data)
+        self._pending = []
+
+    def close(self) -> Path:
+        """Write the offset table and footer and publish the segment."""
+        if self._pending:
+            self._flush_block()
+        table_offset = self._file.tell()
+        for block in self._blocks:
+            self._file.write(BLOCK_ENTRY.pack(*block))
+        self._file.write(SEGMENT_FOOTER.pack(SEGMENT_MAGIC, self.codec, self.count, len(self._blocks), table_offset))
+        self._file.close()
+        os.replace(self._tmp, self.path)
+        return self.path
+
+
+def write_segment(doc_dir: str | Path, chunks: List[Dict[str, Any]], compression: Optional[str] = None) -> Path:
+    """Write ``chunks`` as the segment of ``doc_dir``."""
+    with SegmentWriter(doc_dir, compression) as writer:
+        for chunk in chunks:
+            writer.add(chunk)
+    return writer.path
+
+
+def _read_footer(f) -> tuple:
+    f.seek(-SEGMENT_FOOTER.size, os.SEEK_END)
+    magic, codec, records, blocks, table_offset = SEGMENT_FOOTER.unpack(f.read(SEGMENT_FOOTER.size))
+    if magic != SEGMENT_MAGIC:
+        raise ValueError(f"Not a chunk segment: {getattr(f, 'name', f)}")
+    return codec, records, blocks, table_offset
+
+
+def segment_count(path: str | Path) -> int:
+    """Number of chunks in a segment, read from its footer."""
+    with open(path, "rb") as f:
+        return _read_footer(f)[1]
+
+
+def _decode_block(data: bytes, codec: int) -> List[Dict[str, Any]]:
+    if codec:
+        _require_zstd()
+        data = zstandard.ZstdDecompressor().decompress(data)
+    # one json.loads per block instead of one per record
+    return json.loads(b"[" + data.replace(b"\n", b",") + b"]")
+
+
+def iter_segment(path: str | Path) -> Iterator[Dict[str, Any]]:
+    """Yield the chunks of a segment in order, one block in memory at a time."""
+    with open(path, "rb") as f:
+        codec, _, blocks, table_offset = _read_footer(f)
+        f.seek(table_offset)
+        table = [BLOCK_ENTRY.unpack(f.read(BLOCK_ENTRY.size)) for _ in range(blocks)]
+        for offset, length in table:
+            f.seek(offset)
+            yield from _decode_block(f.read(length), codec)
+
+
+def read_segment(path: str | Path) -> List[Dict[str, Any]]:
+    return list(iter_segment(path))
+
+
+def read_chunk(path: str | Path, index: int) -> Dict[str, Any]:
+    """Read the ``index``-th chunk of a segment without decoding the others' blocks."""
+    with open(path, "rb") as f:
+        codec, records, _, table_offset = _read_footer(f)
+        if not 0 <= index < records:
+            raise IndexError(index)
+        block, row = divmod(index, BLOCK_RECORDS)
+        f.seek(table_offset + block * BLOCK_ENTRY.size)
+        offset, length = BLOCK_ENTRY.unpack(f.read(BLOCK_ENTRY.size))
+        f.seek(offset)
+        return _decode_block(f.read(length), codec)[row]
+
+
+class _JsonChunkWriter:
+    """SegmentWriter-compatible writer for the one-file-per-chunk layout."""
+
+    def __init__(self, doc_dir: Path):
+        self.doc_dir = doc_dir
+        self.count = 0
+
+    def __enter__(self) -> "_JsonChunkWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+    def add(self, chunk: Dict[str, Any]) -> None:
+        save_chunk(self.doc_dir.name, chunk["chunk_index"], chunk, base_dir=self.doc_dir.parent)
+        self.count += 1
+
+
+def chunk_writer(doc_id: str, base_dir: Path | None = None, chunk_format: Optional[str] = None):
+    """
+    Writer for a document's chunks in CHUNK_FORMAT (or ``chunk_format``).
+    Use as ``with chunk_writer(doc_id) as writer: writer.add(chunk)``.
+    """
+    chunk_format = chunk_format or CHUNK_FORMAT
+    doc_dir = (get_chunks_dir() if base_dir is None else Path(base_dir)) / doc_id
+    if chunk_format == "segment":
+        return SegmentWriter(doc_dir)
+    if chunk_format == "json":
+        return _JsonChunkWriter(doc_dir)
+    raise ValueError(f"Unknown chunk format: {chunk_format}")
+
+
+def load_saved_chunks(doc_id: str, base_dir: Path | None = None) -> List[Dict[str, Any]]:
+    """Read a document's chunks from either layout, ordered by chunk_index."""
+    doc_dir = (get_chunks_dir() if base_dir is None else Path(base_dir)) / doc_id
+    if (doc_dir / SEGMENT_FILE).is_file():
+        return read_segment(doc_dir / SEGMENT_FILE)
+    files = sorted(doc_dir.glob("chunk_*.json"), key=lambda p: int(p.stem.split("_")[1]))
+    chunks = []
+    for path in files:
+        with path.open("r", encoding="utf-8") as f:
+            chunks.append(json.load(f))
+    return chunks
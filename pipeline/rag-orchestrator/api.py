@@ -9,6 +9,7 @@ import json
 import uuid
 import logging
 import tempfile
+import time
 from pathlib import Path
 from flask import Flask, request, jsonify
 from flask_cors import CORS
@@ -18,6 +19,7 @@ from werkzeug.utils import secure_filename
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import config
+from jobs import IngestionJobs, JobQueueFull
 from orchestrator import run
 from orchestrator.rag_orchestrator import RAGOrchestratorError
 
@@ -34,66 +36,130 @@ CORS(app)
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'pdf', 'docx', 'txt', 'png', 'jpg', 'jpeg'}
 
+# Minimum seconds between page-progress reports of an ingestion job
+PROGRESS_INTERVAL_SECONDS = 0.5
+
 
 def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def process_uploaded_file(file) -> dict:
+def save_upload(file) -> dict:
     """
-    Process an uploaded file through the ingestion pipeline.
+    Save an uploaded file to a private temp dir and assign its doc_id.
+    
+    With DOC_ID_MODE=content the doc_id is hashed from the bytes while they
+    are saved, so no second pass over the file is needed.
     
-    Args:
-        file: Flask file object
-        
     Returns:
-        Dictionary with doc_id and processing info
+        Dictionary with filename, doc_id, temp_dir and temp_path
     """
-    from ingestion.extractor import extract_text
-    from ingestion.chunker import chunk_text, build_page_ranges
-    from ingestion.utils import generate_doc_id, save_chunk
+    from ingestion.utils import HashingWriter, content_doc_id, generate_doc_id
     
-    # Save file temporarily
     filename = secure_filename(file.filename)
     temp_dir = tempfile.mkdtemp()
     temp_path = os.path.join(temp_dir, filename)
     
-    logger.info(f"Processing uploaded file: {filename}")
+    logger.info(f"Saving uploaded file: {filename}")
     logger.info(f"Temp path: {temp_path}")
     
-    file.save(temp_path)
+    if config.DOC_ID_MODE == "content":
+        with open(temp_path, "wb") as out:
+            writer = HashingWriter(out)
+            file.save(writer)
+        doc_id = content_doc_id(writer.hexdigest())
+    else:
+        file.save(temp_path)
+        doc_id = generate_doc_id()
+    
+    return {"filename": filename, "doc_id": doc_id, "temp_dir": temp_dir, "temp_path": temp_path}
+
+
+def pdf_workers() -> int:
+    """PDF extraction processes for one ingest worker: INGEST_PDF_WORKERS, or
+    an equal share of the CPUs so INGEST_WORKERS files don't oversubscribe them."""
+    if config.INGEST_PDF_WORKERS > 0:
+        return config.INGEST_PDF_WORKERS
+    return max(1, (os.cpu_count() or 1) // max(1, config.INGEST_WORKERS))
+
+
+def ingest_saved_file(saved: dict, progress=None, emit=None) -> dict:
+    """
+    Extract, chunk and store a file saved by save_upload(), then delete it.
+    
+    If the document's chunks are already stored (DOC_ID_MODE=content) it is
+    returned as a duplicate without extraction or chunking; the job then
+    re-indexes the stored chunks unless the document is live in the index.
+    Chunks are read from and written to config.CHUNKS_DIR. ``progress``,
+    if given, is called with keyword updates (stage, page, pages, chunks)
+    while the file is processed. ``emit``, if given, receives the chunks in
+    batches of STREAM_BATCH_CHUNKS as they are produced, so they can be
+    embedded while later pages are still being extracted. Runs in ingestion
+    worker processes.
+    
+    Returns:
+        Dictionary with doc_id and processing info
+    """
+    from ingestion.extractor import iter_pages, page_count
+    from ingestion.chunker import chunking_options, iter_chunks
+    from ingestion.utils import chunk_writer, count_saved_chunks
+    
+    filename, doc_id, temp_path = saved["filename"], saved["doc_id"], saved["temp_path"]
+    progress = progress or (lambda **updates: None)
+    emit = emit or (lambda chunks: None)
     
     try:
-        # Extract text
-        doc_id = generate_doc_id()
-        logger.info(f"Extracting text from {filename}...")
-        full_text, page_texts = extract_text(temp_path)
-        logger.info(f"Extracted {len(full_text)} characters")
-        
-        page_ranges = build_page_ranges(page_texts)
-        
-        # Chunk text
-        logger.info(f"Chunking text...")
-        chunks = chunk_text(
-            full_text, 
-            doc_id, 
-            source=filename, 
-            page_ranges=page_ranges
-        )
-        logger.info(f"Created {len(chunks)} chunks")
-        
-        # Save chunks
-        for idx, chunk in enumerate(chunks):
-            save_chunk(doc_id, idx, chunk)
-        
-        logger.info(f"Processed file {filename}: doc_id={doc_id}, chunks={len(chunks)}")
+        existing_chunks = 0
+        if config.DOC_ID_MODE == "content":
+            existing_chunks = count_saved_chunks(doc_id, base_dir=config.CHUNKS_DIR)
+        if existing_chunks:
+            logger.info(f"Duplicate upload {filename}: already ingested as doc_id={doc_id}")
+            return {
+                "doc_id": doc_id,
+                "filename": filename,
+                "chunks": existing_chunks,
+                "duplicate": True
+            }
+        
+        # Extract, chunk and save as a stream so large files never sit in memory whole
+        logger.info(f"Extracting and chunking {filename}...")
+        total_pages = page_count(temp_path)
+        progress(stage="extracting", page=0, pages=total_pages, chunks=0)
+        stats = {}
+        options = chunking_options()
+        
+        with chunk_writer(doc_id, base_dir=Path(config.CHUNKS_DIR)) as chunks_out:
+            def tracked_pages():
+                reported = time.monotonic()
+                for number, page in enumerate(iter_pages(temp_path, workers=pdf_workers()), 1):
+                    yield page
+                    # throttled: a report per page would flood the queue on text PDFs
+                    if time.monotonic() - reported >= PROGRESS_INTERVAL_SECONDS or number == total_pages:
+                        progress(stage="extracting", page=number, pages=total_pages, chunks=chunks_out.count)
+                        reported = time.monotonic()
+                progress(stage="chunking", chunks=chunks_out.count)
+            
+            batch = []
+            for chunk in iter_chunks(tracked_pages(), doc_id, source=filename, stats=stats, **options):
+                chunks_out.add(chunk)
+                batch.append(chunk)
+                if len(batch) >= config.STREAM_BATCH_CHUNKS:
+                    emit(batch)
+                    batch = []
+            if batch:
+                emit(batch)
+        chunk_count = chunks_out.count
+        logger.info(f"Extracted {stats['chars']} characters from {stats['pages']} pages")
+        
+        logger.info(f"Processed file {filename}: doc_id={doc_id}, chunks={chunk_count}")
         
         return {
             "doc_id": doc_id,
             "filename": filename,
-            "chunks": len(chunks),
-            "characters": len(full_text)
+            "chunks": chunk_count,
+            "characters": stats["chars"],
+            "duplicate": False
         }
         
     except Exception as e:
@@ -104,49 +170,102 @@ def process_uploaded_file(file) -> dict:
         # Cleanup temp file
         if os.path.exists(temp_path):
             os.remove(temp_path)
-        if os.path.exists(temp_dir):
+        if os.path.exists(saved["temp_dir"]):
             try:
-                os.rmdir(temp_dir)
+                os.rmdir(saved["temp_dir"])
             except OSError:
                 pass  # Directory not empty or already removed
 
 
-def reindex_vectors():
-    """Trigger re-indexing of all chunks."""
-    try:
+_indexer = None
+
+
+def get_indexer():
+    """Return the process-wide EmbeddingIndexer, loading the model once."""
+    global _indexer
+    if _indexer is None:
         sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'embed-and-vec-search'))
         from embed_and_index import EmbeddingIndexer
-        
-        chunks_dir = config.CHUNKS_DIR
-        logger.info(f"Re-indexing from chunks_dir: {chunks_dir}")
+
         logger.info(f"Index path: {config.VECTOR_INDEX_DIR}")
-        
-        indexer = EmbeddingIndexer(index_path=config.VECTOR_INDEX_DIR)
-        
-        chunks = indexer.load_chunks(chunks_dir)
-        if chunks:
-            embeddings = indexer.embed_chunks(chunks)
-            indexer.build_index(embeddings, chunks)
-            indexer.save_index()
-            logger.info(f"Re-indexed {len(chunks)} chunks")
-            return len(chunks)
-        logger.warning("No chunks found to re-index")
-        return 0
-        
-    except Exception as e:
-        logger.error(f"Re-indexing failed: {e}", exc_info=True)
-        # Don't re-raise - allow the request to continue even if re-indexing fails
-        return 0
+        _indexer = EmbeddingIndexer(index_path=config.VECTOR_INDEX_DIR)
+    return _indexer
+
+
+_jobs = None
+
+
+def get_jobs():
+    """Return the process-wide ingestion job runner, creating it on first use."""
+    global _jobs
+    if _jobs is None:
+        _jobs = IngestionJobs(
+            ingest_saved_file,
+            lambda: get_indexer(),
+            max_workers=config.INGEST_WORKERS,
+            executor=config.INGEST_EXECUTOR,
+            nice=config.INGEST_NICE,
+            max_queued_files=config.INGEST_MAX_QUEUED_FILES,
+            ttl_seconds=config.JOB_TTL_SECONDS,
+            stream_queue_batches=config.STREAM_QUEUE_BATCHES,
+            chunks_dir=config.CHUNKS_DIR
+        )
+    return _jobs
+
+
+def discard_saved(saved_files):
+    """Delete uploads that were saved but will not be ingested."""
+    for saved in saved_files:
+        if os.path.exists(saved["temp_path"]):
+            os.remove(saved["temp_path"])
+        try:
+            os.rmdir(saved["temp_dir"])
+        except OSError:
+            pass
+
+
+def submit_upload_job(files):
+    """Save the allowed files and queue them as one ingestion job.
+    
+    Returns:
+        The job's initial state, or None if no file was allowed
+    """
+    saved_files = []
+    for file in files:
+        if not allowed_file(file.filename):
+            logger.warning(f"Skipping file with disallowed extension: {file.filename}")
+            continue
+        saved_files.append(save_upload(file))
+    
+    if not saved_files:
+        return None
+    
+    try:
+        job = get_jobs().submit(saved_files)
+    except JobQueueFull:
+        discard_saved(saved_files)
+        raise
+    logger.info(f"Queued ingestion job {job['job_id']} with {len(saved_files)} file(s)")
+    return job
+
+
+def wants_wait() -> bool:
+    """True if the client asked to block until its upload job is done."""
+    value = request.args.get('wait') or request.form.get('wait') or ''
+    return value.lower() in ('1', 'true', 'yes')
 
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint."""
-    return jsonify({
+    response = {
         "status": "healthy",
         "service": "RAG Orchestrator API",
         "mock_mode": config.MOCK_MODE
-    })
+    }
+    if _jobs is not None:
+        response["ingestion"] = _jobs.stats()
+    return jsonify(response)
 
 
 @app.route('/', methods=['GET'])
@@ -158,7 +277,8 @@ def root():
         "endpoints": {
             "GET /health": "Health check",
             "POST /rag/query": "Run RAG query (body: {query, doc_ids?, template_type?})",
-            "POST /rag/upload": "Upload and process files",
+            "POST /rag/upload": "Upload files; returns a job_id (?wait=true blocks until processed)",
+            "GET /rag/jobs/<job_id>": "Upload job status with per-file stage progress",
             "POST /rag/full": "Full pipeline: upload files + run query"
         }
     })
@@ -216,14 +336,26 @@ def rag_query():
 @app.route('/rag/upload', methods=['POST'])
 def upload_files():
     """
-    Upload and process files for RAG.
+    Upload files for RAG. They are ingested by a background job.
     
-    Multipart form data with files.
+    Multipart form data with files. With ?wait=true the request blocks until
+    the job is done and returns the final per-file results instead.
     
-    Returns:
+    Returns (202):
+    {
+        "job_id": "string",
+        "status": "queued",
+        "status_url": "/rag/jobs/<job_id>",
+        "files": [
+            {"doc_id": "string", "filename": "string", "status": "queued", "stage": "queued"}
+        ]
+    }
+    
+    Returns with wait (200):
     {
+        "job_id": "string",
         "files": [
-            {"doc_id": "string", "filename": "string", "chunks": int}
+            {"doc_id": "string", "filename": "string", "chunks": int, "duplicate": bool}
         ],
         "reindexed": int
     }
@@ -239,31 +371,59 @@ def upload_files():
         if not files:
             return jsonify({"error": "No valid files provided"}), 400
         
-        processed = []
-        for file in files:
-            if not allowed_file(file.filename):
-                logger.warning(f"Skipping file with disallowed extension: {file.filename}")
-                continue
-            
-            result = process_uploaded_file(file)
-            processed.append(result)
-        
-        if not processed:
+        job = submit_upload_job(files)
+        if job is None:
             return jsonify({"error": "No valid files to process"}), 400
         
-        # Re-index vectors
-        reindexed = reindex_vectors()
+        if wants_wait():
+            job = get_jobs().wait(job['job_id'])
+            return jsonify({
+                "job_id": job['job_id'],
+                "status": job['status'],
+                "files": job['files'],
+                "reindexed": job['reindexed']
+            })
         
         return jsonify({
-            "files": processed,
-            "reindexed": reindexed
-        })
+            "job_id": job['job_id'],
+            "status": job['status'],
+            "status_url": f"/rag/jobs/{job['job_id']}",
+            "files": job['files']
+        }), 202
+        
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
         
     except Exception as e:
         logger.error(f"Upload error: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/rag/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """
+    Status of an upload job.
+    
+    Returns:
+    {
+        "job_id": "string",
+        "status": "queued" | "running" | "succeeded" | "failed",
+        "stage": "queued" | "processing" | "done",
+        "files": [
+            {"doc_id": "string", "filename": "string", "status": "string",
+             "stage": "queued" | "extracting" | "chunking" | "embedding" | "indexed" | "failed",
+             "page": int, "pages": int, "chunks": int, "embedded": int, "indexed": int}
+        ],
+        "reindexed": int | null,
+        ...
+    }
+    """
+    job = get_jobs().get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job)
+
+
 @app.route('/rag/full', methods=['POST'])
 def full_pipeline():
     """
@@ -281,9 +441,8 @@ def full_pipeline():
         query = request.form.get('query') or (request.json or {}).get('query')
         template_type = request.form.get('template_type', 'qa')
         
-        # Process any uploaded files
-        doc_ids = []
-        uploaded_files = []
+        # Queue any uploaded files as a background job
+        job = None
         
         files = request.files.getlist('files') or []
         # Also check for single 'file' field
@@ -292,27 +451,29 @@ def full_pipeline():
             files = [single_file] + list(files)
         
         if files and files[0].filename:
-            for file in files:
-                if allowed_file(file.filename):
-                    result = process_uploaded_file(file)
-                    uploaded_files.append(result)
-                    doc_ids.append(result['doc_id'])
-            
-            # Re-index if we uploaded files
-            if uploaded_files:
-                reindex_vectors()
+            job = submit_upload_job(files)
         
-        # If no query provided, just return upload results (like /rag/upload)
+        # If no query provided, just return the job (like /rag/upload)
         if not query:
-            if not uploaded_files:
+            if job is None:
                 return jsonify({"error": "Either query or files must be provided"}), 400
             
-            logger.info(f"File upload only: {len(uploaded_files)} files processed")
+            logger.info(f"File upload only: job {job['job_id']} with {len(job['files'])} files")
             return jsonify({
-                "uploaded_files": uploaded_files,
-                "reindexed": len(doc_ids),
-                "message": "Files processed successfully. Send a query to analyze them."
-            })
+                "job_id": job['job_id'],
+                "status_url": f"/rag/jobs/{job['job_id']}",
+                "uploaded_files": job['files'],
+                "message": "Files are being processed. Poll status_url, then send a query to analyze them."
+            }), 202
+        
+        # The query needs the new documents indexed, so wait for the job;
+        # the work itself runs in the ingestion pool, not in this request
+        doc_ids = []
+        uploaded_files = []
+        if job is not None:
+            job = get_jobs().wait(job['job_id'])
+            uploaded_files = job['files']
+            doc_ids = [f['doc_id'] for f in uploaded_files if f['status'] == 'done']
         
         # Run RAG query
         logger.info(f"Full pipeline query: '{query[:50]}...' with {len(doc_ids)} new docs")
@@ -328,6 +489,9 @@ def full_pipeline():
             "result": rag_result
         })
         
+    except JobQueueFull as e:
+        return jsonify({"error": str(e)}), 503
+        
     except RAGOrchestratorError as e:
         logger.error(f"RAG orchestration error: {e}")
         return jsonify({"error": str(e)}), 500
@@ -346,7 +510,8 @@ if __name__ == '__main__':
     print("\nEndpoints:")
     print("  GET  /health     - Health check")
     print("  POST /rag/query  - Run RAG query")
-    print("  POST /rag/upload - Upload and process files")
+    print("  POST /rag/upload - Upload files (returns a job_id)")
+    print("  GET  /rag/jobs/<id> - Upload job progress")
     print("  POST /rag/full   - Full pipeline (upload + query)")
     print("=" * 60)
     
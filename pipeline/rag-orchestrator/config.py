@@ -72,6 +72,22 @@ STORAGE_DIR = os.getenv(
 )
 CHUNKS_DIR = os.path.join(STORAGE_DIR, "chunks")
 UPLOADS_DIR = os.path.join(STORAGE_DIR, "uploads")
+# "uuid": random doc_id per upload; "content": doc_id from the file's SHA-256,
+# and re-uploading identical bytes returns the existing document untouched
+DOC_ID_MODE = os.getenv("DOC_ID_MODE", "uuid").lower()
+# Background ingestion of uploads: files are extracted and chunked by a pool
+# of INGEST_WORKERS processes (or threads) running at lower CPU priority
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_EXECUTOR = os.getenv("INGEST_EXECUTOR", "process")  # process | thread
+INGEST_NICE = int(os.getenv("INGEST_NICE", "10"))
+# PDF extraction processes per ingest worker (0 = an equal share of the CPUs)
+INGEST_PDF_WORKERS = int(os.getenv("INGEST_PDF_WORKERS", "0"))
+INGEST_MAX_QUEUED_FILES = int(os.getenv("INGEST_MAX_QUEUED_FILES", "1000"))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", "3600"))  # finished jobs kept this long
+# Chunks are streamed from the workers to the embedder in batches of
+# STREAM_BATCH_CHUNKS; at most STREAM_QUEUE_BATCHES batches wait to be embedded
+STREAM_BATCH_CHUNKS = int(os.getenv("STREAM_BATCH_CHUNKS", "64"))
+STREAM_QUEUE_BATCHES = int(os.getenv("STREAM_QUEUE_BATCHES", "8"))
 
 # ========================================
 # VECTOR INDEX CONFIGURATION
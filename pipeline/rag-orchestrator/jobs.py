@@ -0,0 +1,352 @@
+"""
+Background ingestion jobs for uploaded files.
+
+An upload request only saves its files and submits them as one job. Each
+file then flows through overlapping stages connected by bounded queues:
+
+    extract -> chunk     in a pool of worker processes (niced, so query
+                         requests keep the CPU and the API process keeps
+                         the GIL); chunks are written to disk and streamed
+                         to the API process in batches
+    embed               on one background thread of the API process, batch
+                         by batch while the worker is still extracting
+    index               on the same thread, as soon as the file's last
+                         batch is embedded; the document is then searchable
+
+The chunk queue holds at most STREAM_QUEUE_BATCHES batches, so a slow
+embedder pauses extraction instead of letting batches pile up. The bound
+is per document, not per batch: the embed thread keeps each file's chunks
+and embeddings until its last batch arrives, because the file is indexed
+and published as one unit (a failed file leaves nothing half-indexed).
+Peak memory therefore grows with the largest document in flight. OCR in
+the workers and the embedding model in the API process run at the same
+time.
+
+Job state lives in memory in the API process and is dropped JOB_TTL_SECONDS
+after the job finishes. If a worker process dies (OOM kill, segfault in a
+native parser), the files still on that pool fail and the next job starts
+a fresh pool.
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Raised when accepting a job would exceed the queued-file limit."""
+
+
+def _init_worker(nice: int):
+    if nice:
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def _run_file(ingest_fn, saved: dict, job_id: str, index: int, progress_queue, chunk_queue):
+    """Worker entry point: ingest one saved upload, streaming its chunks.
+
+    The file's outcome is sent through ``chunk_queue`` after its last batch,
+    so the embed stage sees every batch before it indexes the file.
+    """
+
+    def progress(**updates):
+        progress_queue.put((job_id, index, updates))
+
+    def emit(chunks):
+        chunk_queue.put((job_id, index, "chunks", chunks))
+
+    try:
+        result = ingest_fn(saved, progress=progress, emit=emit)
+    except Exception as e:  # pylint: disable=broad-except
+        chunk_queue.put((job_id, index, "failed", str(e)))
+        return None
+    chunk_queue.put((job_id, index, "done", result))
+    return result
+
+
+class IngestionJobs:
+    def __init__(self, ingest_fn, get_indexer, max_workers: int = 2, executor: str = "process",
+                 nice: int = 10, max_queued_files: int = 1000, ttl_seconds: float = 3600,
+                 stream_queue_batches: int = 8, chunks_dir: str = None):
+        """
+        ``ingest_fn(saved, progress=None, emit=None)`` extracts and chunks one
+        saved upload, passes its chunks to ``emit`` in batches and returns its
+        result dict; it must be picklable for the process executor.
+        ``get_indexer()`` returns the indexer (``embed_chunks``,
+        ``index_documents``, ``has_document`` and ``upsert_documents``); it is
+        called on the embed thread when the first batch arrives. A duplicate
+        result streams no chunks; its stored chunks are re-indexed from
+        ``chunks_dir`` if the document is not live in the index (deleted, or
+        an earlier upload failed before indexing).
+        """
+        self.ingest_fn = ingest_fn
+        self.get_indexer = get_indexer
+        self.max_workers = max(1, max_workers)
+        self.executor_kind = executor
+        self.nice = nice
+        self.max_queued_files = max_queued_files
+        self.ttl_seconds = ttl_seconds
+        self.stream_queue_batches = max(1, stream_queue_batches)
+        self.chunks_dir = chunks_dir
+
+        self._jobs = {}
+        self._done = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._progress_queue = None
+        self._chunk_queue = None
+        self._manager = None
+
+    def _ensure_pool(self):
+        if self._pool is not None:
+            return
+        if self._progress_queue is None:
+            if self.executor_kind == "process":
+                self._manager = multiprocessing.Manager()
+                self._progress_queue = self._manager.Queue()
+                self._chunk_queue = self._manager.Queue(self.stream_queue_batches)
+            else:
+                self._progress_queue = queue.Queue()
+                self._chunk_queue = queue.Queue(self.stream_queue_batches)
+            threading.Thread(target=self._drain_progress, name="ingest-progress", daemon=True).start()
+            # one embed/index thread: files are embedded batch by batch in
+            # arrival order instead of competing for the model and the index lock
+            threading.Thread(target=self._embed_and_index, name="ingest-index", daemon=True).start()
+        if self.executor_kind == "process":
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker, initargs=(self.nice,)
+            )
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ingest")
+
+    def _discard_pool(self, pool):
+        """Drop a broken pool so the next job starts a new one. Call with _lock held."""
+        if self._pool is pool:
+            logger.warning("Ingestion worker pool is broken (a worker died); starting a new one")
+            self._pool = None
+        pool.shutdown(wait=False)
+
+    def _submit_file(self, saved: dict, job_id: str, index: int):
+        """Submit one file under _lock; returns (pool, future)."""
+        args = (_run_file, self.ingest_fn, saved, job_id, index, self._progress_queue, self._chunk_queue)
+        try:
+            return self._pool, self._pool.submit(*args)
+        except BrokenProcessPool:
+            # broke since the last job, before its futures' callbacks ran
+            self._discard_pool(self._pool)
+            self._ensure_pool()
+            return self._pool, self._pool.submit(*args)
+
+    def _drain_progress(self):
+        while True:
+            try:
+                job_id, index, updates = self._progress_queue.get()
+            except (EOFError, OSError):  # manager shut down
+                return
+            self._update_file(job_id, index, **updates)
+
+    def _pending_files(self) -> int:
+        return sum(
+            1
+            for job in self._jobs.values()
+            for f in job["files"]
+            if f["status"] in ("queued", "running")
+        )
+
+    def submit(self, saved_files: list) -> dict:
+        """Queue saved uploads as one job and return its initial state."""
+        with self._lock:
+            self._purge_expired()
+            if self._pending_files() + len(saved_files) > self.max_queued_files:
+                raise JobQueueFull(f"More than {self.max_queued_files} files are waiting to be ingested")
+            self._ensure_pool()
+
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            job = {
+                "job_id": job_id,
+                "status": "queued",
+                "stage": "queued",
+                "created_at": now,
+                "updated_at": now,
+                "finished_at": None,
+                "reindexed": None,
+                "error": None,
+                "files": [
+                    {"filename": saved["filename"], "doc_id": saved["doc_id"], "status": "queued", "stage": "queued"}
+                    for saved in saved_files
+                ],
+            }
+            self._jobs[job_id] = job
+            self._done[job_id] = threading.Event()
+            futures = [self._submit_file(saved, job_id, index) for index, saved in enumerate(saved_files)]
+            snapshot = self._snapshot(job)
+
+        for index, (pool, future) in enumerate(futures):
+            future.add_done_callback(lambda f, i=index, p=pool: self._worker_finished(job_id, i, f, p))
+        if not futures:
+            self._finish_job(job_id)
+        return snapshot
+
+    def _update_file(self, job_id: str, index: int, **updates):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            entry = job["files"][index]
+            if entry["status"] in ("done", "failed"):
+                return  # a late progress message must not undo the final state
+            entry.update(updates)
+            if entry["status"] == "queued":
+                entry["status"] = "running"
+            if job["status"] == "queued":
+                job["status"], job["stage"] = "running", "processing"
+            job["updated_at"] = time.time()
+
+    def _worker_finished(self, job_id: str, index: int, future, pool):
+        # _run_file reports its own outcome; this only catches a dead worker
+        error = future.exception()
+        if error is None:
+            return
+        if isinstance(error, BrokenProcessPool):
+            with self._lock:
+                self._discard_pool(pool)
+        self._chunk_queue.put((job_id, index, "failed", f"{type(error).__name__}: {error}"))
+
+    def _embed_and_index(self):
+        pending = {}  # (job_id, file index) -> {"chunks": [...], "embeddings": [...], "error": str | None}
+        while True:
+            try:
+                job_id, index, kind, payload = self._chunk_queue.get()
+            except (EOFError, OSError):  # manager shut down
+                return
+            stream = pending.setdefault((job_id, index), {"chunks": [], "embeddings": [], "error": None})
+            if kind == "chunks":
+                self._embed_batch(job_id, index, stream, payload)
+                continue
+
+            del pending[(job_id, index)]
+            if kind == "failed":
+                self._finish_file(job_id, index, error=payload)
+            elif stream["error"] is not None:
+                self._finish_file(job_id, index, result=payload, error=stream["error"])
+            else:
+                self._index_file(job_id, index, stream, payload)
+
+    def _embed_batch(self, job_id: str, index: int, stream: dict, chunks: list):
+        if stream["error"] is not None:
+            return  # the file already failed; drain its remaining batches
+        for chunk in chunks:
+            chunk["chunk_id"] = f"{chunk['doc_id']}_chunk_{chunk['chunk_index']}"
+        try:
+            stream["embeddings"].append(self.get_indexer().embed_chunks(chunks))
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error(f"Embedding failed for job {job_id}: {e}", exc_info=True)
+            stream["error"] = str(e)
+            return
+        stream["chunks"].extend(chunks)
+        self._update_file(job_id, index, stage="embedding", embedded=len(stream["chunks"]))
+
+    def _index_file(self, job_id: str, index: int, stream: dict, result: dict):
+        indexed = 0
+        if stream["chunks"] or result.get("duplicate"):
+            try:
+                indexer = self.get_indexer()
+                if stream["chunks"]:
+                    indexed = indexer.index_documents(
+                        [result["doc_id"]], np.vstack(stream["embeddings"]), stream["chunks"]
+                    )
+                elif not indexer.has_document(result["doc_id"]):
+                    indexed = indexer.upsert_documents([result["doc_id"]], self.chunks_dir)
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error(f"Indexing failed for job {job_id}: {e}", exc_info=True)
+                self._finish_file(job_id, index, result=result, error=str(e))
+                return
+        self._finish_file(job_id, index, result={**result, "indexed": indexed})
+
+    def _finish_file(self, job_id: str, index: int, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            entry = job["files"][index]
+            if entry["status"] in ("done", "failed"):
+                return
+            entry.update(result or {})
+            if error is None:
+                entry.update({"status": "done", "stage": "indexed"})
+            else:
+                logger.error(f"Ingestion of {entry['filename']} failed: {error}")
+                entry.update({"status": "failed", "stage": "failed", "error": error})
+            job["updated_at"] = time.time()
+            finished = all(f["status"] in ("done", "failed") for f in job["files"])
+        if finished:
+            self._finish_job(job_id)
+
+    def _finish_job(self, job_id: str):
+        with self._lock:
+            job = self._jobs[job_id]
+            failed = any(f["status"] == "failed" for f in job["files"])
+            now = time.time()
+            job.update({
+                "status": "failed" if failed else "succeeded",
+                "stage": "done",
+                "reindexed": sum(f.get("indexed", 0) for f in job["files"]),
+                "error": "One or more files failed" if failed else None,
+                "updated_at": now,
+                "finished_at": now,
+            })
+        self._done[job_id].set()
+
+    def get(self, job_id: str):
+        """Return a copy of the job's state, or None if unknown or expired."""
+        with self._lock:
+            self._purge_expired()
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def wait(self, job_id: str, timeout=None):
+        """Block until the job finishes (or ``timeout``) and return its state."""
+        done = self._done.get(job_id)
+        if done is not None:
+            done.wait(timeout)
+        return self.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {
+                "workers": self.max_workers,
+                "queued_files": self._pending_files(),
+                "queued_batches": self._chunk_queue.qsize() if self._chunk_queue is not None else 0,
+                "jobs": counts,
+            }
+
+    @staticmethod
+    def _snapshot(job: dict) -> dict:
+        return {**job, "files": [dict(f) for f in job["files"]]}
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] is not None and job["finished_at"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            del self._done[job_id]
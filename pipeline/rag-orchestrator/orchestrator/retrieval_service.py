@@ -44,8 +44,9 @@ def retrieve(query: str, doc_ids: List[str], k: int = 5) -> List[Dict[str, Any]]
         
         # Build filters if doc_ids provided
         filters = None
-        if doc_ids and doc_ids[0] != "default":
-            filters = {"doc_id": doc_ids[0]}
+        search_doc_ids = [doc_id for doc_id in doc_ids or [] if doc_id != "default"]
+        if search_doc_ids:
+            filters = {"doc_ids": search_doc_ids}
         
         payload = {
             "query": query,
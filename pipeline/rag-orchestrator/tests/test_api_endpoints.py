@@ -1,12 +1,62 @@
 import io
+import os
+import signal
+
+import numpy as np
+import pytest
+
 import config
 from api import app
+from jobs import IngestionJobs
 
 
 def setup_module(_module):
     config.MOCK_MODE = True
 
 
+class FakeIndexer:
+    def __init__(self):
+        self.embedded = []
+        self.indexed = []
+        self.upserted = []
+        self.live = set()
+
+    def embed_chunks(self, chunks):
+        self.embedded.append([c["chunk_id"] for c in chunks])
+        return np.zeros((len(chunks), 4), dtype="float32")
+
+    def index_documents(self, doc_ids, embeddings, chunks):
+        assert len(embeddings) == len(chunks)
+        self.indexed.append(doc_ids)
+        self.live.update(doc_ids)
+        return len(chunks)
+
+    def has_document(self, doc_id):
+        return doc_id in self.live
+
+    def upsert_documents(self, doc_ids, chunks_dir):
+        from ingestion.utils import count_saved_chunks
+
+        self.upserted.append(doc_ids)
+        self.live.update(doc_ids)
+        return sum(count_saved_chunks(doc_id, base_dir=chunks_dir) for doc_id in doc_ids)
+
+
+@pytest.fixture
+def thread_jobs(monkeypatch):
+    """Run upload jobs on threads so monkeypatched config reaches the workers."""
+    import api
+
+    def make(indexer=None, **kwargs):
+        indexer = indexer or FakeIndexer()
+        kwargs.setdefault("chunks_dir", config.CHUNKS_DIR)
+        jobs = IngestionJobs(api.ingest_saved_file, lambda: indexer, executor="thread", **kwargs)
+        monkeypatch.setattr(api, "_jobs", jobs)
+        return jobs
+
+    return make
+
+
 def test_health():
     client = app.test_client()
     res = client.get("/health")
@@ -42,3 +92,188 @@ def test_rag_full_with_query_only():
     data = res.get_json()
     assert "result" in data
 
+
+
+def test_pdf_workers_share_the_cpus_between_ingest_workers(monkeypatch):
+    import api
+
+    monkeypatch.setattr(api.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(config, "INGEST_PDF_WORKERS", 0)
+    monkeypatch.setattr(config, "INGEST_WORKERS", 2)
+    assert api.pdf_workers() == 4
+    monkeypatch.setattr(config, "INGEST_WORKERS", 16)
+    assert api.pdf_workers() == 1
+    monkeypatch.setattr(config, "INGEST_PDF_WORKERS", 3)
+    assert api.pdf_workers() == 3
+
+
+def test_rag_upload_content_ids_short_circuit_duplicates(tmp_path, monkeypatch, thread_jobs):
+    import api
+    from ingestion import utils
+
+    monkeypatch.setattr(config, "DOC_ID_MODE", "content")
+    monkeypatch.setattr(config, "CHUNKS_DIR", str(tmp_path / "chunks"))
+    monkeypatch.setattr(utils, "STORAGE_DIR", tmp_path)
+    indexer = FakeIndexer()
+    thread_jobs(indexer)
+
+    client = app.test_client()
+    body = b"Design controls shall be documented and reviewed."
+    first = client.post("/rag/upload?wait=1", data={"file": (io.BytesIO(body), "controls.txt")}).get_json()
+    second = client.post("/rag/upload?wait=1", data={"file": (io.BytesIO(body), "copy.txt")}).get_json()
+
+    assert first["files"][0]["duplicate"] is False
+    assert second["files"][0]["duplicate"] is True
+    assert second["files"][0]["doc_id"] == first["files"][0]["doc_id"]
+    assert second["files"][0]["chunks"] == first["files"][0]["chunks"]
+    assert indexer.indexed == [[first["files"][0]["doc_id"]]]
+    assert indexer.upserted == []
+    assert first["reindexed"] == first["files"][0]["chunks"]
+    assert second["reindexed"] == 0
+
+
+def test_rag_upload_reindexes_duplicate_that_is_not_in_index(tmp_path, monkeypatch, thread_jobs):
+    from ingestion import utils
+
+    monkeypatch.setattr(config, "DOC_ID_MODE", "content")
+    monkeypatch.setattr(config, "CHUNKS_DIR", str(tmp_path / "chunks"))
+    monkeypatch.setattr(utils, "STORAGE_DIR", tmp_path / "other")  # chunks must follow config.CHUNKS_DIR
+    indexer = FakeIndexer()
+    thread_jobs(indexer)
+
+    client = app.test_client()
+    body = b"Complaints shall be investigated."
+    first = client.post("/rag/upload?wait=1", data={"file": (io.BytesIO(body), "complaints.txt")}).get_json()
+    doc_id = first["files"][0]["doc_id"]
+    assert (tmp_path / "chunks" / doc_id).is_dir()
+
+    indexer.live.discard(doc_id)  # DELETE tombstones the vectors but keeps the chunk folder
+    again = client.post("/rag/upload?wait=1", data={"file": (io.BytesIO(body), "complaints.txt")}).get_json()
+
+    assert again["files"][0]["duplicate"] is True
+    assert again["files"][0]["doc_id"] == doc_id
+    assert indexer.upserted == [[doc_id]]
+    assert indexer.has_document(doc_id)
+    assert again["reindexed"] == first["files"][0]["chunks"]
+
+
+def test_rag_upload_returns_job_and_reports_progress(tmp_path, monkeypatch, thread_jobs):
+    from ingestion import utils
+
+    monkeypatch.setattr(config, "CHUNKS_DIR", str(tmp_path / "chunks"))
+    monkeypatch.setattr(utils, "STORAGE_DIR", tmp_path)
+    jobs = thread_jobs()
+
+    client = app.test_client()
+    res = client.post("/rag/upload", data={"files": [
+        (io.BytesIO(b"Records shall be retained."), "a.txt"),
+        (io.BytesIO(b"Audits shall be scheduled."), "b.txt"),
+    ]})
+    assert res.status_code == 202
+    job = res.get_json()
+    assert job["status_url"] == f"/rag/jobs/{job['job_id']}"
+    assert [f["filename"] for f in job["files"]] == ["a.txt", "b.txt"]
+
+    jobs.wait(job["job_id"], timeout=10)
+    status = client.get(job["status_url"]).get_json()
+    assert status["status"] == "succeeded"
+    assert status["stage"] == "done"
+    assert status["reindexed"] == 2
+    for entry in status["files"]:
+        assert entry["status"] == "done"
+        assert entry["stage"] == "indexed"
+        assert entry["page"] == entry["pages"] == 1
+        assert entry["chunks"] == entry["embedded"] == entry["indexed"] == 1
+
+
+def test_rag_upload_job_records_failed_file(monkeypatch):
+    import api
+
+    def broken(saved, progress=None, emit=None):
+        raise RuntimeError("unreadable")
+
+    jobs = IngestionJobs(broken, FakeIndexer, executor="thread")
+    monkeypatch.setattr(api, "_jobs", jobs)
+
+    client = app.test_client()
+    job = client.post("/rag/upload", data={"file": (io.BytesIO(b"x"), "bad.txt")}).get_json()
+    status = jobs.wait(job["job_id"], timeout=10)
+    assert status["status"] == "failed"
+    assert status["files"][0]["error"] == "unreadable"
+
+
+def _die_on_crash_file(saved, progress=None, emit=None):
+    if saved["filename"] == "crash.txt":
+        os.kill(os.getpid(), signal.SIGKILL)
+    return {"doc_id": saved["doc_id"], "filename": saved["filename"], "chunks": 0, "duplicate": False}
+
+
+def test_jobs_replace_pool_after_worker_dies():
+    jobs = IngestionJobs(_die_on_crash_file, FakeIndexer, max_workers=1, nice=0)
+
+    def saved(name):
+        return {"filename": name, "doc_id": name.split(".")[0]}
+
+    crashed = jobs.wait(jobs.submit([saved("crash.txt"), saved("queued.txt")])["job_id"], timeout=30)
+    assert crashed["status"] == "failed"
+    assert all("BrokenProcessPool" in f["error"] for f in crashed["files"])
+
+    after = jobs.wait(jobs.submit([saved("next.txt")])["job_id"], timeout=30)
+    assert after["status"] == "succeeded"
+    assert after["files"][0]["status"] == "done"
+
+
+def test_rag_upload_rejects_when_queue_full(thread_jobs):
+    thread_jobs(max_queued_files=1)
+    client = app.test_client()
+    res = client.post("/rag/upload", data={"files": [
+        (io.BytesIO(b"one"), "a.txt"),
+        (io.BytesIO(b"two"), "b.txt"),
+    ]})
+    assert res.status_code == 503
+
+
+def test_rag_job_unknown_id(thread_jobs):
+    thread_jobs()
+    res = app.test_client().get("/rag/jobs/missing")
+    assert res.status_code == 404
+
+
+def test_rag_upload_streams_chunks_to_embedder_in_batches(tmp_path, monkeypatch, thread_jobs):
+    from ingestion import utils
+
+    monkeypatch.setattr(config, "CHUNKS_DIR", str(tmp_path / "chunks"))
+    monkeypatch.setattr(utils, "STORAGE_DIR", tmp_path)
+    monkeypatch.setattr(config, "STREAM_BATCH_CHUNKS", 2)
+    indexer = FakeIndexer()
+    jobs = thread_jobs(indexer, stream_queue_batches=1)
+
+    body = " ".join(f"word{i}" for i in range(2400)).encode()
+    job = app.test_client().post("/rag/upload", data={"file": (io.BytesIO(body), "long.txt")}).get_json()
+    status = jobs.wait(job["job_id"], timeout=10)
+
+    doc_id = status["files"][0]["doc_id"]
+    assert status["status"] == "succeeded"
+    assert status["files"][0]["chunks"] == 6
+    assert indexer.embedded == [[f"{doc_id}_chunk_{i}" for i in range(j, j + 2)] for j in (0, 2, 4)]
+    assert indexer.indexed == [[doc_id]]
+    assert status["reindexed"] == 6
+
+
+def test_rag_upload_embedding_failure_fails_file(tmp_path, monkeypatch, thread_jobs):
+    from ingestion import utils
+
+    class BrokenIndexer(FakeIndexer):
+        def embed_chunks(self, chunks):
+            raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(config, "CHUNKS_DIR", str(tmp_path / "chunks"))
+    monkeypatch.setattr(utils, "STORAGE_DIR", tmp_path)
+    indexer = BrokenIndexer()
+    jobs = thread_jobs(indexer)
+
+    job = app.test_client().post("/rag/upload", data={"file": (io.BytesIO(b"Some text."), "a.txt")}).get_json()
+    status = jobs.wait(job["job_id"], timeout=10)
+    assert status["status"] == "failed"
+    assert status["files"][0]["error"] == "model unavailable"
+    assert indexer.indexed == []
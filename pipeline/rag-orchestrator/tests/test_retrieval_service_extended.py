@@ -2,9 +2,30 @@ import config
 from orchestrator import retrieval_service
 
 
-def test_mock_retrieve_returns_chunks():
-    config.MOCK_MODE = True
+def test_mock_retrieve_returns_chunks(monkeypatch):
+    monkeypatch.setattr(config, "MOCK_MODE", True)
     chunks = retrieval_service.retrieve("quality system", ["doc1", "doc2"])
     assert len(chunks) >= 1
     assert "chunk_id" in chunks[0]
 
+
+
+def test_retrieve_sends_all_doc_ids_as_filter(monkeypatch):
+    monkeypatch.setattr(config, "MOCK_MODE", False)
+    sent = {}
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+        def json(self):
+            return {"results": []}
+
+    def fake_post(url, json=None, **kwargs):
+        sent.update(json)
+        return Response()
+
+    monkeypatch.setattr(retrieval_service.requests, "post", fake_post)
+    retrieval_service.retrieve("design controls", ["doc1", "doc2"])
+
+    assert sent["filters"] == {"doc_ids": ["doc1", "doc2"]}